@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from .async_crawler import AsyncCrawler
 from .crawler import Crawler
 from .exceptions import CrawlerError
+from .pool import CrawlerPool
 from .proxies import ProxyPool
 from .settings import setup_logging
 
@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import urlparse
+
+import requests
+
+from .crawler import BaseCrawler, ContentBuffer, HEAD_END, CHUNK_SIZE
+from .deadline import Deadline, interrupting
+from .exceptions import CancelledError, DeadlineError, ResponseSizeError
+from .helpers import build_response
+from .scraper import Page
+from .middleware import Request
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+@contextmanager
+def cancelled_by(token, message):
+    """Cancels current task when `token` gets cancelled and turns that into `CancelledError`.
+
+    :param token: `CancelToken` object or None
+    :param message: error message
+    """
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    try:
+        with interrupting(lambda: loop.call_soon_threadsafe(task.cancel), token=token):
+            yield
+    except asyncio.CancelledError:
+        if token is not None and token.cancelled:
+            if hasattr(task, 'uncancel'):
+                task.uncancel()
+            raise CancelledError(message)
+        raise
+
+
+class AsyncCrawler(BaseCrawler):
+    """asyncio based `Crawler`. Requires `aiohttp` package.
+
+    ``open``, ``follow``, ``submit``, ``download`` and ``download_files`` are coroutines,
+    scraping methods (``xpath``, ``css``, ``links``, ``forms``, ``tables`` etc.),
+    history, descriptors (``useragent``, ``proxy``, ``headers``), retry policy, timeouts
+    and middlewares work the same way as in `Crawler`.
+
+    One crawler holds one current page. For many concurrent requests use ``fetch``, which
+    doesn't touch crawler state, or many crawlers sharing one client session.
+
+    Usage::
+
+        >>> import asyncio
+        >>> async def main():
+        ...     async with AsyncCrawler() as c:
+        ...         await c.open('https://httpbin.org/html')
+        ...         responses = await asyncio.gather(*[
+        ...             c.fetch('https://httpbin.org/links/10/{}'.format(page))
+        ...             for page in range(5)
+        ...         ])
+        ...         return len(c.xpath('//p')), [r.status_code for r in responses]
+        >>> asyncio.run(main())
+        (1, [200, 200, 200, 200, 200])
+    """
+
+    def __init__(self, history=True, max_history=5, absolute_links=True, hot_history=None,
+                 parse_profile='default', limit=1000, limit_per_host=0, client=None,
+                 offload_parsing=False, parse_executor=None):
+        """AsyncCrawler initialization
+
+        :param history: bool, turns on/off history handling
+        :param max_history: max items stored in flow
+        :param absolute_links: globally make links absolute
+        :param hot_history: max items of flow held in memory, rest is spilled to disk
+        :param parse_profile: name of parse profile used by parsers
+        :param limit: max number of simultaneous connections
+        :param limit_per_host: max number of simultaneous connections to one host, 0 is no limit
+        :param client: (optional) shared `aiohttp.ClientSession`
+        :param offload_parsing: bool, build html trees in executor instead of event loop
+        :param parse_executor: (optional) executor used for parsing, loop default by default
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncCrawler requires `aiohttp` package.')
+        super().__init__(
+            history=history,
+            max_history=max_history,
+            absolute_links=absolute_links,
+            hot_history=hot_history,
+            parse_profile=parse_profile
+        )
+        self._client = client
+        self._own_client = client is None
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._offload_parsing = offload_parsing
+        self._parse_executor = parse_executor
+
+    @property
+    def client(self):
+        """`aiohttp.ClientSession` used by crawler, created on first use."""
+        if self._client is None or self._client.closed:
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._limit,
+                    limit_per_host=self._limit_per_host
+                ),
+                cookie_jar=aiohttp.CookieJar(unsafe=True)
+            )
+            self._own_client = True
+        return self._client
+
+    async def close(self):
+        """Releases history storage and closes client session if it was created by the
+        crawler."""
+        self.close_history()
+        if self._client is not None and self._own_client:
+            await self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self, url, method='get', **kwargs):
+        """Opens url.
+
+        :param url: visiting url str
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: class::`Response <Response>` object
+        """
+        self._retries = 0
+        self._current_response = None
+        deadline = Deadline(self._total_timeout)
+
+        self.add_customized_kwargs(kwargs)
+
+        await self.wait_turn_async(url, deadline)
+        self._current_response = await self.retrying_async(
+            lambda: self.request_async(method, url, kwargs, deadline),
+            deadline,
+            on_failure=self.failure_handler(method, url, kwargs)
+        )
+        self.log_response(method, url, kwargs)
+
+        if self._current_response and self.fit_parser(self._current_response):
+            if self._offload_parsing:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._parse_executor,
+                    getattr,
+                    self._parser,
+                    'html_tree'
+                )
+            self.handle_response()
+            return self._current_response
+
+    async def fetch(self, url, method='get', **kwargs):
+        """Requests url without changing current page and history. Safe to run concurrently.
+
+        :param url: url str
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: class::`Response <Response>` object
+        """
+        deadline = Deadline(self._total_timeout)
+        self.add_customized_kwargs(kwargs)
+        return await self.retrying_async(
+            lambda: self.request_async(method, url, kwargs, deadline),
+            deadline
+        )
+
+    async def fetch_page(self, url, method='get', **kwargs):
+        """Fetches url like `fetch` and wraps result in `Page`. Errors are not raised but
+        stored in page ``error`` attribute.
+
+        :param url: url str
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: `Page` object
+        """
+        try:
+            response = await self.fetch(url, method, **kwargs)
+        except CancelledError:
+            raise
+        except Exception as error:
+            return Page(url, error=error)
+        return Page(url, response, parser_factory=self.make_parser)
+
+    async def open_many(self, urls, workers=10, ordered=False, window=None, method='get',
+                        **kwargs):
+        """Fetches urls concurrently and yields `Page` objects as they complete. Async
+        generator, works like `Crawler.open_many` with `workers` simultaneous requests.
+
+        :param urls: iterable of urls
+        :param workers: max number of simultaneous requests
+        :param ordered: yield pages in order of urls instead of order of completion
+        :param window: (optional) max number of pages in flight, twice `workers` by default
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: async generator of `Page` objects
+        """
+        urls = iter(urls)
+        window = window or workers * 2
+        semaphore = asyncio.Semaphore(workers)
+        pending = deque()
+
+        async def fetch_page(url):
+            async with semaphore:
+                return await self.fetch_page(url, method, **dict(kwargs))
+
+        def submit(count):
+            for url in islice(urls, count):
+                pending.append(asyncio.ensure_future(fetch_page(url)))
+
+        try:
+            submit(window)
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                    await done[0]
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        pending.remove(task)
+                for task in done:
+                    yield task.result()
+                submit(window - len(pending))
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def follow(self, url, method='get', **kwargs):
+        """Follows url"""
+        self.add_customized_kwargs(kwargs)
+        return await self.open(self.join_url(url), method, **kwargs)
+
+    async def submit(self, form=None, action=None, data=None):
+        """Submits form
+
+        :param form: `FormWrapper` object
+        :param action: custom action url
+        :param data: additional custom values to submit
+        :return: submit result
+        """
+        if form:
+            action = action or form.action_url()
+            values = form.form_values()
+            form.append_extra_values(values, data)
+            form.result = await self.open(
+                action,
+                form.method,
+                data=values,
+                files=form.files,
+            )
+        else:
+            await self.direct_submit(url=action, data=data)
+        return self._current_response
+
+    async def direct_submit(self, url=None, data=None):
+        """Direct submit. Used when quick post to form is needed or if there are no forms found
+        by the parser.
+
+        :param url: submit url, form action url, str
+        :param data: submit parameters, dict
+        :return: class::`Response <Response>` object
+        """
+        current_url = None
+        if self._current_response:
+            current_url = self._current_response.url
+        return await self.open(
+            url or current_url,
+            method='post',
+            data=data or {}
+        )
+
+    async def download(self, local_path=None, url=None, name=None, token=None):
+        """Downloads file streaming it to disk. Partially downloaded file is removed on failure.
+
+        :param local_path: download directory
+        :param url: file url
+        :param name: (optional) local file name, taken from url by default
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: downloaded file path
+        """
+        token = token or self._cancel_token
+        file_name = name or os.path.split(urlparse(url).path)[-1]
+        if file_name:
+            if token is not None:
+                token.check()
+            deadline = Deadline(self._total_timeout)
+            download_path = os.path.join(local_path, file_name)
+            kwargs = {}
+            self.add_customized_kwargs(kwargs)
+            await self.wait_turn_async(url, deadline, token)
+
+            async def attempt():
+                with open(download_path, 'wb') as sink:
+                    return await self.request_async('get', url, kwargs, deadline, sink, token)
+
+            try:
+                await self.retrying_async(attempt, deadline, token=token)
+            except BaseException:
+                if os.path.exists(download_path):
+                    os.remove(download_path)
+                raise
+            return download_path
+
+    async def download_files(self, local_path, files=None, workers=10, token=None):
+        """Download list of files concurrently. When `token` gets cancelled, running downloads
+        are aborted, pending ones are not started and paths of already completed files are
+        returned.
+
+        :param workers: max number of simultaneous downloads
+        :param local_path: download path
+        :param files: list of files
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: list with downloaded files paths
+        """
+        token = token or self._cancel_token
+        semaphore = asyncio.Semaphore(workers)
+
+        async def download(file):
+            async with semaphore:
+                return await self.download(local_path, file, token=token)
+
+        tasks = [asyncio.ensure_future(download(file)) for file in files or []]
+        results = []
+        try:
+            for future in asyncio.as_completed(tasks):
+                try:
+                    results.append(await future)
+                except CancelledError:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return results
+
+    async def retrying_async(self, attempt, deadline=None, on_failure=None, token=None):
+        """Awaits `attempt` until it succeeds or retry policy gives up.
+
+        :param attempt: coroutine function sending request and returning response
+        :param deadline: (optional) `Deadline` object limiting all attempts
+        :param on_failure: (optional) callable called with attempt number and exception
+            or response of every failed attempt
+        :param token: (optional) `CancelToken` interrupting waits between attempts, crawler
+            cancel token by default
+        :return: class::`Response <Response>` object
+        """
+        policy = self.retry_policy
+        number = 0
+        while True:
+            number += 1
+            try:
+                response = await attempt()
+            except Exception as error:
+                if not isinstance(error, policy.exceptions):
+                    raise
+                if on_failure:
+                    on_failure(number, error)
+                if not policy.retry_exception(error, number):
+                    raise
+                await self.wait_async(policy.delay(number), deadline, token)
+                continue
+            if response.status_code in policy.status_codes:
+                if on_failure:
+                    on_failure(number, response)
+                if policy.retry_response(response, number):
+                    await self.wait_async(policy.delay(number, response), deadline, token)
+                    continue
+            return response
+
+    async def wait_async(self, seconds, deadline=None, token=None):
+        """Sleeps between attempts without blocking event loop.
+
+        :param seconds: number of seconds
+        :param deadline: (optional) `Deadline` object
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        """
+        token = token or self._cancel_token
+        if token is not None:
+            token.check()
+        if seconds <= 0:
+            return
+        remaining = deadline.remaining() if deadline else None
+        if remaining is not None and remaining < seconds:
+            raise DeadlineError('Deadline exceeded while waiting.')
+        with cancelled_by(token, 'Waiting cancelled.'):
+            await asyncio.sleep(seconds)
+
+    async def wait_turn_async(self, url, deadline=None, token=None):
+        """Waits until request to url host may be sent according to crawler `scheduler`,
+        without blocking event loop.
+
+        :param url: url str
+        :param deadline: (optional) `Deadline` object
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        """
+        if self._scheduler is not None:
+            await self.wait_async(self._scheduler.reserve(url), deadline, token)
+
+    async def request_async(self, method, url, kwargs, deadline, sink=None, token=None):
+        """Sends single request attempt through middlewares.
+
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: request keyword arguments in `requests` format
+        :param deadline: `Deadline` object limiting whole request
+        :param sink: (optional) file object, body is written to it instead of memory
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: class::`Response <Response>` object
+        """
+        if not self.middlewares:
+            return await self.send_async(method, url, kwargs, deadline, sink, token)
+        return await self.middlewares.handle_async(
+            Request(method, url, dict(kwargs)),
+            lambda request: self.send_async(
+                request.method,
+                request.url,
+                request.kwargs,
+                deadline,
+                sink,
+                token
+            ),
+            self
+        )
+
+    async def send_async(self, method, url, kwargs, deadline, sink=None, token=None):
+        """Sends request with client session according to crawler mode and limits.
+
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: request keyword arguments in `requests` format
+        :param deadline: `Deadline` object limiting whole request
+        :param sink: (optional) file object, body is written to it instead of memory
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: class::`Response <Response>` object
+        """
+        token = token or self._cancel_token
+        if token is not None:
+            token.check()
+        deadline.check()
+        options = self.client_kwargs(url, kwargs, deadline)
+        try:
+            with cancelled_by(token, 'Request to {} cancelled.'.format(url)):
+                async with self.client.request(method.upper(), url, **options) as response:
+                    self.check_headers(response)
+                    content = await self.read_body(response, sink)
+                    return self.to_response(method, response, content)
+        except asyncio.TimeoutError as err:
+            if deadline.expired():
+                raise DeadlineError('Deadline exceeded while requesting {}.'.format(url)) from err
+            raise requests.exceptions.Timeout(str(err)) from err
+        except aiohttp.ClientConnectionError as err:
+            raise requests.exceptions.ConnectionError(str(err)) from err
+
+    async def read_body(self, response, sink=None):
+        """Reads body of `aiohttp` response according to crawler mode and limits.
+
+        :param response: `aiohttp.ClientResponse` object
+        :param sink: (optional) file object, body is written to it instead of memory
+        :return: body bytes
+        """
+        if sink is not None:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                sink.write(chunk)
+            return b''
+        if self._head_only:
+            buffer = ContentBuffer(self._head_max_bytes, HEAD_END, url=response.url)
+        else:
+            buffer = ContentBuffer(self._max_body_bytes, strict=True, url=response.url)
+        try:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if buffer.feed(chunk):
+                    response.close()
+                    break
+        except ResponseSizeError:
+            response.close()
+            raise
+        return bytes(buffer.content)
+
+    def client_kwargs(self, url, kwargs, deadline):
+        """Translates `requests` keyword arguments to `aiohttp` ones.
+
+        :param url: url str
+        :param kwargs: request keyword arguments in `requests` format
+        :param deadline: `Deadline` object limiting whole request
+        :return: dict
+        """
+        options = dict(kwargs)
+        options.pop('stream', None)
+        proxies = options.pop('proxies', None)
+        if proxies:
+            options['proxy'] = proxies.get(urlparse(url).scheme)
+        files = options.pop('files', None)
+        if files:
+            form = aiohttp.FormData(options.pop('data', None) or ())
+            for name, file in files.items():
+                form.add_field(name, file, filename=os.path.basename(getattr(file, 'name', name)))
+            options['data'] = form
+        if options.pop('verify', True) is False:
+            options['ssl'] = False
+        auth = options.pop('auth', None)
+        if auth:
+            options['auth'] = aiohttp.BasicAuth(*auth)
+        timeout = options.pop('timeout', None)
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = self._connect_timeout if timeout is None else timeout
+            read = self._read_timeout if timeout is None else timeout
+        options['timeout'] = aiohttp.ClientTimeout(
+            total=deadline.remaining(),
+            connect=connect,
+            sock_read=read
+        )
+        return options
+
+    @staticmethod
+    def to_response(method, response, content):
+        """Makes `requests` response from `aiohttp` one, so parsers and history handle it
+        like any other response.
+
+        :param method: 'get', 'post' etc. str
+        :param response: `aiohttp.ClientResponse` object
+        :param content: body bytes
+        :return: class::`Response <Response>` object
+        """
+        result = build_response(
+            str(response.url),
+            status_code=response.status,
+            headers=list(response.headers.items()),
+            content=content,
+            encoding=response.charset,
+            reason=response.reason,
+            method=method.upper(),
+            history=[
+                AsyncCrawler.to_response(method, redirect, b'')
+                for redirect in response.history
+            ]
+        )
+        for name, morsel in response.cookies.items():
+            result.cookies.set(name, morsel.value)
+        return result
+
+    def clear(self):
+        """Clears all flow, session, headers etc."""
+        super().clear()
+        if self._client is not None:
+            self._client.cookie_jar.clear()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from .exceptions import CircuitOpenError
+from .limiter import FAILURE_EXCEPTIONS
+from .middleware import Middleware
+from .scheduler import host_key
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class Circuit:
+    """Circuit state of a single host."""
+
+    __slots__ = ['state', 'failures', 'opened_at', 'probing']
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+
+class CircuitBreaker(Middleware):
+    """Per host circuit breaker middleware. Fails fast with `CircuitOpenError` instead of
+    sending requests to hosts which keep failing.
+
+    Circuit of a host opens after `failure_threshold` failures in a row (timeouts,
+    connection errors, `failure_status_codes`). After `cooldown` seconds it becomes
+    half-open: single probe request is let through, its success closes the circuit,
+    its failure opens it again. Other exceptions, like cancelled requests or responses
+    rejected by crawler limits, say nothing about the host and don't change the circuit.
+    `CircuitOpenError` isn't retried by retry policy.
+
+    Usage::
+
+        >>> from delver.helpers import build_response
+        >>> from delver.middleware import Request
+        >>> breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+        >>> request = Request('get', 'http://example.com/')
+        >>> for _ in range(2):
+        ...     breaker.process_request(request, None)
+        ...     response = breaker.process_response(
+        ...         request, build_response(request.url, status_code=503), None
+        ...     )
+        >>> breaker.state('http://example.com/other')
+        'open'
+        >>> breaker.process_request(request, None)
+        Traceback (most recent call last):
+        ...
+        delver.exceptions.CircuitOpenError: Circuit of example.com is open.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30, failure_status_codes=(500, 502, 503, 504),
+                 failure_exceptions=FAILURE_EXCEPTIONS, clock=time.monotonic):
+        """CircuitBreaker initialization
+
+        :param failure_threshold: number of failures in a row opening the circuit
+        :param cooldown: number of seconds circuit stays open before probe request
+        :param failure_status_codes: response status codes counted as failures
+        :param failure_exceptions: exceptions counted as failures
+        :param clock: callable returning current time in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failure_status_codes = failure_status_codes
+        self.failure_exceptions = failure_exceptions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def _circuit(self, url):
+        key = host_key(url)
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = Circuit()
+        return circuit
+
+    def _refresh(self, circuit):
+        if circuit.state == OPEN and self._clock() - circuit.opened_at >= self.cooldown:
+            circuit.state = HALF_OPEN
+            circuit.probing = False
+
+    def state(self, url):
+        """Returns circuit state of url host: 'closed', 'open' or 'half-open'."""
+        with self._lock:
+            circuit = self._circuit(url)
+            self._refresh(circuit)
+            return circuit.state
+
+    def states(self):
+        """Returns circuit states of all known hosts.
+
+        :return: dict of hosts and states
+        """
+        with self._lock:
+            for circuit in self._circuits.values():
+                self._refresh(circuit)
+            return {key: circuit.state for key, circuit in self._circuits.items()}
+
+    def record(self, url, failed):
+        """Records outcome of request sent to url host.
+
+        :param url: url str
+        :param failed: bool
+        """
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.state == HALF_OPEN:
+                circuit.probing = False
+            if not failed:
+                circuit.state = CLOSED
+                circuit.failures = 0
+                return
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or circuit.failures >= self.failure_threshold:
+                circuit.state = OPEN
+                circuit.opened_at = self._clock()
+
+    def release(self, url):
+        """Lets another probe through half-open circuit of url host, when probe request
+        ended without telling if the host recovered.
+
+        :param url: url str
+        """
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.state == HALF_OPEN:
+                circuit.probing = False
+
+    def reset(self, url=None):
+        """Closes circuit of url host or all circuits."""
+        with self._lock:
+            if url is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(host_key(url), None)
+
+    def process_request(self, request, crawler):
+        with self._lock:
+            circuit = self._circuit(request.url)
+            self._refresh(circuit)
+            if circuit.state == CLOSED:
+                return None
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                return None
+        raise CircuitOpenError('Circuit of {} is open.'.format(host_key(request.url)))
+
+    def process_response(self, request, response, crawler):
+        self.record(request.url, response.status_code in self.failure_status_codes)
+        return response
+
+    def process_exception(self, request, exception, crawler):
+        if isinstance(exception, self.failure_exceptions):
+            self.record(request.url, True)
+        else:
+            self.release(request.url)
+        return None
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
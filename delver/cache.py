@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+
+from requests.models import PreparedRequest
+from requests.structures import CaseInsensitiveDict
+
+from .helpers import pack_response, unpack_response
+from .middleware import Middleware
+
+CACHEABLE_METHODS = frozenset(['GET', 'HEAD'])
+CACHEABLE_STATUS_CODES = frozenset([200, 203, 300, 301, 308, 404, 410])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS variants (
+    base TEXT PRIMARY KEY,
+    vary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    base TEXT NOT NULL,
+    expires REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def parse_cache_control(value):
+    """Parses Cache-Control header value to dict of lowercased directives.
+
+    >>> sorted(parse_cache_control('public, Max-Age=60, no-cache').items())
+    [('max-age', '60'), ('no-cache', None), ('public', None)]
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def parse_http_date(value):
+    """Returns timestamp of http date or None if it can't be parsed."""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now):
+    """Returns number of seconds response stays fresh according to Cache-Control max-age
+    or Expires header, reduced by its Age.
+
+    :param headers: response headers
+    :param now: current timestamp
+    :return: float, 0 for stale responses
+    """
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0.0
+    lifetime = None
+    max_age = directives.get('s-maxage') or directives.get('max-age')
+    if max_age is not None:
+        try:
+            lifetime = float(max_age)
+        except ValueError:
+            lifetime = 0.0
+    elif 'Expires' in headers:
+        expires = parse_http_date(headers['Expires'])
+        date = parse_http_date(headers.get('Date')) or now
+        lifetime = expires - date if expires is not None else 0.0
+    if lifetime is None:
+        return 0.0
+    try:
+        age = float(headers.get('Age', 0))
+    except ValueError:
+        age = 0.0
+    return max(0.0, lifetime - age)
+
+
+class HttpCache(Middleware):
+    """Persistent HTTP cache middleware. Responses are stored zlib compressed in sqlite
+    database, keyed by method, url with query params and request headers named by response
+    Vary header.
+
+    Fresh responses (Cache-Control max-age, Expires) are served without touching network.
+    Stale ones having ETag or Last-Modified are revalidated with If-None-Match and
+    If-Modified-Since, 304 response is answered with stored copy. Least recently used
+    entries are evicted when stored bodies exceed `max_size` bytes. Streamed requests
+    (``download``) bypass the cache.
+
+    Usage::
+
+        >>> import tempfile
+        >>> from delver.helpers import build_response
+        >>> from delver.middleware import Request
+        >>> cache = HttpCache(tempfile.mkdtemp())
+        >>> request = Request('get', 'http://example.com/')
+        >>> cache.process_request(request, None) is None
+        True
+        >>> response = cache.process_response(request, build_response(
+        ...     request.url, headers={'Cache-Control': 'max-age=60'}, content=b'cached'
+        ... ), None)
+        >>> cache.process_request(Request('get', 'http://example.com/'), None).content
+        b'cached'
+        >>> cache.close()
+    """
+
+    def __init__(self, path, max_size=512 * 1024 * 1024, methods=CACHEABLE_METHODS,
+                 status_codes=CACHEABLE_STATUS_CODES, compression_level=6, clock=time.time):
+        """HttpCache initialization
+
+        :param path: cache directory, created if it doesn't exist
+        :param max_size: max number of bytes of stored compressed responses
+        :param methods: cached http methods
+        :param status_codes: cached response status codes
+        :param compression_level: zlib compression level
+        :param clock: callable returning current timestamp
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self.methods = frozenset(method.upper() for method in methods)
+        self.status_codes = frozenset(status_codes)
+        self.compression_level = compression_level
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(path, 'cache.sqlite'), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    @property
+    def size(self):
+        """Number of bytes of stored compressed responses."""
+        return self._size
+
+    @staticmethod
+    def request_headers(request, crawler):
+        """Returns headers request will be sent with, session headers included."""
+        headers = CaseInsensitiveDict()
+        session = getattr(crawler, '_session', None)
+        if session is not None:
+            headers.update(session.headers)
+        headers.update(request.kwargs.get('headers') or {})
+        return headers
+
+    @staticmethod
+    def base_key(request):
+        """Returns method and url of request with its query params merged in.
+
+        >>> from delver.middleware import Request
+        >>> HttpCache.base_key(Request('get', 'http://example.com/?a=1', {'params': {'q': 'b'}}))
+        'GET http://example.com/?a=1&q=b'
+        """
+        prepared = PreparedRequest()
+        prepared.prepare_url(request.url, request.kwargs.get('params'))
+        return '{} {}'.format(request.method.upper(), prepared.url)
+
+    @staticmethod
+    def variant_key(base, vary, headers):
+        values = [
+            '{}:{}'.format(name, headers.get(name, '')) for name in sorted(vary)
+        ]
+        return hashlib.sha1('\n'.join([base] + values).encode('utf-8')).hexdigest()
+
+    def _key(self, request, crawler):
+        base = self.base_key(request)
+        row = self._db.execute('SELECT vary FROM variants WHERE base = ?', (base,)).fetchone()
+        vary = json.loads(row[0]) if row else []
+        return self.variant_key(base, vary, self.request_headers(request, crawler))
+
+    def cacheable(self, request, crawler=None):
+        """Tells if request goes through the cache. Streamed requests aren't cached, neither
+        are requests of crawler with head only mode, body size or content type limits, whose
+        responses may be cut and which may not get responses stored without the limits.
+        """
+        return (
+            request.method.upper() in self.methods and not request.kwargs.get('stream')
+            and not getattr(crawler, '_head_only', False)
+            and getattr(crawler, '_max_body_bytes', None) is None
+            and not getattr(crawler, '_accepted_content_types', None)
+        )
+
+    def process_request(self, request, crawler):
+        if not self.cacheable(request, crawler):
+            return None
+        with self._lock:
+            key = self._key(request, crawler)
+            row = self._db.execute(
+                'SELECT expires, etag, last_modified, data '
+                'FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            expires, etag, last_modified, data = row
+            now = self._clock()
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        if now < expires:
+            self.hits += 1
+            return unpack_response(zlib.decompress(data))
+        if etag is None and last_modified is None:
+            self.misses += 1
+            return None
+        headers = dict(request.kwargs.get('headers') or {})
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        request.kwargs['headers'] = headers
+        request.meta['cache_key'] = key
+        return None
+
+    def process_response(self, request, response, crawler):
+        if not self.cacheable(request, crawler):
+            return response
+        key = request.meta.get('cache_key')
+        if key is not None and response.status_code == 304:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT data FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+            if row is not None:
+                cached = unpack_response(zlib.decompress(row[0]))
+                cached.headers.update({
+                    name: value for name, value in response.headers.items()
+                    if name.lower() not in ('content-length', 'content-encoding',
+                                            'transfer-encoding')
+                })
+                if response.raw is not None:
+                    response.close()
+                self.revalidated += 1
+                self.store(request, cached, crawler)
+                return cached
+        if response.status_code in self.status_codes:
+            self.store(request, response, crawler)
+        return response
+
+    def store(self, request, response, crawler=None):
+        """Stores response of request if its headers allow it. Truncated responses are
+        never stored.
+
+        :param request: `Request` object
+        :param response: class::`Response <Response>` object
+        :param crawler: (optional) `Crawler` which sent request
+        :return: bool, True if response was stored
+        """
+        if getattr(response, 'truncated', False):
+            return False
+        headers = response.headers
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        vary = [name.strip().lower() for name in headers.get('Vary', '').split(',') if name.strip()]
+        if 'no-store' in directives or '*' in vary:
+            return False
+        now = self._clock()
+        lifetime = freshness_lifetime(headers, now)
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if lifetime <= 0 and etag is None and last_modified is None:
+            return False
+        data = zlib.compress(pack_response(response), self.compression_level)
+        if len(data) > self.max_size:
+            return False
+        base = self.base_key(request)
+        key = self.variant_key(base, vary, self.request_headers(request, crawler))
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.execute(
+                    'INSERT OR REPLACE INTO variants (base, vary) VALUES (?, ?)',
+                    (base, json.dumps(vary))
+                )
+                previous = self._db.execute(
+                    'SELECT size FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+                self._db.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, base, now + lifetime, etag, last_modified, len(data), now, data)
+                )
+                self._size += len(data) - (previous[0] if previous else 0)
+                self._evict()
+        return True
+
+    def _evict(self):
+        while self._size > self.max_size:
+            rows = self._db.execute(
+                'SELECT key, size FROM entries ORDER BY accessed LIMIT 100'
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                if self._size <= self.max_size:
+                    return
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self._size -= size
+
+    def clear(self):
+        """Removes all stored responses."""
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM variants')
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return '<HttpCache(path={}, max_size={})>'.format(self.path, self.max_size)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+
+from requests.models import PreparedRequest
+
+from .exceptions import CassetteError
+from .helpers import pack_response, unpack_response
+from .middleware import Middleware
+
+MAGIC = b'DLVRCAS1'
+RECORD_HEADER = struct.Struct('>HI')
+MODES = ('record', 'replay', 'auto')
+
+
+def request_key(method, url, kwargs=None):
+    """Returns cassette key of request: method, url with query params and digest of body.
+
+    >>> request_key('get', 'http://example.com/', {'params': {'q': 1}})
+    'GET http://example.com/?q=1'
+    >>> request_key('post', 'http://example.com/', {'data': {'a': 1}})
+    'POST http://example.com/ ce66ae23385c3f21'
+    """
+    kwargs = kwargs or {}
+    prepared = PreparedRequest()
+    prepared.prepare_url(url, kwargs.get('params'))
+    key = '{} {}'.format(method.upper(), prepared.url)
+    files = kwargs.get('files')
+    body = [kwargs.get('data'), kwargs.get('json'), sorted(files) if files else None]
+    if any(part is not None for part in body):
+        digest = hashlib.sha1(
+            json.dumps(body, sort_keys=True, default=repr).encode('utf-8')
+        ).hexdigest()
+        key = '{} {}'.format(key, digest[:16])
+    return key
+
+
+class Cassette(Middleware):
+    """Record and replay middleware. In 'record' mode every response (with its redirect
+    history) is appended to cassette file, in 'replay' mode responses are served from it
+    without any network i/o and `CassetteError` is raised for requests which weren't
+    recorded. 'auto' mode replays recorded requests and records the new ones.
+
+    Requests are matched by method, url with query params and request body. Responses of
+    request repeated during recording are replayed in the same order, the last one is
+    repeated afterwards. Cassette should be the first middleware, ``Crawler.record`` and
+    ``Crawler.replay`` put it there. Streamed requests (``download``) aren't recorded.
+
+    Usage::
+
+        >>> import os, tempfile
+        >>> from delver.helpers import build_response
+        >>> from delver.middleware import Request
+        >>> path = os.path.join(tempfile.mkdtemp(), 'site.cassette')
+        >>> request = Request('get', 'http://example.com/')
+        >>> with Cassette(path, mode='record') as cassette:
+        ...     response = cassette.process_response(
+        ...         request, build_response(request.url, content=b'recorded'), None
+        ...     )
+        >>> with Cassette(path, mode='replay') as cassette:
+        ...     cassette.process_request(request, None).content
+        b'recorded'
+    """
+
+    def __init__(self, path, mode='auto', compression_level=6):
+        """Cassette initialization
+
+        :param path: cassette file path, index is kept next to it in `path` + '.idx'
+        :param mode: 'record', 'replay' or 'auto'
+        :param compression_level: zlib compression level of recorded responses
+        """
+        if mode not in MODES:
+            raise ValueError('Expected one of modes: {}.'.format(', '.join(MODES)))
+        self.path = path
+        self.index_path = path + '.idx'
+        self.mode = mode
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._index = {}
+        self._plays = {}
+        if mode == 'replay' and not os.path.exists(path):
+            raise CassetteError('Cassette {} does not exist.'.format(path))
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        else:
+            self._load_index()
+        self._changed = False
+
+    def _load_index(self):
+        size = self._file.tell()
+        try:
+            with open(self.index_path, 'rb') as f:
+                stored = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            if stored['size'] == size:
+                self._index = stored['entries']
+                return
+        except (OSError, ValueError, KeyError, zlib.error):
+            pass
+        self._index = self.scan()
+
+    def scan(self):
+        """Rebuilds index reading record headers of cassette file. Incomplete record left by
+        interrupted recording is cut off.
+
+        :return: dict of keys and lists of (offset, length) of their responses
+        """
+        index = {}
+        self._file.seek(0)
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise CassetteError('{} is not a cassette file.'.format(self.path))
+        offset = len(MAGIC)
+        while True:
+            header = self._file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            key_length, length = RECORD_HEADER.unpack(header)
+            key = self._file.read(key_length)
+            data_offset = offset + RECORD_HEADER.size + key_length
+            if len(key) < key_length or self._file.seek(0, os.SEEK_END) < data_offset + length:
+                break
+            index.setdefault(key.decode('utf-8'), []).append([data_offset, length])
+            offset = data_offset + length
+            self._file.seek(offset)
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        return index
+
+    def __len__(self):
+        return sum(len(records) for records in self._index.values())
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    def _read(self, record):
+        offset, length = record
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+            self._file.seek(0, os.SEEK_END)
+        return unpack_response(zlib.decompress(data))
+
+    def get(self, url, method='get', **kwargs):
+        """Returns the last recorded response of request, None if it wasn't recorded.
+
+        :param url: url str
+        :param method: 'get', 'post' etc. str
+        :param kwargs: request keyword arguments like params or data
+        :return: class::`Response <Response>` object or None
+        """
+        records = self._index.get(request_key(method, url, kwargs))
+        return self._read(records[-1]) if records else None
+
+    def play(self, key):
+        """Returns next recorded response of request key, None if it wasn't recorded."""
+        with self._lock:
+            records = self._index.get(key)
+            if not records:
+                return None
+            played = self._plays.get(key, 0)
+            self._plays[key] = played + 1
+        return self._read(records[min(played, len(records) - 1)])
+
+    def rewind(self):
+        """Starts replaying repeated requests from their first responses."""
+        with self._lock:
+            self._plays.clear()
+
+    def append(self, key, response):
+        """Records response of request key.
+
+        :param key: key returned by `request_key`
+        :param response: class::`Response <Response>` object
+        """
+        data = zlib.compress(pack_response(response), self.compression_level)
+        encoded = key.encode('utf-8')
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(RECORD_HEADER.pack(len(encoded), len(data)) + encoded + data)
+            self._index.setdefault(key, []).append(
+                [offset + RECORD_HEADER.size + len(encoded), len(data)]
+            )
+            self._changed = True
+
+    def process_request(self, request, crawler):
+        if self.mode == 'record':
+            return None
+        key = request_key(request.method, request.url, request.kwargs)
+        response = self.play(key)
+        if response is None and self.mode == 'replay':
+            raise CassetteError('{} is not recorded in {}.'.format(key, self.path))
+        return response
+
+    def process_response(self, request, response, crawler):
+        if self.mode != 'replay' and not request.kwargs.get('stream'):
+            self.append(request_key(request.method, request.url, request.kwargs), response)
+        return response
+
+    def flush(self):
+        """Writes recorded responses and index to disk."""
+        with self._lock:
+            self._file.flush()
+            if not self._changed:
+                return
+            size = self._file.tell()
+            temp_path = self.index_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(zlib.compress(json.dumps(
+                    {'size': size, 'entries': self._index}
+                ).encode('utf-8')))
+            os.replace(temp_path, self.index_path)
+            self._changed = False
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return '<Cassette(path={}, mode={}, responses={})>'.format(
+            self.path, self.mode, len(self)
+        )
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+
+from requests.cookies import create_cookie
+
+# log record types
+BEGIN = 'b'
+QUEUED = 'q'
+DONE = 'd'
+STATE = 's'
+FILE = 'f'
+
+COOKIE_ATTRIBUTES = [
+    'version', 'name', 'value', 'port', 'domain', 'path', 'secure', 'expires', 'discard',
+    'comment', 'comment_url', 'rfc2109'
+]
+
+
+def cookie_to_dict(cookie):
+    """Returns json serializable attributes of `Cookie`, accepted by `create_cookie`."""
+    attributes = {name: getattr(cookie, name) for name in COOKIE_ATTRIBUTES}
+    attributes['rest'] = dict(getattr(cookie, '_rest', {}))
+    return attributes
+
+
+def read_log(path, limit=None):
+    """Reads records of checkpoint log. Reading stops at the first damaged record, which is
+    left by process killed while writing.
+
+    :param path: log file path
+    :param limit: (optional) number of bytes to read
+    :return: generator of (record, offset after record) tuples
+    """
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            if limit is not None and offset + len(line) > limit:
+                return
+            if not line.endswith(b'\n'):
+                return
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                return
+            offset += len(line)
+            yield record, offset
+
+
+class CheckpointState:
+    """Crawl state rebuilt from checkpoint log."""
+
+    def __init__(self):
+        self.kind = None
+        self.params = None
+        self.state = {}
+        self.files = {}
+        self.done = 0
+        self._queued = {}
+
+    def apply(self, record):
+        op = record[0]
+        if op == QUEUED:
+            self._queued.setdefault(record[1], record[2])
+        elif op == DONE:
+            if self._queued.get(record[1], True) is not None:
+                self.done += 1
+            self._queued[record[1]] = None
+        elif op == FILE:
+            self.files[record[1]] = record[2]
+        elif op == STATE:
+            self.state = record[1]
+        elif op == BEGIN:
+            self.kind, self.params = record[1], record[2]
+
+    def seen(self):
+        """Returns iterator of all queued urls."""
+        return iter(self._queued)
+
+    def pending(self):
+        """Returns (url, depth) tuples of queued urls which weren't crawled, in queue order."""
+        return ((url, depth) for url, depth in self._queued.items() if depth is not None)
+
+    def records(self):
+        """Returns minimal list of records describing the state."""
+        if self.kind is not None:
+            yield [BEGIN, self.kind, self.params]
+        if self.state:
+            yield [STATE, self.state]
+        for url, path in self.files.items():
+            yield [FILE, url, path]
+        for url, depth in self._queued.items():
+            yield [DONE, url] if depth is None else [QUEUED, url, depth]
+
+    def release(self):
+        self._queued = {}
+
+
+class Checkpoint:
+    """Crash-safe progress log of ``Crawler.crawl`` and ``Crawler.download_files``, read
+    by ``Crawler.resume``.
+
+    Every queued and crawled url, downloaded file and periodic snapshot of scheduler state
+    and session cookies is appended to the log as one json line, so writing it costs the
+    same no matter how big the crawl is. Once `compact_every` records, and at least as
+    many as its compacted part holds, were appended, log is compacted in a background
+    thread, so big logs are rewritten only after they doubled in size: its current part is rewritten to minimal state while crawl
+    keeps appending, then new records are copied over and the file is atomically replaced.
+    Damaged record at the end, left by a killed process, is dropped on load.
+
+    Pages which were being crawled when process died are crawled again on resume.
+
+    Usage::
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'crawl.checkpoint')
+        >>> with Checkpoint(path) as checkpoint:
+        ...     checkpoint.begin('crawl', {'start_urls': ['http://example.com/']})
+        ...     checkpoint.queued('http://example.com/', 0)
+        ...     checkpoint.queued('http://example.com/about', 1)
+        ...     checkpoint.done('http://example.com/')
+        >>> checkpoint = Checkpoint(path)
+        >>> list(checkpoint.state.pending())
+        [('http://example.com/about', 1)]
+        >>> checkpoint.close()
+    """
+
+    def __init__(self, path, compact_every=100000, state_interval=5.0, fsync=False):
+        """Checkpoint initialization
+
+        :param path: log file path, existing log is loaded
+        :param compact_every: min number of appended records after which log is compacted
+        :param state_interval: min number of seconds between snapshots of scheduler state
+            and cookies
+        :param fsync: force written records to disk, to survive crash of the whole machine
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.state_interval = state_interval
+        self.fsync = fsync
+        self.state = CheckpointState()
+        self._lock = threading.Lock()
+        self._appended = 0
+        self._compacted = 0
+        self.compactions = 0
+        self._state_saved = None
+        self._compaction = None
+        end = 0
+        if os.path.exists(path):
+            for record, end in read_log(path):
+                self.state.apply(record)
+                self._appended += 1
+        self._file = open(path, 'ab')
+        self._file.truncate(end)
+
+    @property
+    def kind(self):
+        """'crawl' or 'download' if checkpoint has a state to resume, None otherwise."""
+        return self.state.kind
+
+    def append(self, *record):
+        """Appends record to the log."""
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line.encode('utf-8'))
+            self._appended += 1
+            if self._appended >= max(self.compact_every, self._compacted) and (
+                    self._compaction is None
+            ):
+                self._compaction = threading.Thread(target=self._compact, daemon=True)
+                self._compaction.start()
+
+    def begin(self, kind, params):
+        """Records parameters of started crawl or download, unless they are known already.
+
+        :param kind: 'crawl' or 'download'
+        :param params: json serializable keyword arguments of the call
+        """
+        if self.state.kind is None:
+            self.state.kind, self.state.params = kind, params
+            self.append(BEGIN, kind, params)
+            self.flush()
+
+    def queued(self, url, depth):
+        self.append(QUEUED, url, depth)
+
+    def done(self, url):
+        """Records crawled url and writes the log out."""
+        self.append(DONE, url)
+        self.flush()
+
+    def downloaded(self, url, path):
+        self.append(FILE, url, path)
+        self.flush()
+
+    def save_state(self, crawler):
+        """Records crawler scheduler state and session cookies."""
+        state = {'cookies': [cookie_to_dict(cookie) for cookie in crawler._session.cookies]}
+        if crawler.scheduler is not None:
+            state['scheduler'] = crawler.scheduler.state()
+        self.append(STATE, state)
+        self.flush()
+        self._state_saved = time.monotonic()
+
+    def maybe_save_state(self, crawler):
+        """Records crawler state if `state_interval` passed since it was recorded."""
+        if self._state_saved is None or (
+                time.monotonic() - self._state_saved >= self.state_interval
+        ):
+            self.save_state(crawler)
+
+    def restore(self, crawler):
+        """Restores recorded session cookies and scheduler state of crawler."""
+        for attributes in self.state.state.get('cookies', []):
+            crawler._session.cookies.set_cookie(create_cookie(**attributes))
+        if crawler.scheduler is not None:
+            crawler.scheduler.restore(self.state.state.get('scheduler', {}))
+
+    def _compact(self):
+        temp_path = self.path + '.compact'
+        try:
+            with self._lock:
+                self._file.flush()
+                limit = self._file.tell()
+            state = CheckpointState()
+            for record, _ in read_log(self.path, limit):
+                state.apply(record)
+            count = 0
+            with open(temp_path, 'wb') as f:
+                for record in state.records():
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+                            .encode('utf-8') + b'\n')
+                    count += 1
+                with self._lock:
+                    self._file.flush()
+                    with open(self.path, 'rb') as log:
+                        log.seek(limit)
+                        tail = log.read()
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    os.replace(temp_path, self.path)
+                    self._file.close()
+                    self._file = open(self.path, 'ab')
+                    self._compacted = count
+                    self._appended = tail.count(b'\n')
+                    self.compactions += 1
+        finally:
+            self._compaction = None
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def compact(self):
+        """Compacts the log in calling thread."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        with self._lock:
+            self._compaction = threading.current_thread()
+        self._compact()
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        compaction = self._compaction
+        if compaction is not None and compaction is not threading.current_thread():
+            compaction.join()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return '<Checkpoint(path={}, kind={})>'.format(self.path, self.state.kind)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
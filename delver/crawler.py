@@ -2,21 +2,44 @@
 
 import logging
 import os
+import re
+import socket
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from random import randrange
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import partial
+from itertools import islice
+from types import GeneratorType
 
-from collections import namedtuple, deque
-from copy import deepcopy
+from collections import deque
 from urllib.parse import urljoin, urlparse
 
 import requests
+from lxml import etree
 
+from .deadline import CancelToken, Deadline, interrupting
 from .decorators import with_history
-from .exceptions import CrawlerError
+from .exceptions import (
+    CrawlerError,
+    CancelledError,
+    ContentTypeError,
+    DeadlineError,
+    ResponseSizeError
+)
 from .helpers import ForcedInteger
-from .parser import HtmlParser
-from .scraper import Scraper
+from .cassette import Cassette
+from .checkpoint import Checkpoint
+from .extract import ProcessExtractor
+from .frontier import Frontier, crawlable, in_domains
+from .hedge import HedgePolicy
+from .history import HistoryEntry, SpillingHistory
+from .limiter import AdaptiveLimiter
+from .middleware import MiddlewareChain, Request
+from .parser import HtmlParser, PARSE_PROFILES
+from .retry import RetryPolicy
+from .scheduler import HostQueue, HostScheduler
+from .scraper import Page, Scraper
+from .urls import URLSeen
+from .warc import WarcWriter
 from .descriptors import (
     Useragent,
     Proxy,
@@ -31,13 +54,631 @@ PARSERS = {
     'application/json': HtmlParser
 }
 
+HEAD_END = re.compile(br'</head\s*>', re.IGNORECASE)
+CHUNK_SIZE = 8192
+LIMITER_POLL_INTERVAL = 0.1
+
+
+def iter_content(response, deadline=None, token=None, chunk_size=CHUNK_SIZE):
+    """Iterates over body chunks of streamed response. Aborts download when deadline passes
+    or token gets cancelled.
+
+    :param response: class::`Response <Response>` object requested with ``stream=True``
+    :param deadline: (optional) `Deadline` object
+    :param token: (optional) `CancelToken` object
+    :param chunk_size: size of read chunks
+    :return: generator of bytes chunks
+    """
+    with interrupting(lambda: abort_response(response), deadline, token):
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                check_interrupted(response, deadline, token)
+                yield chunk
+        except (requests.exceptions.RequestException, OSError, AttributeError, ValueError):
+            check_interrupted(response, deadline, token)
+            raise
+
+
+def abort_response(response):
+    """Closes response connection. Socket is shut down first, so reads blocked in other
+    threads are interrupted immediately.
+
+    :param response: class::`Response <Response>` object requested with ``stream=True``
+    """
+    connection = getattr(response.raw, '_connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def close_response(future):
+    """Closes response of finished request future, if it has one."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    response = future.result()
+    if response is not None and response.raw is not None:
+        response.close()
+
+
+def check_interrupted(response, deadline=None, token=None):
+    """Raises `CancelledError` or `DeadlineError` if download of response should stop."""
+    if token is not None and token.cancelled:
+        response.close()
+        raise CancelledError('Download of {} cancelled.'.format(response.url))
+    if deadline is not None and deadline.expired():
+        response.close()
+        raise DeadlineError('Deadline exceeded while downloading {}.'.format(response.url))
+
+
+class ContentBuffer:
+    """Collects response body chunks. Applies size limit and stop pattern.
+
+    Usage::
+
+        >>> buffer = ContentBuffer(stop=HEAD_END)
+        >>> buffer.feed(b'<html><head></he')
+        False
+        >>> buffer.feed(b'ad><body>')
+        True
+        >>> bytes(buffer.content)
+        b'<html><head></head>'
+    """
+
+    __slots__ = ['content', 'max_bytes', 'stop', 'strict', 'url']
+
+    def __init__(self, max_bytes=None, stop=None, strict=False, url=None):
+        """ContentBuffer initialization
+
+        :param max_bytes: max number of body bytes to read
+        :param stop: compiled bytes regexp, reading ends right after the first match
+        :param strict: raise `ResponseSizeError` instead of truncating body to `max_bytes`
+        :param url: response url used in error messages
+        """
+        self.content = bytearray()
+        self.max_bytes = max_bytes
+        self.stop = stop
+        self.strict = strict
+        self.url = url
+
+    def feed(self, chunk):
+        """Adds chunk to the buffer.
+
+        :param chunk: bytes
+        :return: True if reading should stop
+        """
+        content = self.content
+        search_from = max(0, len(content) - 16)
+        content.extend(chunk)
+        finished = False
+        match = self.stop.search(content, search_from) if self.stop is not None else None
+        if match:
+            del content[match.end():]
+            finished = True
+        if self.max_bytes is not None and len(content) > self.max_bytes:
+            if self.strict:
+                raise ResponseSizeError(
+                    'Response body of {} exceeds {} bytes.'.format(self.url, self.max_bytes)
+                )
+            del content[self.max_bytes:]
+            finished = True
+        return finished
+
+
+def read_content(response, max_bytes=None, stop=None, strict=False, deadline=None, token=None,
+                 chunk_size=CHUNK_SIZE):
+    """Reads body of streamed response. Stops download after `max_bytes` or when `stop`
+    pattern is found. Read part becomes response content and cut response gets
+    ``truncated`` attribute set to True.
+
+    :param response: class::`Response <Response>` object requested with ``stream=True``
+    :param max_bytes: max number of body bytes to read
+    :param stop: compiled bytes regexp, reading ends right after the first match
+    :param strict: raise `ResponseSizeError` instead of truncating body to `max_bytes`
+    :param deadline: (optional) `Deadline` object
+    :param token: (optional) `CancelToken` object
+    :param chunk_size: size of read chunks
+    :return: body bytes
+    """
+    buffer = ContentBuffer(max_bytes, stop, strict, response.url)
+    finished = True
+    try:
+        for chunk in iter_content(response, deadline, token, chunk_size):
+            if buffer.feed(chunk):
+                finished = False
+                break
+    except ResponseSizeError:
+        response.close()
+        raise
+    response._content = bytes(buffer.content)
+    response._content_consumed = True
+    if not finished:
+        response.truncated = True
+        response.close()
+    return response._content
+
+
+class BaseCrawler(Scraper):
+    """Settings, parsing, history and scraping methods shared by `Crawler` and
+    `AsyncCrawler`. Sending requests is left to subclasses.
+    """
+
+    useragent = Useragent()
+    proxy = Proxy()
+    headers = Headers()
+    max_retries = ForcedInteger('max_retries')
+
+    def __init__(self, history=True, max_history=5, absolute_links=True, hot_history=None,
+                 parse_profile='default'):
+        """BaseCrawler initialization
+
+        :param history: bool, turns on/off history handling
+        :param max_history: max items stored in flow
+        :param absolute_links: globally make links absolute
+        :param hot_history: max items of flow held in memory, rest is spilled to disk
+        :param parse_profile: name of parse profile used by parsers
+        """
+        super().__init__(
+            history=history,
+            max_history=max_history,
+            absolute_links=absolute_links
+        )
+        self._history = history
+        self._max_history = max_history
+        if hot_history is None:
+            self._flow = deque(maxlen=self._max_history)
+        else:
+            self._flow = SpillingHistory(maxlen=self._max_history, hot=hot_history)
+        self._index = 0
+        self._parser = None
+        self._current_response = None
+        self._absolute_links = absolute_links
+        self._useragent = None
+        self._headers = {}
+        self._proxy = {}
+        self._max_retries = 0
+        self._retries = 0
+        self._logging = False
+        self._logger = None
+        self._random_timeout = None
+        self._cleaner_params = None
+        self._head_only = False
+        self._head_max_bytes = 64 * 1024
+        self._max_body_bytes = None
+        self._accepted_content_types = None
+        self._connect_timeout = None
+        self._read_timeout = None
+        self._total_timeout = None
+        self._cancel_token = None
+        self._retry_policy = None
+        self._scheduler = None
+        self.middlewares = MiddlewareChain()
+        self.parse_profile = parse_profile
+
+    @property
+    def logging(self):
+        return self._logging
+
+    @logging.setter
+    def logging(self, value):
+        self._logging = value
+        self._logger = logging.getLogger(__name__) if value else None
+
+    @property
+    def random_timeout(self):
+        return self._random_timeout
+
+    @random_timeout.setter
+    def random_timeout(self, value):
+        """Sets random delay (min, max) between requests to the same host."""
+        if isinstance(value, (list, tuple)):
+            self._random_timeout = value
+            self.scheduler = HostScheduler(delay=value)
+        else:
+            raise TypeError('Expected list or tuple.')
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, value):
+        """Sets `HostScheduler` spacing requests to the same host."""
+        if value is not None and not isinstance(value, HostScheduler):
+            raise TypeError('Expected HostScheduler.')
+        self._scheduler = value
+
+    @property
+    def head_only(self):
+        return self._head_only
+
+    @head_only.setter
+    def head_only(self, value):
+        """Turns on/off head only mode. In head only mode response body is downloaded and
+        parsed only up to the closing </head> tag or `head_max_bytes`, which is enough for
+        title, meta tags and <link> elements.
+        """
+        self._head_only = bool(value)
+
+    @property
+    def head_max_bytes(self):
+        return self._head_max_bytes
+
+    @head_max_bytes.setter
+    def head_max_bytes(self, value):
+        if not isinstance(value, int):
+            raise TypeError('Expected int.')
+        self._head_max_bytes = value
+
+    @property
+    def max_body_bytes(self):
+        return self._max_body_bytes
+
+    @max_body_bytes.setter
+    def max_body_bytes(self, value):
+        """Sets max size of response body. Bigger responses are aborted with
+        `ResponseSizeError` as soon as the limit is exceeded.
+        """
+        if value is not None and not isinstance(value, int):
+            raise TypeError('Expected int.')
+        self._max_body_bytes = value
+
+    @property
+    def accepted_content_types(self):
+        return self._accepted_content_types
+
+    @accepted_content_types.setter
+    def accepted_content_types(self, value):
+        """Sets accepted content types like ``('text/html', 'application/json')``.
+        Responses of other types are aborted with `ContentTypeError` before body download.
+        """
+        if value is not None and not isinstance(value, (list, tuple)):
+            raise TypeError('Expected list or tuple.')
+        self._accepted_content_types = value
+
+    @property
+    def retry_policy(self):
+        """Returns `RetryPolicy` used by `open`, `download` and form `submit`. If it wasn't set,
+        policy allowing `max_retries` attempts is used.
+        """
+        return self._retry_policy or RetryPolicy(max_attempts=max(1, self._max_retries))
+
+    @retry_policy.setter
+    def retry_policy(self, value):
+        if value is not None and not isinstance(value, RetryPolicy):
+            raise TypeError('Expected RetryPolicy.')
+        self._retry_policy = value
+
+    @property
+    def connect_timeout(self):
+        return self._connect_timeout
+
+    @connect_timeout.setter
+    def connect_timeout(self, value):
+        """Sets max number of seconds to establish connection."""
+        self._connect_timeout = value
+
+    @property
+    def read_timeout(self):
+        return self._read_timeout
+
+    @read_timeout.setter
+    def read_timeout(self, value):
+        """Sets max number of seconds of waiting for data from server."""
+        self._read_timeout = value
+
+    @property
+    def total_timeout(self):
+        return self._total_timeout
+
+    @total_timeout.setter
+    def total_timeout(self, value):
+        """Sets deadline in seconds for whole `open` or `download` call, including retries
+        and body download. Exceeded deadline raises `DeadlineError`.
+        """
+        self._total_timeout = value
+
+    @property
+    def cancel_token(self):
+        return self._cancel_token
+
+    @cancel_token.setter
+    def cancel_token(self, value):
+        """Sets `CancelToken`. Cancelling it stops running downloads and pending retries
+        with `CancelledError`.
+        """
+        self._cancel_token = value
+
+    @property
+    def parse_profile(self):
+        return self._parse_profile
+
+    @parse_profile.setter
+    def parse_profile(self, value):
+        if value not in PARSE_PROFILES:
+            raise ValueError('Unknown parse profile: {}'.format(value))
+        self._parse_profile = value
+
+    @property
+    def cleaner_params(self):
+        return self._cleaner_params
+
+    @cleaner_params.setter
+    def cleaner_params(self, value):
+        """Sets `lxml.html.clean.Cleaner` params. Parsed documents are cleaned with them."""
+        if value is not None and not isinstance(value, dict):
+            raise TypeError('Expected dict.')
+        self._cleaner_params = value
+
+    def fit_parser(self, response):
+        """Fits parser according to response type.
+
+        :param response: class::`Response <Response>` object
+        :return: matched parser object like: class::`HtmlParser <HtmlParser>` object
+        """
+        self._parser = self.make_parser(response)
+        if self._parser is None and self._logging:
+            self._logger.info("Couldn't fit parser for {}.".format(
+                response.headers.get('Content-type', '')
+            ))
+        return self._parser
+
+    def make_parser(self, response):
+        """Builds parser matching response type without touching crawler state.
+
+        :param response: class::`Response <Response>` object
+        :return: matched parser object or None if there is no parser for content type
+        """
+        content_type = response.headers.get('Content-type', '')
+        for _type, parser in PARSERS.items():
+            if _type in content_type:
+                parser = parser(
+                    response,
+                    session=getattr(self, '_session', None),
+                    use_cleaner=self._cleaner_params is not None,
+                    cleaner_params=self._cleaner_params,
+                    profile=self._parse_profile
+                )
+                if self._absolute_links:
+                    parser.make_links_absolute()
+                return parser
+
+    def handle_response(self):
+        """Called after request. Make operations accordng to attributes settings."""
+        if self._history:
+            self._flow.append(HistoryEntry(
+                self._current_response,
+                parser_factory=self.make_parser
+            ))
+            self._index = len(self._flow) - 1
+
+    def failure_handler(self, method, url, kwargs):
+        """Returns callback counting and logging failed attempts of `open`."""
+
+        def on_failure(attempt, result):
+            self._retries = attempt
+            if self._logging:
+                self._logger.error(
+                    'Failed, try {}, method: {} request: url={}, result={}, kwargs={}  '.format(
+                        attempt,
+                        method.upper(),
+                        url,
+                        result,
+                        kwargs
+                    ))
+
+        return on_failure
+
+    def log_response(self, method, url, kwargs):
+        if self._logging:
+            self._logger.info(
+                'Open method: {} request: url={}, status code={}, kwargs={}  '.format(
+                    method.upper(),
+                    url,
+                    self._current_response.status_code,
+                    kwargs
+                ))
+
+    def check_headers(self, response):
+        """Checks response headers against crawler limits before body is downloaded.
+        Connection is closed if response is rejected.
+
+        :param response: class::`Response <Response>` object requested with ``stream=True``
+        """
+        content_type = response.headers.get('Content-Type', '')
+        if self._accepted_content_types and not any(
+                _type in content_type for _type in self._accepted_content_types
+        ):
+            response.close()
+            raise ContentTypeError(
+                'Content type {!r} of {} is not accepted.'.format(content_type, response.url)
+            )
+        content_length = response.headers.get('Content-Length', '')
+        if (
+            self._max_body_bytes is not None and not self._head_only
+            and content_length.isdigit() and int(content_length) > self._max_body_bytes
+        ):
+            response.close()
+            raise ResponseSizeError('Response body of {} has {} bytes, limit is {}.'.format(
+                response.url,
+                content_length,
+                self._max_body_bytes
+            ))
+
+    def add_customized_kwargs(self, kwargs):
+        """Adds request keyword arguments customized by setting `Crawler`
+        attributes like proxy, useragent, headers. Arguments won't be passed
+        if they are already set as `open` method kwargs.
+        """
+        if self._proxy and 'proxies' not in kwargs:
+            kwargs.update({'proxies': self._proxy})
+        if self._headers and 'headers' not in kwargs:
+            kwargs.update({'headers': self._headers})
+
+    def response(self):
+        """Get current response."""
+        return self._current_response
+
+    def get_url(self):
+        """Get URL of current document."""
+        return self._current_response.url
+
+    def join_url(self, url_path):
+        """Returns absolute_url. Path joined with url_root."""
+        return urljoin(
+            self._current_response.url,
+            url_path
+        )
+
+    @with_history
+    def back(self, step=1):
+        """Go back n steps in history, and return response object"""
+        if self._index - step > 0:
+            self._index -= step
+            entry = self._flow[self._index]
+            self._current_response = entry.response
+            self._parser = entry.parser
+        else:
+            raise CrawlerError("Out of history boundaries")
+
+    @with_history
+    def forward(self, step=1):
+        """Go forward n steps in history, and return response object"""
+        if self._index + step < self._max_history:
+            self._index += step
+            entry = self._flow[self._index]
+            self._current_response = entry.response
+            self._parser = entry.parser
+        else:
+            raise CrawlerError("Out of history boundaries")
+
+    @with_history
+    def flow(self):
+        """Return flow"""
+        return self._flow
+
+    def clear(self):
+        """Clears all flow, headers etc."""
+        self._flow.clear()
+        self._index = 0
+        self._headers = {}
+        self._proxy = {}
+
+    def close_history(self):
+        """Releases flow storage, ring file of spilled history included."""
+        self._flow.clear()
+        self._index = 0
+        if isinstance(self._flow, SpillingHistory):
+            self._flow.close()
+
+    @with_history
+    def history(self):
+        """Return urls history and status codes"""
+        return [entry.visited() for entry in self._flow]
+
+    def request_history(self):
+        """Returns current request history (like list of redirects to finally accomplish request)
+        """
+        return self._current_response.history
+
+    def record(self, path):
+        """Starts recording responses to cassette file. Recorded pages can be opened again
+        with ``replay`` without network.
+
+        :param path: cassette file path
+        :return: `Cassette` object, closing it finishes recording
+        """
+        cassette = Cassette(path, mode='record')
+        self.middlewares.insert(0, cassette)
+        return cassette
+
+    def replay(self, path):
+        """Serves ``open``, ``follow`` and ``submit`` responses from cassette file
+        recorded with ``record``. Requests which weren't recorded raise `CassetteError`.
+
+        :param path: cassette file path
+        :return: `Cassette` object
+        """
+        cassette = Cassette(path, mode='replay')
+        self.middlewares.insert(0, cassette)
+        return cassette
+
+    @property
+    def cookies(self):
+        """Wraps `RequestsCookieJar` object from requests library.
+
+        :return: `RequestsCookieJar` object
+        """
+        return self._current_response.cookies
+
+    def current_parser(self):
+        """Return parser of current page.
+
+        :return: matched parser object like: class::`HtmlParser <HtmlParser>` object
+        """
+        return self._parser
 
-class Crawler(Scraper):
+    def forms(self, filters=None):
+        """Return iterable over forms. Doesn't find javascript forms yet (but will be).
+
+            example_filters = {
+                'id': 'searchbox',
+                'name': 'name,
+                'action': 'action',
+                'has_fields': ['field1', 'field2']
+
+            }
+
+        Usage::
+
+            >>> c = Crawler()
+            >>> response = c.open('http://cgi-lib.berkeley.edu/ex/fup.html')
+            >>> forms = c.forms()
+            >>> forms[0].fields['note'].get('tag')
+            'input'
+            """
+
+        filters = filters or {}
+        return self._parser.find_forms(filters)
+
+    def submit_check(self, form, phrase=None, url=None, status_codes=None):
+        """Checks if success conditions of form submit are met
+
+        :param form: `FormWrapper` object
+        :param phrase: expected phrase in text
+        :param url: expected url
+        :param status_codes: list of expected status codes
+        :return: bool
+        """
+        return all([
+            phrase in form.result.text if phrase else True,
+            form.result.url == url if url else True,
+            form.result.status_code in status_codes if status_codes else True
+        ])
+
+    def encoding(self):
+        """Returns current respose encoding."""
+        return self._flow[self._index].encoding
+
+
+class Crawler(BaseCrawler):
     """Browser mimicking object. Mostly wrapper on Requests and Lxml libraries.
 
     :param history: (optional) bool, turns off/on history usage in Crawler
     :param max_history: (optional) int, max items held in history
     :param absolute_links: (optional) bool, makes always all links absolute
+    :param hot_history: (optional) int, number of newest history items kept in memory,
+        older ones are compressed and spilled to disk
+    :param parse_profile: (optional) str, name of parse profile from `PARSE_PROFILES`,
+        'lean' drops comments, scripts and styles while parsing
+    :param session: (optional) `requests.Session` object, for sharing cookies and connections
+        between crawlers (see `CrawlerPool`)
 
 
     Features:
@@ -145,6 +786,28 @@ class Crawler(Scraper):
         ... )
         'https://www.python.org/static/img/python-logo.png'
 
+    Head only mode (download and parse stops at </head>)::
+
+        >>> c = Crawler()
+        >>> c.head_only = True
+        >>> c.open('https://www.python.org/')
+        <Response [200]>
+        >>> c.title()
+        ['Welcome to Python.org']
+
+    Middlewares::
+
+        >>> from delver.middleware import Middleware
+        >>> class StatusLogger(Middleware):
+        ...     def process_response(self, request, response, crawler):
+        ...         print(request.url, response.status_code)
+        ...         return response
+        >>> c = Crawler()
+        >>> c.middlewares.append(StatusLogger())
+        >>> c.open('https://httpbin.org/html')
+        https://httpbin.org/html 200
+        <Response [200]>
+
     Download file::
 
         >>> import os
@@ -186,82 +849,65 @@ class Crawler(Scraper):
         True
     """
 
-    useragent = Useragent()
-    proxy = Proxy()
-    headers = Headers()
-    max_retries = ForcedInteger('max_retries')
-
-    def __init__(self, history=True, max_history=5, absolute_links=True):
+    def __init__(self, history=True, max_history=5, absolute_links=True, hot_history=None,
+                 parse_profile='default', session=None):
         """Crawler initialization
 
         :param history: bool, turns on/off history handling
         :param max_history: max items stored in flow
         :param absolute_links: globally make links absolute
+        :param hot_history: max items of flow held in memory, rest is spilled to disk
+        :param parse_profile: name of parse profile used by parsers
+        :param session: (optional) `requests.Session` used instead of a new one
         """
         super().__init__(
             history=history,
             max_history=max_history,
-            absolute_links=absolute_links
+            absolute_links=absolute_links,
+            hot_history=hot_history,
+            parse_profile=parse_profile
         )
-        self._session = requests.Session()
-        self._history = history
-        self._max_history = max_history
-        self._flow = deque(maxlen=self._max_history)
-        self._index = 0
-        self._parser = None
-        self._current_response = None
-        self._absolute_links = absolute_links
-        self._useragent = None
-        self._headers = {}
-        self._proxy = {}
+        self._session = session or requests.Session()
+        self._own_session = session is None
         self._loop = None
         self._executor = None
-        self._max_retries = 0
-        self._retries = 0
-        self._logging = False
-        self._logger = None
-        self._random_timeout = None
+        self._limiter = None
+        self._hedge_policy = None
+        self._warc = None
 
     @property
-    def logging(self):
-        return self._logging
+    def limiter(self):
+        return self._limiter
 
-    @logging.setter
-    def logging(self, value):
-        self._logging = value
-        self._logger = logging.getLogger(__name__) if value else None
+    @limiter.setter
+    def limiter(self, value):
+        """Sets `AdaptiveLimiter` limiting concurrent requests to the same host in
+        ``open_many``, ``crawl`` and ``download_files``."""
+        if value is not None and not isinstance(value, AdaptiveLimiter):
+            raise TypeError('Expected AdaptiveLimiter.')
+        self._limiter = value
 
     @property
-    def random_timeout(self):
-        return self._random_timeout
+    def hedge_policy(self):
+        return self._hedge_policy
 
-    @random_timeout.setter
-    def random_timeout(self, value):
-        if isinstance(value, (list, tuple)):
-            self._random_timeout = value
-        else:
-            raise TypeError('Expected list or tuple.')
-
-    def fit_parser(self, response):
-        """Fits parser according to response type.
+    @hedge_policy.setter
+    def hedge_policy(self, value):
+        """Sets `HedgePolicy`, turning on hedged requests."""
+        if value is not None and not isinstance(value, HedgePolicy):
+            raise TypeError('Expected HedgePolicy.')
+        self._hedge_policy = value
 
-        :param response: class::`Response <Response>` object
-        :return: matched parser object like: class::`HtmlParser <HtmlParser>` object
-        """
-        content_type = response.headers.get('Content-type', '')
-        for _type, parser in PARSERS.items():
-            if _type in content_type:
-                self._parser = PARSERS[_type](response, session=self._session)
-                return self._parser
-        if self._logging:
-            self._logger.info("Couldn't fit parser for {}.".format(content_type))
+    @property
+    def warc(self):
+        return self._warc
 
-    def handle_response(self):
-        """Called after request. Make operations accordng to attributes settings."""
-        if self._absolute_links:
-            self._parser.make_links_absolute()
-        if self._history:
-            self._flow.append({'parser': deepcopy(self._parser)})
+    @warc.setter
+    def warc(self, value):
+        """Sets `WarcWriter` archiving responses of ``open``, ``fetch`` and downloads."""
+        if value is not None and not isinstance(value, WarcWriter):
+            raise TypeError('Expected WarcWriter.')
+        self._warc = value
 
     def open(self, url, method='get', **kwargs):
         """Opens url. Wraps functionality of `Session` from `Requests` library.
@@ -273,165 +919,563 @@ class Crawler(Scraper):
         """
         self._retries = 0
         self._current_response = None
-        flow_len = len(self._flow)
-        if flow_len < self._max_history:
-            self._index = flow_len
+        deadline = Deadline(self._total_timeout)
 
         self.add_customized_kwargs(kwargs)
 
-        while True:
-            try:
-                self._current_response = self._session.request(method, url, **kwargs)
-                if self._random_timeout:
-                    time.sleep(randrange(*self._random_timeout))
-                if self._logging:
-                    self._logger.info(
-                        'Open method: {} request: url={}, status code={}, kwargs={}  '.format(
-                            method.upper(),
-                            url,
-                            self._current_response.status_code,
-                            kwargs
-                        ))
-            except requests.exceptions.ConnectionError:
-                self._retries += 1
-                time.sleep(self._retries)
-                if self.logging:
-                    self._logger.error(
-                        'Failed, try {}, method: {} request: url={}, kwargs={}  '.format(
-                            self._retries,
-                            method.upper(),
-                            url,
-                            kwargs
-                        ))
-                if self._retries >= self._max_retries:
-                    raise
-                continue
-            break
+        self.wait_turn(url, deadline)
+        self._current_response = self.retrying(
+            lambda: self.request(method, url, kwargs, deadline),
+            deadline,
+            on_failure=self.failure_handler(method, url, kwargs)
+        )
+        self.log_response(method, url, kwargs)
+        self.archive(self._current_response, kwargs)
 
         if self._current_response and self.fit_parser(self._current_response):
             self.handle_response()
-            if self._history:
-                self._flow[self._index].update({'response': deepcopy(self._current_response)})
             return self._current_response
 
-    def add_customized_kwargs(self, kwargs):
-        """Adds request keyword arguments customized by setting `Crawler`
-        attributes like proxy, useragent, headers. Arguments won't be passed
-        if they are already set as `open` method kwargs.
+    def fetch(self, url, method='get', **kwargs):
+        """Requests url without changing current page and history. Safe to call from many
+        threads at once.
+
+        :param url: url str
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: class::`Response <Response>` object
         """
-        if self._proxy and 'proxies' not in kwargs:
-            kwargs.update({'proxies': self._proxy})
-        if self._headers and 'headers' not in kwargs:
-            kwargs.update({'headers': self._headers})
+        deadline = Deadline(self._total_timeout)
+        self.add_customized_kwargs(kwargs)
+        response = self.retrying(
+            lambda: self.request(method, url, kwargs, deadline),
+            deadline
+        )
+        self.archive(response, kwargs)
+        return response
 
-    def response(self):
-        """Get current response."""
-        return self._current_response
+    def archive(self, response, kwargs):
+        """Writes response with read body to WARC archive, if crawler has one."""
+        if self._warc is not None and response is not None and not kwargs.get('stream'):
+            self._warc.write_response(response)
 
-    def get_url(self):
-        """Get URL of current document."""
-        return self._current_response.url
+    def fetch_page(self, url, method='get', **kwargs):
+        """Fetches url like `fetch` and wraps result in `Page`. Errors are not raised but
+        stored in page ``error`` attribute.
 
-    def join_url(self, url_path):
-        """Returns absolute_url. Path joined with url_root."""
-        return urljoin(
-            self._current_response.url,
-            url_path
-        )
+        :param url: url str
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: `Page` object
+        """
+        try:
+            response = self.fetch(url, method, **kwargs)
+        except CancelledError:
+            raise
+        except Exception as error:
+            return Page(url, error=error)
+        return Page(url, response, parser_factory=self.make_parser)
+
+    def open_many(self, urls, workers=10, ordered=False, window=None, method='get', **kwargs):
+        """Fetches urls concurrently over crawler session and yields `Page` objects as they
+        complete. Current page and history are not changed. Urls are consumed lazily and only
+        `window` pages are in flight at once, so memory doesn't depend on the number of urls.
+        Failed pages are yielded too, with exception in ``error`` attribute.
 
-    @with_history
-    def back(self, step=1):
-        """Go back n steps in history, and return response object"""
-        if self._index - step > 0:
-            self._index -= step
-            self._current_response = self._flow[self._index]['response']
-        else:
-            raise CrawlerError("Out of history boundaries")
+        Usage::
 
-    @with_history
-    def forward(self, step=1):
-        """Go forward n steps in history, and return response object"""
-        if self._index + step < self._max_history:
-            self._index += step
-            self._current_response = self._flow[self._index]['response']
-        else:
-            raise CrawlerError("Out of history boundaries")
+            >>> c = Crawler()
+            >>> urls = ['https://httpbin.org/links/10/{}'.format(n) for n in range(10)]
+            >>> pages = list(c.open_many(urls, workers=5, ordered=True))
+            >>> [len(page.links()) for page in pages] == [9] * 10
+            True
 
-    def follow(self, url, method='get',  **kwargs):
-        """Follows url"""
-        self.add_customized_kwargs(kwargs)
-        return self.open(self.join_url(url), method, **kwargs)
+        :param urls: iterable of urls
+        :param workers: number of threads
+        :param ordered: yield pages in order of urls instead of order of completion
+        :param window: (optional) max number of pages in flight, twice `workers` by default
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: generator of `Page` objects
+        """
+        urls = iter(urls)
+        window = window or workers * 2
+        pending = deque()
 
-    @with_history
-    def flow(self):
-        """Return flow"""
-        return self._flow
+        def fetch_page(url):
+            if self._limiter is not None:
+                return self._limiter.call(url, fetch_page_in_turn, url)
+            return fetch_page_in_turn(url)
 
-    def clear(self):
-        """Clears all flow, session, headers etc."""
-        self._flow.clear()
-        self._index = 0
-        self._session.cookies.clear()
-        self._headers = {}
-        self._proxy = {}
+        def fetch_page_in_turn(url):
+            self.wait_turn(url)
+            return self.fetch_page(url, method, **dict(kwargs))
 
-    @with_history
-    def history(self):
-        """Return urls history and status codes"""
-        Visit = namedtuple('Visited', 'url method response')
-        return [
-            Visit(
-                history['response'].url,
-                history['response'].request.method,
-                history['response'].status_code
-            )
-            for history in self._flow
-        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
 
-    def request_history(self):
-        """Returns current request history (like list of redirects to finally accomplish request)
+            def submit(count):
+                for url in islice(urls, count):
+                    pending.append(executor.submit(fetch_page, url))
+
+            try:
+                submit(window)
+                while pending:
+                    if ordered:
+                        done = [pending.popleft()]
+                    else:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            pending.remove(future)
+                    for future in done:
+                        yield future.result()
+                    submit(window - len(pending))
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def extract_many(self, urls, spec, workers=10, processes=None, ordered=False, window=None,
+                     extractor=None, method='get', **kwargs):
+        """Fetches urls like `open_many` and extracts data out of them in worker processes.
+        Raw response bytes are sent to workers, which parse them and run extraction `spec`,
+        so only extracted data comes back.
+
+        Usage::
+
+            >>> from delver.extract import ExtractionSpec
+            >>> c = Crawler()
+            >>> urls = ['https://httpbin.org/links/10/{}'.format(n) for n in range(10)]
+            >>> spec = ExtractionSpec(links=True)
+            >>> results = list(c.extract_many(urls, spec, ordered=True))
+            >>> [len(result.data['links']) for result in results] == [9] * 10
+            True
+
+        :param urls: iterable of urls
+        :param spec: `ExtractionSpec` object
+        :param workers: number of fetching threads
+        :param processes: number of extraction processes, number of cores by default
+        :param ordered: yield results in order of urls instead of order of completion
+        :param window: (optional) max number of pages in flight, twice `workers` by default
+        :param extractor: (optional) `ProcessExtractor` reused between calls
+        :param method: 'get', 'post' etc. str
+        :param kwargs: additional keywords like headers, cookies etc.
+        :return: generator of `Extracted` tuples with url, status code, data and error
         """
-        return self._current_response.history
+        window = window or workers * 2
+        pages = self.open_many(urls, workers, ordered, window, method, **kwargs)
+        if extractor is not None:
+            yield from extractor.extract_pages(pages, spec, ordered, window)
+            return
+        with ProcessExtractor(processes) as extractor:
+            yield from extractor.extract_pages(pages, spec, ordered, window)
+
+    def crawl(self, start_urls, max_depth=None, allowed_domains=None, url_filter=None,
+              concurrency=10, callback=None, max_pages=None, tags=None, filters=None,
+              match='EQUAL', frontier_memory=100000, seen=None, checkpoint=None):
+        """Crawls site breadth first, starting from `start_urls`. Pages are fetched
+        concurrently, links are found with `find_links` filters, checked against scope and
+        queued unless they were seen already. Current page and history are not changed.
+        Pages are requested as soon as their host is ready according to crawler `scheduler`,
+        so waiting for one host doesn't hold up the others.
+
+        `callback` is called with every crawled `Page` in calling thread. Values it returns
+        are yielded (generators are yielded from, None is skipped). Without callback pages
+        themselves are yielded.
 
-    @property
-    def cookies(self):
-        """Wraps `RequestsCookieJar` object from requests library.
+        Usage::
 
-        :return: `RequestsCookieJar` object
+            >>> c = Crawler()
+            >>> titles = c.crawl(
+            ...     ['http://quotes.toscrape.com/'],
+            ...     max_depth=1,
+            ...     allowed_domains=['quotes.toscrape.com'],
+            ...     url_filter=lambda url: '/tag/' in url,
+            ...     callback=lambda page: page.title()
+            ... )
+            >>> next(titles)
+            ['Quotes to Scrape']
+
+        :param start_urls: iterable of urls crawl starts from
+        :param max_depth: (optional) max number of links followed from start urls
+        :param allowed_domains: (optional) domains (with subdomains) crawl is limited to
+        :param url_filter: (optional) callable, url is crawled only if it returns True
+        :param concurrency: number of pages fetched at once
+        :param callback: (optional) callable called with every crawled `Page`
+        :param max_pages: (optional) max number of fetched pages
+        :param tags: html tags links are taken from, like in `links`
+        :param filters: links filters, like in `links`
+        :param match: type of filters matching, like in `links`
+        :param frontier_memory: max number of queued urls held in memory, rest is kept on disk
+        :param seen: (optional) `URLSeen` object, for bloom filter mode or urls seen in
+            previous crawls
+        :param checkpoint: (optional) `Checkpoint` object or its path, crawl progress is
+            recorded there and can be continued with ``resume``
+        :return: generator of callback results or pages
         """
-        return self._current_response.cookies
+        frontier = Frontier(memory_limit=frontier_memory)
+        seen = URLSeen() if seen is None else seen
+        ready = HostQueue(self._scheduler or HostScheduler(), self._limiter)
+        fetched = 0
+        if checkpoint is not None:
+            if not isinstance(checkpoint, Checkpoint):
+                checkpoint = Checkpoint(checkpoint)
+            start_urls = list(start_urls)
+            checkpoint.begin('crawl', {
+                'start_urls': start_urls,
+                'max_depth': max_depth,
+                'allowed_domains': allowed_domains,
+                'concurrency': concurrency,
+                'max_pages': max_pages,
+                'tags': tags,
+                'filters': filters,
+                'match': match,
+                'frontier_memory': frontier_memory,
+            })
+            for url in checkpoint.state.seen():
+                seen.add(url)
+            for url, depth in checkpoint.state.pending():
+                frontier.append(url, depth)
+            fetched = checkpoint.state.done
+            checkpoint.state.release()
+
+        def enqueue(url, depth):
+            url = crawlable(url)
+            if (
+                url is None or url in seen
+                or allowed_domains and not in_domains(url, allowed_domains)
+                or url_filter is not None and not url_filter(url)
+            ):
+                return
+            if seen.add(url):
+                frontier.append(url, depth)
+                if checkpoint is not None:
+                    checkpoint.queued(url, depth)
+
+        for url in start_urls:
+            enqueue(url, 0)
+
+        def crawl_page(url, depth):
+            page = None
+            started = self._limiter.clock() if self._limiter is not None else None
+            try:
+                page = self.fetch_page(url)
+            finally:
+                if self._limiter is not None:
+                    self._limiter.finish(url, started, page)
+            links = []
+            if page.ok and (max_depth is None or depth < max_depth):
+                try:
+                    links = list(page.current_parser().find_links(tags, filters, match))
+                except (CrawlerError, etree.ParserError):
+                    pass
+            return page, depth, links
+
+        pending = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                while True:
+                    while frontier and len(ready) < concurrency * 10:
+                        item = frontier.popleft()
+                        ready.push(item.url, item)
+                    delay = None
+                    while len(pending) < concurrency and (max_pages is None or fetched < max_pages):
+                        item, delay = ready.pop()
+                        if item is None:
+                            break
+                        pending.add(executor.submit(crawl_page, item.url, item.depth))
+                        fetched += 1
+                        delay = None
+                    if not pending:
+                        if not ready or max_pages is not None and fetched >= max_pages:
+                            break
+                        self.wait(LIMITER_POLL_INTERVAL if delay is None else delay)
+                        continue
+                    done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page, depth, links = future.result()
+                        for link in links:
+                            enqueue(urljoin(page.response.url, link), depth + 1)
+                        if callback is None:
+                            yield page
+                        else:
+                            result = callback(page)
+                            if isinstance(result, GeneratorType):
+                                yield from result
+                            elif result is not None:
+                                yield result
+                        if checkpoint is not None:
+                            checkpoint.done(page.url)
+                            checkpoint.maybe_save_state(self)
+            finally:
+                for future in pending:
+                    future.cancel()
+                frontier.close()
+                if checkpoint is not None:
+                    checkpoint.save_state(self)
+                    checkpoint.close()
+
+    def wait_turn(self, url, deadline=None, token=None):
+        """Waits until request to url host may be sent according to crawler `scheduler`.
+
+        :param url: url str
+        :param deadline: (optional) `Deadline` object
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        """
+        if self._scheduler is not None:
+            self.wait(self._scheduler.reserve(url), deadline, token)
+
+    def retrying(self, attempt, deadline=None, on_failure=None, token=None):
+        """Calls `attempt` until it succeeds or retry policy gives up. Waits between attempts
+        according to retry policy.
+
+        :param attempt: callable sending request and returning response
+        :param deadline: (optional) `Deadline` object limiting all attempts
+        :param on_failure: (optional) callable called with attempt number and exception
+            or response of every failed attempt
+        :param token: (optional) `CancelToken` interrupting waits between attempts, crawler
+            cancel token by default
+        :return: class::`Response <Response>` object
+        """
+        policy = self.retry_policy
+        number = 0
+        while True:
+            number += 1
+            try:
+                response = attempt()
+            except Exception as error:
+                if not isinstance(error, policy.exceptions):
+                    raise
+                if on_failure:
+                    on_failure(number, error)
+                if not policy.retry_exception(error, number):
+                    raise
+                self.wait(policy.delay(number), deadline, token)
+                continue
+            if response.status_code in policy.status_codes:
+                if on_failure:
+                    on_failure(number, response)
+                if policy.retry_response(response, number):
+                    response.close()
+                    self.wait(policy.delay(number, response), deadline, token)
+                    continue
+            return response
+
+    def request(self, method, url, kwargs, deadline=None, token=None):
+        """Sends single request attempt through middlewares.
 
-    def current_parser(self):
-        """Return parser associated with current flow item.
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: request keyword arguments
+        :param deadline: (optional) `Deadline` object limiting whole request
+        :param token: (optional) `CancelToken` of this request, crawler cancel token by
+            default
+        :return: class::`Response <Response>` object
+        """
+        deadline = deadline or Deadline(self._total_timeout)
+        return self.dispatch(method, url, kwargs, deadline, token)
 
-        :return: matched parser object like: class::`HtmlParser <HtmlParser>` object
+    def dispatch(self, method, url, kwargs, deadline, token=None):
+        """Sends request through middlewares, or directly if there are none. Hedged
+        requests pass middlewares once, whichever attempt wins.
+
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: request keyword arguments
+        :param deadline: `Deadline` object limiting whole request
+        :param token: (optional) `CancelToken` of this request only, crawler cancel token
+            by default
+        :return: class::`Response <Response>` object
         """
-        return self._flow[self._index]['parser']
+        if self._hedge_policy is not None and self._hedge_policy.applies(method):
+            send = partial(self.hedged, token=token)
+        else:
+            send = self.send if token is None else partial(self.send, token=token)
+        if not self.middlewares:
+            return send(method, url, kwargs, deadline)
+        return self.middlewares.handle(
+            Request(method, url, dict(kwargs)),
+            lambda request: send(request.method, request.url, request.kwargs, deadline),
+            self
+        )
 
-    def forms(self, filters=None):
-        """Return iterable over forms. Doesn't find javascript forms yet (but will be).
+    def attempt_token(self, parent=None):
+        """Returns `CancelToken` of single request attempt, cancelled also when `parent`
+        token gets cancelled.
 
-            example_filters = {
-                'id': 'searchbox',
-                'name': 'name,
-                'action': 'action',
-                'has_fields': ['field1', 'field2']
+        :param parent: (optional) `CancelToken`, crawler cancel token by default
+        """
+        token = CancelToken()
+        parent = parent or self._cancel_token
+        if parent is not None:
+            parent.add_callback(token.cancel)
+        return token
+
+    def release_token(self, token, parent=None):
+        """Detaches attempt token from `parent` token, crawler cancel token by default."""
+        parent = parent or self._cancel_token
+        if parent is not None:
+            parent.remove_callback(token.cancel)
+
+    def hedged(self, method, url, kwargs, deadline, token=None):
+        """Sends request and, if it doesn't complete within hedge policy delay, its duplicate.
+        The first successful response wins, the other attempt is cancelled: its download is
+        aborted, or its response closed if it has already arrived.
 
-            }
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: request keyword arguments
+        :param deadline: `Deadline` object limiting whole request
+        :param token: (optional) `CancelToken` cancelling both attempts, crawler cancel token
+            by default
+        :return: class::`Response <Response>` object
+        """
+        parent = token
+        policy = self._hedge_policy
+        policy.started()
+        started = time.monotonic()
+        tokens = {}
+
+        def attempt(attempt_kwargs):
+            token = self.attempt_token(parent)
+            future = policy.submit(
+                partial(self.send, token=token), method, url, attempt_kwargs, deadline
+            )
+            tokens[future] = token
+            return future
+
+        attempts = [attempt(kwargs)]
+        try:
+            delay = policy.delay()
+            remaining = deadline.remaining()
+            if delay is not None and remaining is not None:
+                delay = min(delay, remaining)
+            if delay is not None:
+                done, _ = wait(attempts, timeout=delay)
+                if not done and policy.allow():
+                    attempts.append(attempt(policy.hedge_kwargs(kwargs)))
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    policy.observe(time.monotonic() - started)
+                    for loser in pending | (done - {future}):
+                        loser.cancel()
+                        tokens[loser].cancel()
+                        loser.add_done_callback(close_response)
+                    return future.result()
+            raise error
+        finally:
+            for token in tokens.values():
+                self.release_token(token, parent)
+
+    def send(self, method, url, kwargs, deadline, token=None):
+        """Sends request through session according to crawler mode and limits. Requests with
+        ``stream=True`` keyword are returned without reading the body.
 
-        Usage::
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: request keyword arguments
+        :param deadline: `Deadline` object limiting whole request
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: class::`Response <Response>` object
+        """
+        token = token or self._cancel_token
+        kwargs = self.timeout_kwargs(kwargs, deadline, token)
+        try:
+            if kwargs.get('stream') or not (
+                    self._head_only or self._max_body_bytes is not None
+                    or self._accepted_content_types or deadline.active or token
+            ):
+                return self._session.request(method, url, **kwargs)
+            response = self._session.request(method, url, stream=True, **kwargs)
+        except requests.exceptions.Timeout as err:
+            if deadline.expired():
+                raise DeadlineError('Deadline exceeded while requesting {}.'.format(url)) from err
+            raise
+        self.check_headers(response)
+        if self._head_only:
+            read_content(
+                response,
+                max_bytes=self._head_max_bytes,
+                stop=HEAD_END,
+                deadline=deadline,
+                token=token
+            )
+        else:
+            read_content(
+                response,
+                max_bytes=self._max_body_bytes,
+                strict=True,
+                deadline=deadline,
+                token=token
+            )
+        return response
 
-            >>> c = Crawler()
-            >>> response = c.open('http://cgi-lib.berkeley.edu/ex/fup.html')
-            >>> forms = c.forms()
-            >>> forms[0].fields['note'].get('tag')
-            'input'
-            """
+    def timeout_kwargs(self, kwargs, deadline, token=None):
+        """Returns request kwargs with timeout limited by crawler timeouts and deadline.
+        Raises `DeadlineError` or `CancelledError` if request shouldn't be sent at all.
 
-        filters = filters or {}
-        if self._history:
-            return self.current_parser().find_forms(filters)
-        return self._parser.find_forms(filters)
+        :param kwargs: request keyword arguments
+        :param deadline: `Deadline` object
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: dict
+        """
+        token = token or self._cancel_token
+        if token is not None:
+            token.check()
+        deadline.check()
+        if 'timeout' in kwargs or not (
+                deadline.active or self._connect_timeout or self._read_timeout
+        ):
+            return kwargs
+        return dict(kwargs, timeout=deadline.timeout(self._connect_timeout, self._read_timeout))
+
+    def wait(self, seconds, deadline=None, token=None):
+        """Sleeps between attempts. Sleep is interrupted by cancel token and never lasts
+        beyond deadline.
+
+        :param seconds: number of seconds
+        :param deadline: (optional) `Deadline` object
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        """
+        token = token or self._cancel_token
+        if token is not None:
+            token.check()
+        if seconds <= 0:
+            return
+        remaining = deadline.remaining() if deadline else None
+        if remaining is not None and remaining < seconds:
+            raise DeadlineError('Deadline exceeded while waiting.')
+        if token is not None:
+            if token.wait(seconds):
+                raise CancelledError('Waiting cancelled.')
+        else:
+            time.sleep(seconds)
+
+    def follow(self, url, method='get',  **kwargs):
+        """Follows url"""
+        self.add_customized_kwargs(kwargs)
+        return self.open(self.join_url(url), method, **kwargs)
+
+    def clear(self):
+        """Clears all flow, session, headers etc."""
+        super().clear()
+        self._session.cookies.clear()
+
+    def close(self):
+        """Releases history storage and closes session if it was created by the crawler."""
+        self.close_history()
+        if self._own_session:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def submit(self, form=None, action=None, data=None):
         """Submits form
@@ -480,52 +1524,140 @@ class Crawler(Scraper):
             data=data or {}
         )
 
-    def submit_check(self, form, phrase=None, url=None, status_codes=None):
-        """Checks if success conditions of form submit are met
+    def download(self, local_path=None, url=None, name=None, token=None):
+        """Downloads file streaming it to disk. Respects crawler timeouts and deadline.
+        Partially downloaded file is removed on failure.
 
-        :param form: `FormWrapper` object
-        :param phrase: expected phrase in text
-        :param url: expected url
-        :param status_codes: list of expected status codes
-        :return: bool
+        :param local_path: download directory
+        :param url: file url
+        :param name: (optional) local file name, taken from url by default
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :return: downloaded file path
         """
-        return all([
-            phrase in form.result.text if phrase else True,
-            form.result.url == url if url else True,
-            form.result.status_code in status_codes if status_codes else True
-        ])
-
-    def encoding(self):
-        """Returns current respose encoding."""
-        return self._flow[self._index].encoding
-
-    def download(self, local_path=None, url=None, name=None):
+        token = token or self._cancel_token
         file_name = name or os.path.split(urlparse(url).path)[-1]
         if file_name:
+            if token is not None:
+                token.check()
+            deadline = Deadline(self._total_timeout)
             download_path = os.path.join(local_path, file_name)
-            with open(download_path, 'wb') as f:
-                f.write(self._session.get(url).content)
+            kwargs = {'stream': True}
+            self.add_customized_kwargs(kwargs)
+            self.wait_turn(url, deadline, token)
+            response = self.retrying(
+                lambda: self.request('get', url, kwargs, deadline, token),
+                deadline,
+                token=token
+            )
+            record = self._warc.record(response) if self._warc is not None else None
+            try:
+                with open(download_path, 'wb') as f:
+                    for chunk in iter_content(response, deadline, token):
+                        f.write(chunk)
+                        if record is not None:
+                            record.write(chunk)
+                if record is not None:
+                    record.commit()
+            except Exception:
+                if record is not None:
+                    record.discard()
+                response.close()
+                if os.path.exists(download_path):
+                    os.remove(download_path)
+                raise
             return download_path
 
-    def download_files(self, local_path, files=None, workers=10):
-        """Download list of files in parallel.
+    def download_files(self, local_path, files=None, workers=10, token=None, limiter=None,
+                       checkpoint=None):
+        """Download list of files in parallel. When `token` gets cancelled, running downloads
+        are aborted, pending ones are not started and paths of already completed files are
+        returned.
 
         :param workers: number of threads
         :param local_path: download path
         :param files: list of files
+        :param token: (optional) `CancelToken`, crawler cancel token by default
+        :param limiter: (optional) `AdaptiveLimiter` limiting concurrent downloads from the
+            same host, crawler limiter by default
+        :param checkpoint: (optional) `Checkpoint` object or its path, files downloaded
+            before are skipped and completed files are recorded there
         :return: list with downloaded files paths
         """
         files = files or []
+        token = token or self._cancel_token
+        limiter = limiter or self._limiter
         results = []
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            for future in as_completed(
-                    executor.submit(self.download, local_path, file)
-                    for file in files
-            ):
-                results.append(future.result())
+        if checkpoint is not None:
+            if not isinstance(checkpoint, Checkpoint):
+                checkpoint = Checkpoint(checkpoint)
+            files = list(files)
+            checkpoint.begin('download', {
+                'local_path': local_path, 'files': files, 'workers': workers
+            })
+            completed = {
+                file: path for file, path in checkpoint.state.files.items()
+                if os.path.exists(path)
+            }
+            results = [completed[file] for file in files if file in completed]
+            files = [file for file in files if file not in completed]
+
+        def download(file):
+            if limiter is not None:
+                return limiter.call(file, self.download, local_path, file, token=token)
+            return self.download(local_path, file, token=token)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(download, file): file for file in files}
+                for future in as_completed(futures):
+                    try:
+                        path = future.result()
+                    except CancelledError:
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    results.append(path)
+                    if checkpoint is not None and path is not None:
+                        checkpoint.downloaded(futures[future], path)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
 
         return results
 
+    def resume(self, checkpoint, **kwargs):
+        """Continues crawl or download recorded in checkpoint where it stopped. Session
+        cookies and scheduler state are restored, pending urls are crawled or files downloaded.
+        Callables like `callback` and `url_filter` aren't recorded and have to be passed again.
+
+        Usage::
+
+            >>> import os, tempfile
+            >>> path = os.path.join(tempfile.mkdtemp(), 'crawl.checkpoint')
+            >>> c = Crawler()
+            >>> pages = c.crawl(['https://httpbin.org/links/10/0'], checkpoint=path)
+            >>> page = next(pages)
+            >>> pages.close()
+            >>> urls = Crawler().resume(path, callback=lambda page: page.url)
+            >>> len(list(urls))
+            10
+
+        :param checkpoint: `Checkpoint` object or its path
+        :param kwargs: keyword arguments overriding recorded ones of `crawl` or
+            `download_files`
+        :return: generator of crawl results or list of downloaded files paths
+        """
+        if not isinstance(checkpoint, Checkpoint):
+            checkpoint = Checkpoint(checkpoint)
+        if checkpoint.kind is None:
+            checkpoint.close()
+            raise CrawlerError('Nothing to resume in {}.'.format(checkpoint.path))
+        checkpoint.restore(self)
+        params = dict(checkpoint.state.params, **kwargs)
+        if checkpoint.kind == 'download':
+            return self.download_files(checkpoint=checkpoint, **params)
+        return self.crawl(checkpoint=checkpoint, **params)
+
 
 if __name__ == '__main__':
     import doctest
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from .exceptions import CancelledError, DeadlineError
+
+
+class Deadline:
+    """Point in time after which operation is abandoned.
+
+    Usage::
+
+        >>> deadline = Deadline(10)
+        >>> deadline.expired()
+        False
+        >>> Deadline().remaining() is None
+        True
+    """
+
+    __slots__ = ['_expires']
+
+    def __init__(self, seconds=None):
+        """Deadline initialization
+
+        :param seconds: number of seconds from now, None means no deadline
+        """
+        self._expires = time.monotonic() + seconds if seconds is not None else None
+
+    @property
+    def active(self):
+        return self._expires is not None
+
+    def remaining(self):
+        """Returns number of seconds left or None if there is no deadline."""
+        if self._expires is None:
+            return None
+        return max(0.0, self._expires - time.monotonic())
+
+    def expired(self):
+        return self._expires is not None and time.monotonic() >= self._expires
+
+    def check(self):
+        """Raises `DeadlineError` if deadline has passed."""
+        if self.expired():
+            raise DeadlineError('Deadline exceeded.')
+
+    def timeout(self, connect=None, read=None):
+        """Returns `requests` timeout tuple limited by time left to deadline.
+
+        :param connect: connect timeout in seconds
+        :param read: read timeout in seconds
+        :return: tuple (connect, read)
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return connect, read
+        return (
+            min(connect, remaining) if connect is not None else remaining,
+            min(read, remaining) if read is not None else remaining
+        )
+
+
+class CancelToken:
+    """Thread safe cancellation flag shared by running operations.
+
+    Usage::
+
+        >>> token = CancelToken()
+        >>> token.cancel()
+        >>> token.cancelled
+        True
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Registers callback called on cancel, immediately if token is already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.add(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            self._callbacks.discard(callback)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """Raises `CancelledError` if token was cancelled."""
+        if self._event.is_set():
+            raise CancelledError('Operation cancelled.')
+
+    def wait(self, seconds):
+        """Sleeps given number of seconds, wakes up earlier if token gets cancelled.
+
+        :param seconds: number of seconds
+        :return: True if token was cancelled
+        """
+        return self._event.wait(seconds)
+
+
+class Watchdog:
+    """Single background thread calling scheduled callbacks at given points in time.
+    Used to interrupt blocked reads when deadline passes, without a thread per request.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._cancelled = set()
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, when, callback):
+        """Schedules callback.
+
+        :param when: `time.monotonic()` based point in time
+        :param callback: callable without arguments
+        :return: handle which can be passed to `cancel`
+        """
+        handle = next(self._counter)
+        with self._condition:
+            heapq.heappush(self._heap, (when, handle, callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def cancel(self, handle):
+        with self._condition:
+            self._cancelled.add(handle)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                when, handle, callback = self._heap[0]
+                delay = when - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if handle in self._cancelled:
+                    self._cancelled.discard(handle)
+                    continue
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+watchdog = Watchdog()
+
+
+@contextmanager
+def interrupting(callback, deadline=None, token=None):
+    """Calls `callback` (like ``response.close``) when deadline passes or token gets
+    cancelled while the block is running.
+
+    :param callback: callable interrupting blocked operation
+    :param deadline: (optional) `Deadline` object
+    :param token: (optional) `CancelToken` object
+    """
+    handle = None
+    if deadline is not None and deadline.active:
+        handle = watchdog.schedule(deadline._expires, callback)
+    if token is not None:
+        token.add_callback(callback)
+    try:
+        yield
+    finally:
+        if handle is not None:
+            watchdog.cancel(handle)
+        if token is not None:
+            token.remove_callback(callback)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -9,6 +9,10 @@ class SessionError(GeneralError):
     """Raised on errors related to session usage."""
 
 
+class PoolError(GeneralError):
+    """Raised when crawler can't be checked out of the pool."""
+
+
 class HistoryError(GeneralError):
     """Raised when functionality needs history=True."""
 
@@ -19,3 +23,31 @@ class FlowError(GeneralError):
 
 class CrawlerError(GeneralError):
     """Raised on errors related to crawler usage."""
+
+
+class ResponseError(CrawlerError):
+    """Raised when response is rejected while it's being downloaded."""
+
+
+class ContentTypeError(ResponseError):
+    """Raised when response content type isn't accepted."""
+
+
+class ResponseSizeError(ResponseError):
+    """Raised when response body exceeds allowed size."""
+
+
+class DeadlineError(CrawlerError):
+    """Raised when request doesn't complete before its deadline."""
+
+
+class CancelledError(CrawlerError):
+    """Raised when operation is cancelled with `CancelToken`."""
+
+
+class CircuitOpenError(CrawlerError):
+    """Raised when request isn't sent because circuit of its host is open."""
+
+
+class CassetteError(CrawlerError):
+    """Raised when replayed request isn't recorded in cassette."""
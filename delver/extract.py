@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+from collections import namedtuple, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from lxml import etree
+from lxml.html import HtmlElement
+
+from .helpers import build_response, table_to_dict
+from .parser import HtmlParser
+
+Extracted = namedtuple('Extracted', 'url status_code data error')
+
+
+def worker_context():
+    """Returns multiprocessing context of extraction workers. Workers are started by
+    forkserver (spawn where it isn't available) instead of being forked from a process
+    whose fetching threads may hold locks, which deadlocks forked children.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class ExtractionSpec:
+    """Picklable description of data extracted from a page. Extraction runs on raw response
+    bytes, so it can be done in other processes and only extracted data travels back.
+
+    Usage::
+
+        >>> spec = ExtractionSpec(
+        ...     xpath={'title': '//title/text()'},
+        ...     css={'headers': 'h1'},
+        ...     links={'filters': {'class': 'tag'}}
+        ... )
+        >>> data = spec.extract_content(
+        ...     'http://example.com/',
+        ...     b'<html><head><title>Quotes</title></head><body><h1>Top</h1>'
+        ...     b'<a class="tag" href="/tag/love/">love</a></body></html>'
+        ... )
+        >>> data['title'], data['headers'], data['links']
+        (['Quotes'], ['Top'], ['http://example.com/tag/love/'])
+    """
+
+    def __init__(self, xpath=None, css=None, links=None, tables=False, title=False,
+                 markup=False, profile='default', absolute_links=True):
+        """ExtractionSpec initialization
+
+        :param xpath: dict of result names and xpath expressions
+        :param css: dict of result names and css selectors
+        :param links: True or dict of `find_links` arguments (tags, filters, match)
+        :param tables: bool, scrape tables like `Scraper.tables`
+        :param title: bool, scrape page title
+        :param markup: bool, return elements as html strings instead of their text
+        :param profile: name of parse profile used by parser
+        :param absolute_links: bool, make extracted links absolute
+        """
+        self.xpath = xpath or {}
+        self.css = css or {}
+        self.links = links
+        self.tables = tables
+        self.title = title
+        self.markup = markup
+        self.profile = profile
+        self.absolute_links = absolute_links
+
+    def extract_content(self, url, content, headers=None):
+        """Parses raw response content and extracts data from it.
+
+        :param url: response url
+        :param content: response body bytes
+        :param headers: (optional) response headers
+        :return: dict
+        """
+        parser = HtmlParser(
+            build_response(url, headers=headers, content=content),
+            profile=self.profile
+        )
+        if self.absolute_links:
+            parser.make_links_absolute()
+        return self.extract(parser)
+
+    def extract(self, parser):
+        """Extracts data using already built parser.
+
+        :param parser: `HtmlParser` object
+        :return: dict
+        """
+        data = {}
+        for name, path in self.xpath.items():
+            data[name] = self.serialize(parser.xpath(path))
+        for name, selector in self.css.items():
+            data[name] = self.serialize(parser.css(selector))
+        if self.links:
+            options = self.links if isinstance(self.links, dict) else {}
+            data['links'] = list(parser.find_links(**options).keys())
+        if self.tables:
+            data['tables'] = [dict(table_to_dict(table)) for table in parser.xpath('//table')]
+        if self.title:
+            data['title'] = self.serialize(parser.xpath('//title/text()'))
+        return data
+
+    def serialize(self, results):
+        """Turns xpath or css results into picklable values.
+
+        :param results: list of elements, strings or single xpath value
+        :return: list of strings or xpath value
+        """
+        if not isinstance(results, list):
+            return results
+        serialized = []
+        for result in results:
+            if isinstance(result, HtmlElement):
+                if self.markup:
+                    result = etree.tostring(result, encoding='unicode', with_tail=False)
+                else:
+                    result = result.text_content().strip()
+            elif isinstance(result, str):
+                result = str(result)
+            serialized.append(result)
+        return serialized
+
+
+def extract_content(spec, url, content, headers=None):
+    """Runs extraction spec on content. Entry point of extraction worker processes."""
+    return spec.extract_content(url, content, headers)
+
+
+class ProcessExtractor:
+    """Runs `ExtractionSpec` extractions in a pool of processes, so parsing and extraction
+    of many pages scales with number of cores instead of being limited by the GIL.
+
+    Usage::
+
+        >>> from delver.helpers import build_response
+        >>> response = build_response(
+        ...     'http://example.com/',
+        ...     headers={'Content-Type': 'text/html'},
+        ...     content=b'<html><body><p>first</p><p>second</p></body></html>'
+        ... )
+        >>> with ProcessExtractor(processes=2) as extractor:
+        ...     extractor.submit(ExtractionSpec(xpath={'p': '//p'}), response).result()
+        {'p': ['first', 'second']}
+    """
+
+    def __init__(self, processes=None, executor=None):
+        """ProcessExtractor initialization
+
+        :param processes: number of worker processes, number of cores by default
+        :param executor: (optional) already created executor used instead of new one
+        """
+        self._own_executor = executor is None
+        self._executor = executor or ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=worker_context()
+        )
+
+    def submit(self, spec, response):
+        """Sends response content to worker process.
+
+        :param spec: `ExtractionSpec` object
+        :param response: class::`Response <Response>` object
+        :return: `Future` with extracted data
+        """
+        return self._executor.submit(
+            extract_content,
+            spec,
+            response.url,
+            response.content,
+            dict(response.headers)
+        )
+
+    def extract_pages(self, pages, spec, ordered=False, window=None):
+        """Extracts data out of pages in worker processes. Pages are consumed lazily, only
+        `window` of them waits for extraction at once.
+
+        :param pages: iterable of `Page` objects, like the ones from `Crawler.open_many`
+        :param spec: `ExtractionSpec` object
+        :param ordered: yield results in order of pages instead of order of completion
+        :param window: (optional) max number of pages extracted at once
+        :return: generator of `Extracted` tuples
+        """
+        window = window or self._executor._max_workers * 2
+        pending = deque()
+        try:
+            for page in pages:
+                pending.append((page.url, page.status_code, self.submit_page(spec, page)))
+                if len(pending) >= window:
+                    yield from self._completed(pending, ordered)
+            while pending:
+                yield from self._completed(pending, ordered)
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+    def submit_page(self, spec, page):
+        """Sends page content to worker process. Future of failed page holds page error.
+
+        :param spec: `ExtractionSpec` object
+        :param page: `Page` object
+        :return: `Future` with extracted data
+        """
+        if page.ok:
+            return self.submit(spec, page.response)
+        future = Future()
+        future.set_exception(page.error)
+        return future
+
+    @staticmethod
+    def _completed(pending, ordered):
+        if ordered:
+            done = {pending[0][2]}
+        else:
+            done, _ = wait([item[2] for item in pending], return_when=FIRST_COMPLETED)
+        for item in [item for item in pending if item[2] in done]:
+            pending.remove(item)
+            url, status_code, future = item
+            try:
+                yield Extracted(url, status_code, future.result(), None)
+            except Exception as error:
+                yield Extracted(url, status_code, None, error)
+
+    def close(self):
+        """Shuts down worker processes if they were started by extractor."""
+        if self._own_executor:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -2,7 +2,7 @@
 
 import io
 
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin
 
 from lxml.html import (
     CheckboxGroup,
@@ -130,11 +130,7 @@ class FormWrapper:
 
         :return: str
         """
-        action_url = self.action
-        return urljoin(
-            self._url if urlparse(action_url).scheme else '',
-            self.action
-        )
+        return urljoin(self._url or '', self._lxml_form.get('action') or '')
 
     def has_fields(self, fields):
         """Return ``True`` if all fields are present
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import tempfile
+from collections import deque, namedtuple
+from urllib.parse import urldefrag, urlparse
+
+FrontierItem = namedtuple('FrontierItem', 'url depth')
+
+
+class Frontier:
+    """FIFO queue of urls waiting to be crawled, with their depths.
+
+    Holds up to `memory_limit` urls in memory. When there are more of them, new urls are
+    written to a temporary file and read back in order when memory queue gets empty, so
+    memory stays flat even if millions of urls are discovered.
+
+    Usage::
+
+        >>> frontier = Frontier(memory_limit=2)
+        >>> for number in range(4):
+        ...     frontier.append('http://example.com/{}'.format(number), depth=1)
+        >>> len(frontier)
+        4
+        >>> [frontier.popleft().url[-1] for _ in range(4)]
+        ['0', '1', '2', '3']
+    """
+
+    def __init__(self, memory_limit=100000):
+        """Frontier initialization
+
+        :param memory_limit: max number of urls held in memory
+        """
+        self._memory_limit = memory_limit
+        self._memory = deque()
+        self._file = None
+        self._read_position = 0
+        self._spilled = 0
+
+    def __len__(self):
+        return len(self._memory) + self._spilled
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def append(self, url, depth=0):
+        """Adds url to the end of the queue.
+
+        :param url: url str
+        :param depth: number of links followed from start url
+        """
+        if not self._spilled and len(self._memory) < self._memory_limit:
+            self._memory.append(FrontierItem(url, depth))
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        self._file.seek(0, 2)
+        self._file.write('{}\t{}\n'.format(depth, url).encode('utf-8'))
+        self._spilled += 1
+
+    def popleft(self):
+        """Removes and returns the oldest url.
+
+        :return: `FrontierItem` tuple with url and depth
+        """
+        if not self._memory and self._spilled:
+            self._load()
+        if not self._memory:
+            raise IndexError('pop from an empty frontier')
+        return self._memory.popleft()
+
+    def _load(self):
+        self._file.seek(self._read_position)
+        while self._spilled and len(self._memory) < self._memory_limit:
+            depth, url = self._file.readline().decode('utf-8').rstrip('\n').split('\t', 1)
+            self._memory.append(FrontierItem(url, int(depth)))
+            self._spilled -= 1
+        self._read_position = self._file.tell()
+        if not self._spilled:
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_position = 0
+
+    def clear(self):
+        self._memory.clear()
+        self._spilled = 0
+        self._read_position = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self.clear()
+
+
+def in_domains(url, domains):
+    """Tells if url host is one of domains or their subdomain.
+
+    >>> in_domains('https://docs.python.org/3/', ['python.org'])
+    True
+    >>> in_domains('https://python.org.evil.com/', ['python.org'])
+    False
+
+    :param url: url str
+    :param domains: iterable of domain names
+    :return: bool
+    """
+    host = (urlparse(url).hostname or '').lower()
+    return any(
+        host == domain or host.endswith('.' + domain)
+        for domain in (domain.lower() for domain in domains)
+    )
+
+
+def crawlable(url):
+    """Returns url without fragment if it can be crawled (http or https), None otherwise.
+
+    :param url: url str
+    :return: str or None
+    """
+    url = urldefrag(url.strip())[0]
+    if urlparse(url).scheme in ('http', 'https'):
+        return url
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import math
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+class HedgePolicy:
+    """Decides when duplicate (hedge) request should be sent for a request which is slow
+    to answer. First answer wins, so rare slow connections or proxies don't dominate tail
+    latency.
+
+    Hedge goes out after static `delay` or, with ``delay='adaptive'``, after `percentile`
+    of recently observed latencies. Only idempotent methods are hedged and hedges are
+    limited to `max_ratio` of requests, so load can't explode when a host gets slow.
+    Attempts run on executor of `workers` threads shared by all crawlers using the policy.
+
+    Usage::
+
+        >>> policy = HedgePolicy(delay='adaptive', percentile=95, min_samples=10)
+        >>> policy.delay() is None
+        True
+        >>> for latency in range(1, 101):
+        ...     policy.observe(latency / 100)
+        >>> policy.delay()
+        0.95
+        >>> policy.applies('post')
+        False
+    """
+
+    def __init__(self, delay='adaptive', percentile=95, max_ratio=0.1, min_samples=20,
+                 samples=500, proxies=None, methods=IDEMPOTENT_METHODS, workers=32):
+        """HedgePolicy initialization
+
+        :param delay: seconds to wait before hedge or 'adaptive'
+        :param percentile: percentile of observed latencies used as adaptive delay
+        :param max_ratio: max fraction of requests which can be hedged
+        :param min_samples: number of latencies observed before adaptive hedging starts
+        :param samples: number of recent latencies adaptive delay is computed from
+        :param proxies: (optional) `ProxyPool`, hedge is sent through other working proxy
+        :param methods: hedged http methods
+        :param workers: max number of attempts running at once
+        """
+        if delay != 'adaptive' and not isinstance(delay, (int, float)):
+            raise TypeError("Expected number or 'adaptive'.")
+        self.static_delay = None if delay == 'adaptive' else delay
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.proxies = proxies
+        self.methods = frozenset(method.upper() for method in methods)
+        self._latencies = deque(maxlen=samples)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self.requests = 0
+        self.hedges = 0
+
+    def applies(self, method):
+        """Tells if requests with `method` can be hedged."""
+        return method.upper() in self.methods
+
+    def delay(self):
+        """Returns number of seconds after which hedge should be sent, None if there is not
+        enough observed latencies yet."""
+        if self.static_delay is not None:
+            return self.static_delay
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = max(0, math.ceil(len(latencies) * self.percentile / 100) - 1)
+        return latencies[index]
+
+    def observe(self, latency):
+        """Records latency of completed request."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def started(self):
+        """Counts request which may be hedged."""
+        with self._lock:
+            self.requests += 1
+
+    def allow(self):
+        """Takes hedge out of the budget if hedge ratio allows it.
+
+        :return: bool
+        """
+        with self._lock:
+            if self.hedges + 1 > self.max_ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def hedge_kwargs(self, kwargs):
+        """Returns request kwargs of hedge, with other working proxy from `proxies`
+        if they are set.
+
+        :param kwargs: request keyword arguments of the original request
+        :return: dict
+        """
+        if self.proxies is None:
+            return kwargs
+        used = str(kwargs.get('proxies', {}).get('http', ''))
+        candidates = [
+            proxy for proxy in self.proxies.working()
+            if not used.endswith('//{}'.format(proxy.address))
+        ]
+        if not candidates:
+            return kwargs
+        address = random.choice(candidates).address
+        return dict(kwargs, proxies={
+            'http': 'http://{}'.format(address),
+            'https': 'https://{}'.format(address),
+        })
+
+    def submit(self, function, *args):
+        """Runs request attempt on policy executor.
+
+        :return: `Future` with function result
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='hedge'
+                )
+            executor = self._executor
+        return executor.submit(function, *args)
+
+    def close(self):
+        """Shuts executor down, running attempts are not waited for."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def __repr__(self):
+        return '<HedgePolicy(delay={}, max_ratio={})>'.format(
+            self.static_delay or 'adaptive', self.max_ratio
+        )
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,9 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import io
+import json
+import struct
 from collections import defaultdict
-from lxml.html.clean import Cleaner
 
-__all__ = ['match_form', 'table_to_dict', 'filter_element']
+from lxml.html.clean import Cleaner
+from requests.models import PreparedRequest, Response
+from requests.structures import CaseInsensitiveDict
+
+__all__ = [
+    'match_form',
+    'table_to_dict',
+    'filter_element',
+    'build_response',
+    'pack_response',
+    'unpack_response'
+]
 
 MATCHINGS = {
     'IN': lambda value1, value2: value1 in value2,
@@ -127,6 +140,87 @@ def table_to_dict(table):
     return table_dict
 
 
+def build_response(url, status_code=200, headers=None, content=b'', encoding=None,
+                   reason=None, method='GET', history=None):
+    """Builds `requests` response object from already known values (no network involved).
+    Body is also readable as stream from in-memory ``raw``, so response can be streamed and
+    closed like one received from network.
+
+    :param url: response url
+    :param status_code: http status code
+    :param headers: dict or list of header pairs
+    :param content: body bytes
+    :param encoding: response encoding
+    :param reason: http reason phrase
+    :param method: http method of the request which produced response
+    :param history: list of redirect responses
+    :return: class::`Response <Response>` object
+    """
+    request = PreparedRequest()
+    request.method = method
+    request.url = url
+    request.headers = CaseInsensitiveDict()
+
+    response = Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers or {})
+    response._content = content
+    response.raw = io.BytesIO(content or b'')
+    response.encoding = encoding
+    response.reason = reason
+    response.request = request
+    response.history = history or []
+    return response
+
+
+def response_meta(response):
+    """Returns json serializable description of response without the body."""
+    return {
+        'url': response.url,
+        'status_code': response.status_code,
+        'reason': response.reason,
+        'headers': list(response.headers.items()),
+        'encoding': response.encoding,
+        'method': response.request.method if response.request else None,
+        'history': [response_meta(redirect) for redirect in response.history]
+    }
+
+
+def pack_response(response):
+    """Serializes response to bytes: length prefixed json metadata followed by body.
+
+    :param response: class::`Response <Response>` object
+    :return: bytes
+    """
+    meta = json.dumps(response_meta(response)).encode('utf-8')
+    return struct.pack('>I', len(meta)) + meta + (response.content or b'')
+
+
+def unpack_response(data):
+    """Restores response serialized by `pack_response`.
+
+    :param data: bytes
+    :return: class::`Response <Response>` object
+    """
+    meta_length, = struct.unpack_from('>I', data)
+    meta = json.loads(data[4:4 + meta_length].decode('utf-8'))
+    return response_from_meta(meta, content=data[4 + meta_length:])
+
+
+def response_from_meta(meta, content=b''):
+    return build_response(
+        meta['url'],
+        status_code=meta['status_code'],
+        headers=meta['headers'],
+        content=content,
+        encoding=meta['encoding'],
+        reason=meta['reason'],
+        method=meta['method'],
+        history=[response_from_meta(redirect) for redirect in meta.get('history', [])]
+    )
+
+
 def typed_property(name, expected_type):
     """Common function used to creating arguments with forced type
 
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import tempfile
+import zlib
+from collections import namedtuple, deque
+
+from .helpers import pack_response, unpack_response
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+Visited = namedtuple('Visited', 'url method response')
+SpilledRecord = namedtuple('SpilledRecord', 'seq offset length visited overflow')
+
+
+class HistoryEntry:
+    """Snapshot of a single visit stored in `Crawler` flow.
+
+    Holds response by reference (no copies are made). Parsed tree isn't kept,
+    parser is built from the response when navigation returns to the entry.
+    """
+
+    __slots__ = ['_response', '_parser_factory']
+
+    def __init__(self, response, parser_factory=None):
+        """HistoryEntry initialization
+
+        :param response: class::`Response <Response>` object
+        :param parser_factory: (optional) callable building parser from response
+        """
+        self._response = response
+        self._parser_factory = parser_factory
+
+    @property
+    def response(self):
+        return self._response
+
+    @property
+    def parser(self):
+        """New parser of entry response, None without parser factory."""
+        if self._parser_factory is None:
+            return None
+        return self._parser_factory(self.response)
+
+    @property
+    def url(self):
+        return self.response.url
+
+    @property
+    def method(self):
+        return self.response.request.method
+
+    @property
+    def status_code(self):
+        return self.response.status_code
+
+    @property
+    def headers(self):
+        return self.response.headers
+
+    @property
+    def content(self):
+        return self.response.content
+
+    @property
+    def encoding(self):
+        return self.response.encoding
+
+    def visited(self):
+        """Returns `Visited` tuple describing entry.
+
+        :return: namedtuple with url, method and status code
+        """
+        return Visited(self.url, self.method, self.status_code)
+
+    def __repr__(self):
+        return '<HistoryEntry(url={}, status_code={})>'.format(self.url, self.status_code)
+
+
+class SpilledEntry(HistoryEntry):
+    """History entry which lives compressed in `SpillingHistory` ring file.
+
+    Response is decompressed and restored only when it is accessed.
+    """
+
+    __slots__ = ['_record', '_storage']
+
+    def __init__(self, record, storage, parser_factory=None):
+        super().__init__(None, parser_factory=parser_factory)
+        self._record = record
+        self._storage = storage
+
+    @property
+    def response(self):
+        if self._response is None:
+            self._response = self._storage.load(self._record)
+        return self._response
+
+    def visited(self):
+        return self._record.visited
+
+
+class SpillingHistory:
+    """History storage with flat memory footprint.
+
+    Keeps newest `hot` entries in memory, older ones are compressed and spilled to
+    memory-mapped ring file. When ring file is full, the oldest entries are dropped.
+    Entries which don't fit into the ring file at all go to a separate overflow file.
+    Behaves like ``deque(maxlen=maxlen)`` of history entries.
+
+    Usage::
+
+        >>> history = SpillingHistory(maxlen=1000, hot=2, size=1024 * 1024)
+        >>> len(history)
+        0
+    """
+
+    def __init__(self, maxlen=1000, hot=5, path=None, size=64 * 1024 * 1024,
+                 compression='zlib'):
+        """SpillingHistory initialization
+
+        :param maxlen: max number of entries held in history
+        :param hot: number of newest entries kept in memory
+        :param path: (optional) ring file path, temporary file is used by default
+        :param size: ring file size in bytes
+        :param compression: 'zlib' or 'zstd' (requires `zstandard` package)
+        """
+        if compression == 'zstd':
+            if zstandard is None:
+                raise ImportError('zstd compression requires `zstandard` package.')
+            self._compress = zstandard.ZstdCompressor().compress
+            self._decompress = zstandard.ZstdDecompressor().decompress
+        elif compression == 'zlib':
+            self._compress = zlib.compress
+            self._decompress = zlib.decompress
+        else:
+            raise ValueError('Unknown compression: {}'.format(compression))
+        self.maxlen = maxlen
+        self._hot_limit = hot
+        self._hot = deque()
+        self._cold = deque()
+        self._size = size
+        self._file = open(path, 'w+b') if path else tempfile.TemporaryFile()
+        self._file.truncate(size)
+        self._ring = mmap.mmap(self._file.fileno(), size)
+        self._overflow = None
+        self._position = 0
+        self._seq = 0
+        self._loaded = None
+        self._parser_factory = None
+
+    def __len__(self):
+        return len(self._cold) + len(self._hot)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('history index out of range')
+        cold_length = len(self._cold)
+        if index >= cold_length:
+            return self._hot[index - cold_length]
+        record = self._cold[index]
+        if self._loaded is None or self._loaded._record.seq != record.seq:
+            self._loaded = SpilledEntry(record, self, parser_factory=self._parser_factory)
+        return self._loaded
+
+    def append(self, entry):
+        self._hot.append(entry)
+        if len(self._hot) > self._hot_limit:
+            self.spill(self._hot.popleft())
+        while len(self) > self.maxlen:
+            self.popleft()
+
+    def popleft(self):
+        if self._cold:
+            return self._cold.popleft()
+        return self._hot.popleft()
+
+    def spill(self, entry):
+        """Compresses entry and writes it to the ring file, dropping the oldest
+        entries which would be overwritten.
+
+        :param entry: `HistoryEntry` object
+        """
+        self._parser_factory = entry._parser_factory
+        data = self._compress(pack_response(entry.response))
+        length = len(data)
+        self._seq += 1
+        if length > self._size:
+            self._cold.append(SpilledRecord(
+                self._seq, self._write_overflow(data), length, entry.visited(), True
+            ))
+            return
+        start = self._position
+        if start + length > self._size:
+            self._evict(lambda record: record.offset >= start)
+            start = 0
+        end = start + length
+        self._evict(lambda record: self._overlaps(record, start, end))
+        self._ring[start:end] = data
+        self._position = end
+        self._cold.append(SpilledRecord(self._seq, start, length, entry.visited(), False))
+
+    def _evict(self, condition):
+        """Drops entries up to the oldest one in ring file, as long as it meets condition."""
+        while True:
+            oldest = next((record for record in self._cold if not record.overflow), None)
+            if oldest is None or not condition(oldest):
+                return
+            while self._cold.popleft() is not oldest:
+                pass
+
+    def _write_overflow(self, data):
+        if self._overflow is None:
+            self._overflow = tempfile.TemporaryFile()
+        if not any(record.overflow for record in self._cold):
+            self._overflow.truncate(0)
+        offset = self._overflow.seek(0, 2)
+        self._overflow.write(data)
+        return offset
+
+    @staticmethod
+    def _overlaps(record, start, end):
+        return record.offset < end and start < record.offset + record.length
+
+    def load(self, record):
+        """Restores response of spilled entry.
+
+        :param record: `SpilledRecord` tuple
+        :return: class::`Response <Response>` object
+        """
+        if record.overflow:
+            self._overflow.seek(record.offset)
+            data = self._overflow.read(record.length)
+        else:
+            data = self._ring[record.offset:record.offset + record.length]
+        return unpack_response(self._decompress(data))
+
+    def clear(self):
+        self._hot.clear()
+        self._cold.clear()
+        self._position = 0
+        self._loaded = None
+
+    def close(self):
+        """Releases ring file and its memory map."""
+        self.clear()
+        if self._ring.closed:
+            return
+        self._ring.close()
+        self._file.close()
+        if self._overflow is not None:
+            self._overflow.close()
+            self._overflow = None
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
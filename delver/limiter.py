@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import requests
+
+from .exceptions import DeadlineError
+from .scheduler import host_key
+
+FAILURE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    DeadlineError,
+)
+LATENCY_FLOOR = 0.01
+
+
+def is_overload(result=None, error=None):
+    """Tells if request outcome signals overloaded host: timeout, connection error,
+    429 or 5xx status.
+
+    :param result: class::`Response <Response>`, `Page` or other result of request
+    :param error: exception raised by request
+    :return: bool
+    """
+    error = error or getattr(result, 'error', None)
+    if error is not None:
+        return isinstance(error, FAILURE_EXCEPTIONS)
+    status_code = getattr(result, 'status_code', None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+class HostLimit:
+    """Concurrency state of a single host."""
+
+    __slots__ = ['limit', 'in_flight', 'latency', 'min_latency', 'last_decrease']
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.latency = None
+        self.min_latency = None
+        self.last_decrease = None
+
+    def as_dict(self):
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'latency': self.latency,
+        }
+
+
+class AdaptiveLimiter:
+    """Per host concurrency limit adjusted by AIMD (additive increase, multiplicative
+    decrease). Limit grows by `increase` per limit's worth of healthy responses and is
+    multiplied by `decrease` on timeouts, connection errors, 429 and 5xx responses.
+    Responses slower than `slow_factor` times the fastest observed one keep limit as is.
+
+    Usage::
+
+        >>> limiter = AdaptiveLimiter(initial=2, maximum=4)
+        >>> results = [limiter.call('http://example.com/', lambda: 'ok') for _ in range(8)]
+        >>> limiter.limits()['example.com']['limit']
+        4
+        >>> limiter.finish('http://example.com/', error=requests.exceptions.Timeout())
+        >>> limiter.limits()['example.com']['limit']
+        2
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1, decrease=0.5,
+                 slow_factor=3, cooldown=1.0, clock=time.monotonic):
+        """AdaptiveLimiter initialization
+
+        :param initial: starting limit of a host
+        :param minimum: lowest limit
+        :param maximum: highest limit
+        :param increase: limit increase per round of healthy responses
+        :param decrease: limit multiplier applied on overload
+        :param slow_factor: responses slower than fastest one times `slow_factor` don't
+            increase limit
+        :param cooldown: min number of seconds between decreases of a host limit, so one
+            burst of failed requests cuts limit only once
+        :param clock: callable returning current time in seconds
+        """
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self.cooldown = cooldown
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._hosts = {}
+
+    def _host(self, url):
+        key = host_key(url)
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = HostLimit(self.initial)
+        return host
+
+    def available(self, url):
+        """Tells if request to url host can start now."""
+        with self._condition:
+            host = self._host(url)
+            return host.in_flight < int(host.limit)
+
+    def try_acquire(self, url):
+        """Takes slot of url host if there is a free one.
+
+        :param url: url str
+        :return: bool
+        """
+        with self._condition:
+            host = self._host(url)
+            if host.in_flight < int(host.limit):
+                host.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, url, timeout=None):
+        """Waits for free slot of url host and takes it.
+
+        :param url: url str
+        :param timeout: (optional) max number of seconds to wait
+        :return: True if slot was taken, False on timeout
+        """
+        with self._condition:
+            host = self._host(url)
+            if not self._condition.wait_for(
+                    lambda: host.in_flight < int(host.limit), timeout
+            ):
+                return False
+            host.in_flight += 1
+            return True
+
+    def finish(self, url, started=None, result=None, error=None):
+        """Releases slot of url host and adjusts its limit according to request outcome.
+
+        :param url: url str
+        :param started: (optional) clock time request started at, for latency tracking
+        :param result: (optional) response or `Page` returned by request
+        :param error: (optional) exception raised by request
+        """
+        error = error or getattr(result, 'error', None)
+        with self._condition:
+            host = self._host(url)
+            host.in_flight = max(0, host.in_flight - 1)
+            now = self.clock()
+            if is_overload(result, error):
+                if host.last_decrease is None or now - host.last_decrease >= self.cooldown:
+                    host.limit = max(self.minimum, host.limit * self.decrease)
+                    host.last_decrease = now
+            elif error is None:
+                healthy = True
+                if started is not None:
+                    latency = now - started
+                    host.latency = latency if host.latency is None else (
+                        0.8 * host.latency + 0.2 * latency
+                    )
+                    if host.min_latency is None or latency < host.min_latency:
+                        host.min_latency = latency
+                    healthy = latency <= max(host.min_latency, LATENCY_FLOOR) * self.slow_factor
+                if healthy:
+                    host.limit = min(
+                        self.maximum, host.limit + self.increase / max(1, int(host.limit))
+                    )
+            self._condition.notify_all()
+
+    def call(self, url, function, *args, **kwargs):
+        """Calls `function` within slot of url host.
+
+        :param url: url str
+        :param function: callable sending request to url
+        :return: function result
+        """
+        self.acquire(url)
+        started = self.clock()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as error:
+            self.finish(url, started, error=error)
+            raise
+        self.finish(url, started, result)
+        return result
+
+    def limits(self):
+        """Returns current state of hosts: limit, requests in flight and average latency.
+
+        :return: dict of hosts and dicts
+        """
+        with self._condition:
+            return {key: host.as_dict() for key, host in self._hosts.items()}
+
+    def __repr__(self):
+        return '<AdaptiveLimiter(initial={}, minimum={}, maximum={})>'.format(
+            self.initial, self.minimum, self.maximum
+        )
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
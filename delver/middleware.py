@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+
+class Request:
+    """Request passing through middlewares. Middlewares may change its attributes
+    before it is sent.
+    """
+
+    __slots__ = ['method', 'url', 'kwargs', 'meta']
+
+    def __init__(self, method, url, kwargs=None, meta=None):
+        """Request initialization
+
+        :param method: 'get', 'post' etc. str
+        :param url: url str
+        :param kwargs: `requests` keyword arguments like headers, data, proxies
+        :param meta: dict for middlewares to share data about the request
+        """
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.meta = meta if meta is not None else {}
+
+    def __repr__(self):
+        return '<Request(method={}, url={})>'.format(self.method.upper(), self.url)
+
+
+class Middleware:
+    """Base class of `Crawler` middlewares. Subclasses override hooks they need.
+
+    - ``process_request`` is called before request is sent. Returning response
+      short-circuits the chain: network isn't touched and remaining middlewares are skipped.
+    - ``process_response`` is called with received response in reversed order and returns
+      (possibly replaced) response.
+    - ``process_exception`` is called when sending failed. Returning response recovers from
+      the error, returning None passes exception further.
+    """
+
+    def process_request(self, request, crawler):
+        return None
+
+    def process_response(self, request, response, crawler):
+        return response
+
+    def process_exception(self, request, exception, crawler):
+        return None
+
+
+class MiddlewareChain:
+    """Ordered list of middlewares wrapped around every request attempt.
+
+    Usage::
+
+        >>> class Tagging(Middleware):
+        ...     def process_request(self, request, crawler):
+        ...         request.meta['tagged'] = True
+        >>> chain = MiddlewareChain([Tagging()])
+        >>> len(chain)
+        1
+    """
+
+    def __init__(self, middlewares=None):
+        self._middlewares = list(middlewares or [])
+
+    def __len__(self):
+        return len(self._middlewares)
+
+    def __iter__(self):
+        return iter(self._middlewares)
+
+    def __getitem__(self, item):
+        return self._middlewares[item]
+
+    def append(self, middleware):
+        self._middlewares.append(middleware)
+
+    def insert(self, index, middleware):
+        self._middlewares.insert(index, middleware)
+
+    def remove(self, middleware):
+        self._middlewares.remove(middleware)
+
+    def clear(self):
+        self._middlewares.clear()
+
+    def handle(self, request, send, crawler):
+        """Passes request through middlewares and sends it if none of them
+        short-circuited it.
+
+        :param request: `Request` object
+        :param send: callable sending `Request` and returning response
+        :param crawler: `Crawler` object
+        :return: class::`Response <Response>` object
+        """
+        middlewares, response = self.process_request(request, crawler)
+        if response is None:
+            try:
+                response = send(request)
+            except Exception as error:
+                response = self.handle_exception(middlewares, request, error, crawler)
+        return self.process_response(middlewares, request, response, crawler)
+
+    async def handle_async(self, request, send, crawler):
+        """Same as `handle`, but `send` is a coroutine function.
+
+        :param request: `Request` object
+        :param send: coroutine function sending `Request` and returning response
+        :param crawler: `AsyncCrawler` object
+        :return: class::`Response <Response>` object
+        """
+        middlewares, response = self.process_request(request, crawler)
+        if response is None:
+            try:
+                response = await send(request)
+            except Exception as error:
+                response = self.handle_exception(middlewares, request, error, crawler)
+        return self.process_response(middlewares, request, response, crawler)
+
+    def process_request(self, request, crawler):
+        """Calls ``process_request`` hooks until one of them returns response.
+
+        :return: tuple of middlewares which processed request and response or None
+        """
+        middlewares = list(self._middlewares)
+        for index, middleware in enumerate(middlewares):
+            response = middleware.process_request(request, crawler)
+            if response is not None:
+                return middlewares[:index], response
+        return middlewares, None
+
+    @staticmethod
+    def process_response(middlewares, request, response, crawler):
+        for middleware in reversed(middlewares):
+            response = middleware.process_response(request, response, crawler)
+        return response
+
+    @staticmethod
+    def handle_exception(middlewares, request, error, crawler):
+        for middleware in reversed(middlewares):
+            response = middleware.process_exception(request, error, crawler)
+            if response is not None:
+                return response
+        raise error
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,8 +1,10 @@
 # -*- coding:utf-8 -*-
 
-from urllib.parse import urlparse
+import threading
+from urllib.parse import urljoin
 
-from lxml import html
+from lxml import etree, html
+from lxml.html.defs import link_attrs
 from lxml.html.clean import Cleaner
 
 from .forms import FormWrapper
@@ -11,27 +13,114 @@ from .helpers import (
     filter_element
 )
 
+PARSE_PROFILES = {
+    'default': {
+        'parser_options': None,
+        'drop_tags': (),
+    },
+    'lean': {
+        'parser_options': {
+            'remove_comments': True,
+            'remove_pis': True,
+            'collect_ids': False,
+        },
+        'drop_tags': ('script', 'style', 'noscript'),
+    },
+}
+
+_local = threading.local()
+
+
+def get_html_parser(profile):
+    """Returns `lxml.html.HTMLParser` configured for given parse profile. Parsers are not
+    thread safe, so every thread reuses its own instance.
+
+    :param profile: name of profile from `PARSE_PROFILES`
+    :return: `lxml.html.HTMLParser` object or None for default lxml parser
+    """
+    options = PARSE_PROFILES[profile]['parser_options']
+    if options is None:
+        return None
+    parsers = getattr(_local, 'parsers', None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    if profile not in parsers:
+        parsers[profile] = html.HTMLParser(**options)
+    return parsers[profile]
+
 
 class HtmlParser:
     """ Parses response content string to valid html using `lxml.html`
+
+    Parsing is lazy, html tree is built on first access to it (by ``xpath``, ``css``,
+    ``find_links``, ``find_forms`` etc.), so responses which are never queried cost nothing.
     """
 
-    def __init__(self, response, session=None, use_cleaner=None, cleaner_params=None):
-        self._html_tree = html.fromstring(response.content)
+    def __init__(self, response, session=None, use_cleaner=None, cleaner_params=None,
+                 profile='default'):
+        self._content = response.content
+        self._profile = profile
+        self._html_tree = None
+        self._absolute_links = False
+        self._base_url = None
         self.links = {}
         self._forms = []
-        self._cleaner = Cleaner(**cleaner_params) if use_cleaner else None
+        self._cleaner = Cleaner(**(cleaner_params or {})) if use_cleaner else None
         self._session = session
         self._url = response.url
 
+    @property
+    def html_tree(self):
+        """Html tree of the document, parsed when it's needed for the first time."""
+        if self._html_tree is None:
+            self._html_tree = html.fromstring(
+                self._content,
+                base_url=self._url,
+                parser=get_html_parser(self._profile)
+            )
+            drop_tags = PARSE_PROFILES[self._profile]['drop_tags']
+            if drop_tags:
+                etree.strip_elements(self._html_tree, *drop_tags, with_tail=False)
+            if self._cleaner:
+                self._cleaner(self._html_tree)
+        return self._html_tree
+
+    @property
+    def parsed(self):
+        """Tells if html tree was already built."""
+        return self._html_tree is not None
+
+    @property
+    def base_url(self):
+        """Base url of the document. Document url resolved against ``<base href>`` if present.
+        """
+        if self._base_url is None:
+            base_href = self.html_tree.xpath('//base[@href][1]/@href')
+            self._base_url = urljoin(self._url, base_href[0].strip()) if base_href else self._url
+        return self._base_url
+
     def make_links_absolute(self):
-        """Makes absolute links http://domain.com/index.html from the relative ones /index.html
+        """Makes links returned by ``find_links``, ``xpath`` etc. absolute
+        http://domain.com/index.html instead of the relative ones /index.html
+
+        Document tree itself isn't rewritten, links are resolved only when they are extracted.
+        """
+        self._absolute_links = True
+
+    def resolve_url(self, url):
+        """Returns url resolved against document base url if absolute links are turned on.
+
+        :param url: url str, possibly relative
+        :return: str
         """
-        parsed_url = urlparse(self._url)
-        self._html_tree.make_links_absolute(
-            '{url.scheme}://{url.netloc}/'.format(url=parsed_url),
-            resolve_base_href=True
-        )
+        if self._absolute_links:
+            return urljoin(self.base_url, url.strip())
+        return url
+
+    def _resolve_result(self, result):
+        if getattr(result, 'is_attribute', False) and result.attrname in link_attrs:
+            return self.resolve_url(result)
+        return result
 
     def find_links(self, tags=None, filters=None, match='EQUAL'):
         """ Find links and iterate through them checking if they are matching given filters and
@@ -49,7 +138,7 @@ class HtmlParser:
         """
         filters = filters or {}
         tags = tags or ['a']
-        for link, _, url, _ in self._html_tree.iterlinks():
+        for link, _, url, _ in self.html_tree.iterlinks():
             matched = filter_element(
                 link,
                 tags=tags,
@@ -57,7 +146,7 @@ class HtmlParser:
                 match=match
             )
             if matched:
-                self.links[url] = matched
+                self.links[self.resolve_url(url)] = matched
         return self.links
 
     def find_forms(self, filters=None):
@@ -74,19 +163,37 @@ class HtmlParser:
         """
         filters = filters or {}
         self._forms = []
-        for form in self._html_tree.forms:
-            wrapped_form = FormWrapper(form, session=self._session, url=self._url)
+        for form in self.html_tree.forms:
+            wrapped_form = FormWrapper(form, session=self._session, url=self.base_url)
             if match_form(wrapped_form, filters):
                 self._forms.append(wrapped_form)
         return self._forms
 
     def xpath(self, path):
-        """Select elements using xpath selectors"""
-        return self._html_tree.xpath(path)
+        """Select elements using xpath selectors. Selected link attributes (like
+        ``//a/@href``) are made absolute if absolute links are turned on. Document tree isn't
+        rewritten, so attributes of returned elements keep urls as they are written in the
+        document, use ``resolve_url`` to make them absolute:
+
+        >>> from delver.helpers import build_response
+        >>> parser = HtmlParser(build_response(
+        ...     'http://example.com/dir/', content=b'<html><body><a href="x">x</a></body></html>'
+        ... ))
+        >>> parser.make_links_absolute()
+        >>> parser.xpath('//a/@href')
+        ['http://example.com/dir/x']
+        >>> parser.resolve_url(parser.xpath('//a')[0].get('href'))
+        'http://example.com/dir/x'
+        """
+        results = self.html_tree.xpath(path)
+        if self._absolute_links and isinstance(results, list):
+            return [self._resolve_result(result) for result in results]
+        return results
 
     def css(self, selector):
-        """Select elements by css selectors"""
-        return self._html_tree.cssselect(selector)
+        """Select elements by css selectors. Attributes of returned elements keep urls as
+        they are written in the document, use ``resolve_url`` to make them absolute."""
+        return self.html_tree.cssselect(selector)
 
 
 if __name__ == '__main__':
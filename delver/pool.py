@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from requests.structures import CaseInsensitiveDict
+
+from .crawler import Crawler
+from .exceptions import PoolError
+
+
+class ThreadSafeCookieJar(RequestsCookieJar):
+    """`RequestsCookieJar` safe to share between threads.
+
+    Cookie jar locks its own updates, but dict-like reads (``get``, ``items``,
+    ``keys`` etc.) iterate over cookies while other threads may store new ones.
+    Iteration goes over a snapshot taken under the jar lock.
+    """
+
+    def __iter__(self):
+        with self._cookies_lock:
+            cookies = list(super().__iter__())
+        return iter(cookies)
+
+    def copy(self):
+        new_cj = ThreadSafeCookieJar()
+        new_cj.set_policy(self.get_policy())
+        new_cj.update(self)
+        return new_cj
+
+
+class CrawlerPool:
+    """Pool of crawlers sharing one cookie jar, default headers and connection pool.
+
+    Every crawler has its own navigation state (current page, history), so crawlers can be
+    used by many threads at once, while cookies set by one of them (like after login) are
+    seen by all and keep-alive connections are reused between them.
+
+    Crawlers are checked out and returned with ``checkout`` and ``checkin`` or with
+    ``crawler`` context manager. ``local`` returns crawler bound to current thread.
+
+    Usage::
+
+        >>> pool = CrawlerPool(size=4)
+        >>> pool.headers['User-Agent'] = 'Delver'
+        >>> with pool.crawler() as c:
+        ...     c.open('https://httpbin.org/cookies/set?session=1')
+        <Response [200]>
+        >>> def cookies(url):
+        ...     return pool.local().fetch(url).json()['cookies']
+        >>> from concurrent.futures import ThreadPoolExecutor
+        >>> with ThreadPoolExecutor(4) as executor:
+        ...     list(executor.map(cookies, ['https://httpbin.org/cookies'] * 4))
+        [{'session': '1'}, {'session': '1'}, {'session': '1'}, {'session': '1'}]
+    """
+
+    def __init__(self, size=10, pool_connections=10, pool_maxsize=None, crawler_class=Crawler,
+                 setup=None, **crawler_kwargs):
+        """CrawlerPool initialization
+
+        :param size: max number of checked out crawlers
+        :param pool_connections: number of hosts kept in connection pool
+        :param pool_maxsize: max number of connections kept per host, `size` by default
+        :param crawler_class: `Crawler` subclass of created crawlers
+        :param setup: (optional) callable called with every new crawler, for setting
+            useragent, proxy, retry policy, middlewares etc.
+        :param crawler_kwargs: keyword arguments passed to crawler class
+        """
+        if not (isinstance(crawler_class, type) and issubclass(crawler_class, Crawler)):
+            raise TypeError('Expected Crawler subclass.')
+        self._size = size
+        self._crawler_class = crawler_class
+        self._setup = setup
+        self._crawler_kwargs = crawler_kwargs
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.cookies = ThreadSafeCookieJar()
+        self.headers = CaseInsensitiveDict(requests.utils.default_headers())
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize or size
+        )
+
+    @property
+    def size(self):
+        return self._size
+
+    def session(self):
+        """Returns new session backed by pool cookie jar, headers and connection pool.
+
+        :return: `requests.Session` object
+        """
+        session = requests.Session()
+        session.cookies = self.cookies
+        session.headers = self.headers
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        return session
+
+    def make_crawler(self):
+        """Creates crawler using pool session.
+
+        :return: `Crawler` object
+        """
+        crawler = self._crawler_class(session=self.session(), **self._crawler_kwargs)
+        if self._setup is not None:
+            self._setup(crawler)
+        return crawler
+
+    def checkout(self, timeout=None):
+        """Takes crawler out of the pool. Waits for returned crawler if `size` crawlers
+        are already checked out.
+
+        :param timeout: (optional) max number of seconds to wait
+        :return: `Crawler` object
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self._size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.make_crawler()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolError('No crawler returned to the pool in {} seconds.'.format(timeout))
+
+    def checkin(self, crawler):
+        """Returns crawler to the pool. Its current page and history are cleared,
+        cookies stay in the pool.
+
+        :param crawler: `Crawler` object taken by ``checkout``
+        """
+        crawler._flow.clear()
+        crawler._index = 0
+        crawler._current_response = None
+        crawler._parser = None
+        self._idle.put(crawler)
+
+    @contextmanager
+    def crawler(self, timeout=None):
+        """Context manager checking crawler out and returning it afterwards.
+
+        :param timeout: (optional) max number of seconds to wait for crawler
+        """
+        crawler = self.checkout(timeout)
+        try:
+            yield crawler
+        finally:
+            self.checkin(crawler)
+
+    def local(self):
+        """Returns crawler bound to current thread, created on first use. Thread crawlers
+        share pool cookies and connections, but don't count to pool `size`.
+
+        :return: `Crawler` object
+        """
+        crawler = getattr(self._local, 'crawler', None)
+        if crawler is None:
+            crawler = self._local.crawler = self.make_crawler()
+        return crawler
+
+    def close(self):
+        """Closes pooled connections and releases history of idle crawlers."""
+        while True:
+            try:
+                self._idle.get_nowait().close_history()
+            except queue.Empty:
+                break
+        self.adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -79,11 +79,14 @@ class ProxyPool:
 
     .. todo:: Add loading from file and adding, removing single items
     """
-    def __init__(self, workers=10):
+    def __init__(self, workers=10, limiter=None):
         """ ProxyPool initialization
 
         :param workers: max workers number for executor
+        :param limiter: (optional) `AdaptiveLimiter` adjusting number of concurrent tests
+            sent to proxy test url host
         """
+        self._limiter = limiter
         self._proxies = []
         self._executor = ThreadPoolExecutor(max_workers=workers)
         self._loop = None
@@ -147,7 +150,9 @@ class ProxyPool:
         """
         try:
             proxy = Proxy(address)
-            if test:
+            if test and self._limiter is not None:
+                self._limiter.call(proxy._test_url, proxy.test)
+            elif test:
                 proxy.test()
         except Exception as err:
             proxy.working = False
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+class RetryPolicy:
+    """Decides if failed request should be retried and how long to wait before next attempt.
+
+    Delays grow exponentially (``backoff_base * 2 ** (attempt - 1)``, limited by
+    ``backoff_cap``) and with full jitter are drawn randomly from ``[0, delay]``, so crawlers
+    failing at the same time don't retry in lockstep.
+
+    Usage::
+
+        >>> policy = RetryPolicy(max_attempts=3, jitter=False)
+        >>> policy.delay(1), policy.delay(2), policy.delay(10)
+        (1, 2, 60)
+        >>> policy.retry_exception(requests.exceptions.ConnectionError(), attempt=1)
+        True
+        >>> policy.retry_exception(requests.exceptions.ConnectionError(), attempt=3)
+        False
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=1, backoff_cap=60, jitter=True,
+                 status_codes=RETRY_STATUS_CODES, exceptions=RETRY_EXCEPTIONS,
+                 respect_retry_after=True):
+        """RetryPolicy initialization
+
+        :param max_attempts: max number of attempts, including the first one
+        :param backoff_base: delay in seconds after first failed attempt
+        :param backoff_cap: max delay in seconds
+        :param jitter: bool, use full jitter
+        :param status_codes: response status codes which are retried
+        :param exceptions: tuple of exception classes which are retried
+        :param respect_retry_after: bool, wait as long as `Retry-After` header says
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.jitter = jitter
+        self.status_codes = frozenset(status_codes or ())
+        self.exceptions = tuple(exceptions or ())
+        self.respect_retry_after = respect_retry_after
+
+    def retry_exception(self, error, attempt):
+        """Tells if request which raised `error` should be retried.
+
+        :param error: exception raised by the attempt
+        :param attempt: number of the failed attempt, starting from 1
+        :return: bool
+        """
+        return attempt < self.max_attempts and isinstance(error, self.exceptions)
+
+    def retry_response(self, response, attempt):
+        """Tells if request which ended with `response` should be retried.
+
+        :param response: class::`Response <Response>` object
+        :param attempt: number of the attempt, starting from 1
+        :return: bool
+        """
+        return attempt < self.max_attempts and response.status_code in self.status_codes
+
+    def delay(self, attempt, response=None):
+        """Returns number of seconds to wait before next attempt.
+
+        :param attempt: number of the failed attempt, starting from 1
+        :param response: (optional) response of the failed attempt
+        :return: number of seconds
+        """
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if self.respect_retry_after and response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = min(self.backoff_cap, max(delay, retry_after))
+        return delay
+
+
+def parse_retry_after(value):
+    """Parses `Retry-After` header value given in seconds or as http date.
+
+    :param value: header value or None
+    :return: number of seconds or None
+
+    Usage::
+
+        >>> parse_retry_after('120')
+        120.0
+        >>> parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT')
+        0.0
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
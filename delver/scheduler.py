@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import OrderedDict, deque
+from random import uniform
+from urllib.parse import urlsplit
+
+
+def host_key(url):
+    """Returns scheduling key of url, its lowercased netloc.
+
+    >>> host_key('https://Docs.Python.org/3/')
+    'docs.python.org'
+    """
+    return urlsplit(url).netloc.lower()
+
+
+class HostScheduler:
+    """Per host politeness. Spaces requests to the same host by `delay` seconds and/or limits
+    them to `rate` requests per second with bursts of `burst` requests (token bucket).
+    Requests to different hosts don't wait for each other.
+
+    Scheduler only computes when request may be sent. Blocking callers use ``wait``,
+    crawl loops use ``delay`` and ``reserve`` to pick hosts which are ready.
+
+    Usage::
+
+        >>> scheduler = HostScheduler(delay=2)
+        >>> scheduler.reserve('http://example.com/1')
+        0.0
+        >>> 1.9 < scheduler.reserve('http://example.com/2') <= 2
+        True
+        >>> scheduler.reserve('http://other.com/')
+        0.0
+    """
+
+    def __init__(self, delay=None, rate=None, burst=1, clock=time.monotonic):
+        """HostScheduler initialization
+
+        :param delay: (optional) seconds between requests to the same host, number or
+            (min, max) tuple for random delay
+        :param rate: (optional) max number of requests per second to the same host
+        :param burst: number of requests which can be sent at once within `rate`
+        :param clock: callable returning current time in seconds
+        """
+        if delay is not None and not isinstance(delay, (int, float, list, tuple)):
+            raise TypeError('Expected number, list or tuple.')
+        self.delay_range = delay
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    @property
+    def active(self):
+        """Tells if scheduler limits anything."""
+        return bool(self.delay_range or self.rate)
+
+    def interval(self):
+        """Returns spacing of next request to the same host, in seconds."""
+        delay = self.delay_range or 0
+        if isinstance(delay, (list, tuple)):
+            delay = uniform(*delay)
+        if self.rate:
+            delay = max(delay, 1 / self.rate)
+        return delay
+
+    def _tolerance(self):
+        if self.rate:
+            return (self.burst - 1) / self.rate
+        return 0
+
+    def delay(self, url):
+        """Returns number of seconds to wait before request to url host can be sent.
+        Nothing is reserved.
+
+        :param url: url str
+        :return: float
+        """
+        with self._lock:
+            return self._delay(host_key(url), self._clock())
+
+    def _delay(self, host, now):
+        theoretical = self._hosts.get(host)
+        if theoretical is None:
+            return 0.0
+        return max(0.0, theoretical - self._tolerance() - now)
+
+    def reserve(self, url):
+        """Reserves next request slot of url host.
+
+        :param url: url str
+        :return: number of seconds to wait before request is sent
+        """
+        host = host_key(url)
+        with self._lock:
+            now = self._clock()
+            if not self.active:
+                return 0.0
+            wait = self._delay(host, now)
+            theoretical = max(self._hosts.get(host, now), now)
+            self._hosts[host] = theoretical + self.interval()
+            return wait
+
+    def wait(self, url, token=None):
+        """Reserves request slot of url host and sleeps until it comes.
+
+        :param url: url str
+        :param token: (optional) `CancelToken` interrupting sleep
+        :return: True if sleep was interrupted by token
+        """
+        seconds = self.reserve(url)
+        if seconds <= 0:
+            return False
+        if token is not None:
+            return token.wait(seconds)
+        time.sleep(seconds)
+        return False
+
+    def state(self):
+        """Returns per host scheduling state, remaining seconds to next free slot of hosts.
+
+        :return: dict
+        """
+        with self._lock:
+            now = self._clock()
+            return {
+                host: theoretical - now
+                for host, theoretical in self._hosts.items() if theoretical > now
+            }
+
+    def restore(self, state):
+        """Restores state returned by ``state``.
+
+        :param state: dict of hosts and remaining seconds
+        """
+        with self._lock:
+            now = self._clock()
+            for host, remaining in state.items():
+                self._hosts[host] = now + remaining
+
+    def __repr__(self):
+        return '<HostScheduler(delay={}, rate={}, burst={})>'.format(
+            self.delay_range, self.rate, self.burst
+        )
+
+
+class HostQueue:
+    """Queue of urls grouped by host, handing out urls of hosts which are ready according to
+    `HostScheduler` and have free slot in `AdaptiveLimiter`, if it's given. Hosts are served
+    round robin, so one slow host doesn't hold up others.
+
+    Usage::
+
+        >>> queue = HostQueue(HostScheduler(delay=10))
+        >>> for url in ['http://a.com/1', 'http://a.com/2', 'http://b.com/1']:
+        ...     queue.push(url, url)
+        >>> queue.pop()
+        ('http://a.com/1', 0.0)
+        >>> queue.pop()
+        ('http://b.com/1', 0.0)
+        >>> item, delay = queue.pop()
+        >>> item is None and 9 < delay <= 10
+        True
+    """
+
+    def __init__(self, scheduler, limiter=None):
+        """HostQueue initialization
+
+        :param scheduler: `HostScheduler` object
+        :param limiter: (optional) `AdaptiveLimiter` object
+        """
+        self._scheduler = scheduler
+        self._limiter = limiter
+        self._hosts = OrderedDict()
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def push(self, url, item):
+        """Adds item requesting url.
+
+        :param url: url str
+        :param item: any object returned by ``pop``
+        """
+        self._hosts.setdefault(host_key(url), deque()).append((url, item))
+        self._length += 1
+
+    def pop(self):
+        """Takes item of the first ready host and reserves request slot of that host.
+        Limiter slot taken for the item has to be released with ``limiter.finish``.
+
+        :return: tuple of item (None if no host is ready) and seconds until some host is ready,
+            None if hosts wait for limiter slots
+        """
+        shortest = None
+        for host, items in self._hosts.items():
+            url, item = items[0]
+            delay = self._scheduler.delay(url)
+            if delay <= 0 and (self._limiter is None or self._limiter.try_acquire(url)):
+                self._scheduler.reserve(url)
+                items.popleft()
+                self._length -= 1
+                del self._hosts[host]
+                if items:
+                    self._hosts[host] = items
+                return item, 0.0
+            if delay > 0 and (shortest is None or delay < shortest):
+                shortest = delay
+        return None, shortest
+
+    def clear(self):
+        self._hosts.clear()
+        self._length = 0
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -2,6 +2,7 @@
 
 from lxml.html import HtmlElement
 
+from .exceptions import CrawlerError
 from .helpers import table_to_dict, filter_element
 
 
@@ -13,7 +14,8 @@ class Scraper:
         self.current_results = []
 
     def css(self, selector):
-        """Wraps lxml parser css method"""
+        """Wraps lxml parser css method. Attributes of returned elements keep urls as they
+        are written in the document, ``resolve_url`` makes them absolute."""
         results = self._parser.css(selector)
         if not isinstance(results, list):
             results = [results]
@@ -21,13 +23,24 @@ class Scraper:
         return self.current_results
 
     def xpath(self, path):
-        """Wraps lxml parser xpath method"""
+        """Wraps lxml parser xpath method. Selected link attributes (like ``//a/@href``) are
+        made absolute if absolute links are turned on, attributes of returned elements keep
+        urls as they are written in the document, ``resolve_url`` makes them absolute."""
         results = self._parser.xpath(path)
         if not isinstance(results, list):
             results = [results]
         self.current_results = ResultsList(results)
         return self.current_results
 
+    def resolve_url(self, url):
+        """Resolves url taken from the document against its base url, if absolute links
+        are turned on.
+
+        :param url: url str, possibly relative
+        :return: str
+        """
+        return self._parser.resolve_url(url)
+
     def regexp(self, selectors=None):
         """Not implemented due the poor performance."""
         raise NotImplementedError
@@ -93,7 +106,7 @@ class Scraper:
                     custom_attrs=['alt', 'src']
                 )
                 if matched:
-                    images.append(src)
+                    images.append(self._parser.resolve_url(src))
         self.current_results = ResultsList(images)
         return self.current_results
 
@@ -108,6 +121,67 @@ class Scraper:
         ]
 
 
+class Page(Scraper):
+    """Result of a single fetch made outside of `Crawler` flow, like the ones yielded by
+    `Crawler.open_many`. Offers the same scraping methods as `Crawler` for its own response,
+    so pages can be scraped independently of each other and of the crawler.
+
+    Parser is built lazily, on the first scraping call.
+    """
+
+    def __init__(self, url, response=None, error=None, parser_factory=None):
+        """Page initialization
+
+        :param url: requested url str
+        :param response: (optional) class::`Response <Response>` object
+        :param error: (optional) exception raised while fetching the page
+        :param parser_factory: (optional) callable building parser from response
+        """
+        super().__init__()
+        self.url = url
+        self.response = response
+        self.error = error
+        self._parser_factory = parser_factory
+        self._page_parser = None
+
+    @property
+    def ok(self):
+        """Tells if page was fetched without errors."""
+        return self.error is None and self.response is not None
+
+    @property
+    def status_code(self):
+        return self.response.status_code if self.response is not None else None
+
+    @property
+    def _parser(self):
+        if self._page_parser is None and self.ok and self._parser_factory is not None:
+            self._page_parser = self._parser_factory(self.response)
+        if self._page_parser is None:
+            raise CrawlerError("Page {} has no parser.".format(self.url))
+        return self._page_parser
+
+    def current_parser(self):
+        """Return parser of the page.
+
+        :return: matched parser object like: class::`HtmlParser <HtmlParser>` object
+        """
+        return self._parser
+
+    def forms(self, filters=None):
+        """Return forms found on the page.
+
+        :param filters: dict of filters, like in `Crawler.forms`
+        :return: list of `FormWrapper` objects
+        """
+        return self._parser.find_forms(filters or {})
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<Page(url={}, error={!r})>'.format(self.url, self.error)
+        return '<Page(url={}, status_code={})>'.format(self.url, self.status_code)
+
+
 class ResultsList:
 
     __slots__ = ['results']
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+STOP = object()
+
+
+class Sink:
+    """Base class of batched record writers. Records are collected into batches of
+    `batch_size` and written with a single ``write_batch`` call. Batch which doesn't fill up
+    is written after `flush_interval` seconds.
+
+    With `background` set, batches are written by a writer thread, so extraction doesn't
+    wait for i/o. Writer errors are raised by the next ``write``, ``flush`` or ``close``.
+    Subclasses implement ``write_batch`` and optionally ``close_output``.
+    """
+
+    def __init__(self, batch_size=1000, flush_interval=1.0, background=True, queue_size=4):
+        """Sink initialization
+
+        :param batch_size: number of records written at once
+        :param flush_interval: max number of seconds record waits for its batch, None for
+            no limit
+        :param background: write batches in a writer thread
+        :param queue_size: max number of batches waiting for writer thread, producers block
+            when it's reached
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._batch = []
+        self._batch_started = None
+        self._error = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def write_batch(self, records):
+        """Writes list of records to the output."""
+        raise NotImplementedError
+
+    def close_output(self):
+        """Closes the output after the last batch is written."""
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, record):
+        """Adds single record.
+
+        :param record: dict
+        """
+        if self._closed:
+            raise ValueError('Sink is closed.')
+        self._check()
+        with self._lock:
+            if not self._batch:
+                self._batch_started = time.monotonic()
+            self._batch.append(record)
+            if len(self._batch) < self.batch_size and not self._expired():
+                return
+            batch = self._take()
+        self._submit(batch)
+
+    def write_many(self, records):
+        """Adds records from iterable."""
+        for record in records:
+            self.write(record)
+
+    def consume(self, results):
+        """Writes records produced by scraping generator or crawl, e.g. ``Crawler.crawl``
+        with callback returning records. Lists of records are flattened, None results
+        are skipped.
+
+        :param results: iterable of records or lists of records
+        :return: number of consumed records
+        """
+        count = 0
+        for result in results:
+            if result is None:
+                continue
+            if isinstance(result, (list, tuple)):
+                self.write_many(result)
+                count += len(result)
+            else:
+                self.write(result)
+                count += 1
+        return count
+
+    def _expired(self):
+        return (
+            self.flush_interval is not None and self._batch_started is not None
+            and time.monotonic() - self._batch_started >= self.flush_interval
+        )
+
+    def _take(self):
+        batch, self._batch = self._batch, []
+        self._batch_started = None
+        return batch
+
+    def _submit(self, batch):
+        if not batch:
+            return
+        if self._queue is not None:
+            self._queue.put(batch)
+        else:
+            self._write(batch)
+
+    def _write(self, batch):
+        with self._write_lock:
+            self.write_batch(batch)
+            self.written += len(batch)
+
+    def _run(self):
+        while True:
+            timeout = self.flush_interval
+            started = self._batch_started
+            if started is not None and timeout is not None:
+                timeout = max(0.0, started + timeout - time.monotonic())
+            try:
+                batch = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    if not self._expired():
+                        continue
+                    batch = self._take()
+                try:
+                    self._write(batch)
+                except Exception as error:
+                    self._error = error
+                continue
+            if batch is not STOP:
+                try:
+                    self._write(batch)
+                except Exception as error:
+                    self._error = error
+            self._queue.task_done()
+            if batch is STOP:
+                return
+
+    def flush(self):
+        """Writes all added records."""
+        with self._lock:
+            batch = self._take()
+        self._submit(batch)
+        if self._queue is not None:
+            self._queue.join()
+        self._check()
+
+    def close(self):
+        """Writes remaining records and closes the output."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            with self._lock:
+                batch = self._take()
+            self._submit(batch)
+            if self._queue is not None:
+                self._queue.put(STOP)
+                self._thread.join()
+        finally:
+            self.close_output()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonLinesSink(Sink):
+    """Writes records as JSON Lines.
+
+    Usage::
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'records.jsonl')
+        >>> with JsonLinesSink(path, batch_size=2) as sink:
+        ...     sink.consume([{'title': 'a'}, [{'title': 'b'}, {'title': 'c'}]])
+        3
+        >>> open(path).read().splitlines()
+        ['{"title": "a"}', '{"title": "b"}', '{"title": "c"}']
+    """
+
+    def __init__(self, path, mode='a', encoding='utf-8', ensure_ascii=False, **kwargs):
+        """JsonLinesSink initialization
+
+        :param path: output file path
+        :param mode: 'a' to append to existing file, 'w' to overwrite it
+        :param encoding: file encoding
+        :param ensure_ascii: escape non ascii characters
+        :param kwargs: `Sink` keyword arguments like batch_size, flush_interval
+        """
+        self.path = path
+        self.ensure_ascii = ensure_ascii
+        self._file = open(path, mode, encoding=encoding)
+        super().__init__(**kwargs)
+
+    def write_batch(self, records):
+        self._file.write(''.join(
+            json.dumps(record, ensure_ascii=self.ensure_ascii, default=str) + '\n'
+            for record in records
+        ))
+        self._file.flush()
+
+    def close_output(self):
+        self._file.close()
+
+
+class CsvSink(Sink):
+    """Writes records as CSV rows. Header is written to new or empty file, columns are taken
+    from the first record if `fieldnames` aren't given. Fields missing in `fieldnames`
+    are ignored.
+
+    Usage::
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'records.csv')
+        >>> with CsvSink(path) as sink:
+        ...     sink.write_many([{'title': 'a', 'price': 1}, {'title': 'b', 'price': 2}])
+        >>> open(path).read().splitlines()
+        ['title,price', 'a,1', 'b,2']
+    """
+
+    def __init__(self, path, fieldnames=None, mode='a', encoding='utf-8', dialect='excel',
+                 **kwargs):
+        """CsvSink initialization
+
+        :param path: output file path
+        :param fieldnames: (optional) list of columns
+        :param mode: 'a' to append to existing file, 'w' to overwrite it
+        :param encoding: file encoding
+        :param dialect: csv dialect
+        :param kwargs: `Sink` keyword arguments like batch_size, flush_interval
+        """
+        self.path = path
+        self.fieldnames = fieldnames
+        self.dialect = dialect
+        self._file = open(path, mode, encoding=encoding, newline='')
+        self._header = self._file.tell() == 0
+        self._writer = None
+        super().__init__(**kwargs)
+
+    def write_batch(self, records):
+        if self._writer is None:
+            self._writer = csv.DictWriter(
+                self._file,
+                fieldnames=self.fieldnames or list(records[0]),
+                extrasaction='ignore',
+                dialect=self.dialect
+            )
+            if self._header:
+                self._writer.writeheader()
+        self._writer.writerows(records)
+        self._file.flush()
+
+    def close_output(self):
+        self._file.close()
+
+
+def quote_identifier(name):
+    return '"{}"'.format(str(name).replace('"', '""'))
+
+
+class SqliteSink(Sink):
+    """Inserts records into SQLite table with ``executemany``, one transaction per batch.
+    Table is created if it doesn't exist, with columns taken from the first record if
+    `columns` aren't given. Lists and dicts are stored as JSON.
+
+    Usage::
+
+        >>> import os, sqlite3, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'records.sqlite')
+        >>> with SqliteSink(path, 'promotions') as sink:
+        ...     sink.write_many({'title': str(n), 'price': n} for n in range(1500))
+        >>> sqlite3.connect(path).execute('SELECT COUNT(*), SUM(price) FROM promotions').fetchone()
+        (1500, 1124250)
+    """
+
+    def __init__(self, path, table, columns=None, **kwargs):
+        """SqliteSink initialization
+
+        :param path: database file path
+        :param table: table name
+        :param columns: (optional) list of columns
+        :param kwargs: `Sink` keyword arguments like batch_size, flush_interval
+        """
+        self.path = path
+        self.table = table
+        self.columns = columns
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._statement = None
+        super().__init__(**kwargs)
+
+    def _prepare(self, record):
+        columns = self.columns or list(record)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+            quote_identifier(self.table), ', '.join(map(quote_identifier, columns))
+        ))
+        self._statement = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote_identifier(self.table),
+            ', '.join(map(quote_identifier, columns)),
+            ', '.join('?' * len(columns))
+        )
+        self.columns = columns
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return value
+
+    def write_batch(self, records):
+        with self._connection:
+            if self._statement is None:
+                self._prepare(records[0])
+            self._connection.executemany(self._statement, (
+                [self._value(record.get(column)) for column in self.columns]
+                for record in records
+            ))
+
+    def close_output(self):
+        self._connection.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
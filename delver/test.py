@@ -1,19 +1,162 @@
 # -*- coding:utf-8 -*-
 
+import asyncio
+import base64
+import gc
+import gzip
+import hashlib
+import io
+import json
 import os
 import shutil
+import sqlite3
+import threading
+import time
 import unittest
+import weakref
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
 
 from requests.exceptions import ConnectionError
 
-from .crawler import Crawler
-from .exceptions import CrawlerError
+from .async_crawler import AsyncCrawler
+from .breaker import CircuitBreaker
+from .cache import HttpCache
+from .cassette import Cassette
+from .checkpoint import Checkpoint
+from .crawler import BaseCrawler, Crawler, read_content
+from .deadline import CancelToken
+from .exceptions import (
+    CancelledError,
+    CassetteError,
+    CircuitOpenError,
+    CrawlerError,
+    ContentTypeError,
+    DeadlineError,
+    PoolError,
+    ResponseSizeError
+)
+from .extract import ExtractionSpec, ProcessExtractor, worker_context
+from .helpers import build_response
+from .frontier import Frontier
+from .hedge import HedgePolicy
+from .history import HistoryEntry, SpillingHistory
+from .limiter import AdaptiveLimiter
+from .middleware import Middleware, Request
+from .parser import HtmlParser
+from .pool import CrawlerPool
 from .proxies import ProxyPool
+from .retry import RetryPolicy
+from .scheduler import HostQueue, HostScheduler
+from .scraper import Page
+from .sinks import CsvSink, JsonLinesSink, SqliteSink
+from .urls import URLSeen, canonicalize_url
+from .warc import WarcWriter
+
+
+LOCAL_HTML = (
+    '<!DOCTYPE html><html><head><title>Moby-Dick</title></head><body>'
+    '<h1>Herman Melville - Moby-Dick</h1><div><p>Availing himself of the mild, summer-cool '
+    'weather that now reigned in these latitudes, and in preparation for the peculiarly '
+    'active pursuits shortly to be anticipated, Perth, the begrimed, blistered old '
+    'blacksmith, had not removed his portable forge to the hold again.</p></div></body></html>'
+)
+
+LOCAL_FORM = (
+    '<html><head><title>Form</title></head><body><form method="post" action="/post">'
+    '<p><label>Customer name: <input name="custname"></label></p>'
+    '<p><button>Submit order</button></p></form></body></html>'
+)
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    """Serves httpbin like endpoints used by tests which need real HTTP traffic."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status_code=200, body=b'', content_type='text/html; charset=utf-8',
+              headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path, query = parts.path.strip('/').split('/'), dict(parse_qsl(parts.query))
+        if path[0] == 'html':
+            self.reply(body=LOCAL_HTML.encode())
+        elif path[0] == 'links':
+            count, current = int(path[1]), int(path[2])
+            links = ' '.join(
+                str(n) if n == current else "<a href='/links/{}/{}'>{}</a>".format(count, n, n)
+                for n in range(count)
+            )
+            self.reply(body='<html><head><title>Links</title></head><body>{}</body></html>'
+                       .format(links).encode())
+        elif path[0] == 'head':
+            self.reply(body=b'<html><head><title>Head</title></head><body>' + b'x' * 100000)
+        elif path[0] == 'image':
+            self.reply(body=b'\x89PNG\r\n\x1a\n' + b'\x00' * 100, content_type='image/png')
+        elif path[0] == 'status':
+            self.reply(int(path[1]), content_type='text/plain')
+        elif path[0] == 'drip':
+            count = int(query.get('numbytes', 5))
+            pause = float(query.get('duration', 5)) / count
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(count))
+            self.end_headers()
+            try:
+                for _ in range(count):
+                    time.sleep(pause)
+                    self.wfile.write(b'*')
+                    self.wfile.flush()
+            except OSError:
+                pass
+        elif path[0] == 'cookies' and path[1:] == ['set']:
+            self.reply(302, headers=dict(
+                [('Location', '/cookies')] +
+                [('Set-Cookie', '{}={}; Path=/'.format(*item)) for item in query.items()]
+            ))
+        elif path[0] == 'cookies':
+            cookies = SimpleCookie(self.headers.get('Cookie', ''))
+            self.reply(body=json.dumps({
+                'cookies': {name: morsel.value for name, morsel in cookies.items()}
+            }).encode(), content_type='application/json')
+        elif path[0] == 'forms':
+            self.reply(body=LOCAL_FORM.encode())
+        else:
+            self.reply(404, content_type='text/plain')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.reply(body=json.dumps({'form': dict(parse_qsl(body.decode()))}).encode(),
+                   content_type='application/json')
 
 
 class TestAll(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), LocalHandler)
+        cls.server.daemon_threads = True
+        cls.local = 'http://127.0.0.1:{}'.format(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
     def setUp(self):
         self.urls = {
             'SIMPLE_HTML': 'https://httpbin.org/html',
@@ -132,6 +275,179 @@ class TestAll(unittest.TestCase):
         c.open(self.urls['LINKS'])
         self.assertEqual(len(c.flow()), 2)
 
+    def test_crawler_history_shares_snapshots(self):
+        c = Crawler()
+        c.open(self.local + '/html')
+        c.open(self.local + '/links/10/0')
+        self.assertIs(c.flow()[-1].response, c.response())
+        self.assertIs(c.current_parser(), c._parser)
+        self.assertEqual(c.flow()[-1].visited(), c.history()[-1])
+
+    def test_history_doesnt_hold_parsed_trees(self):
+        def send(method, url, kwargs, deadline):
+            return build_response(
+                url, headers={'Content-Type': 'text/html'},
+                content='<html><title>{}</title></html>'.format(url[-1]).encode()
+            )
+
+        c = Crawler()
+        c.send = send
+        c.open('http://example.com/1')
+        self.assertEqual(c.title(), ['1'])
+        first = weakref.ref(c.current_parser())
+        c.open('http://example.com/2')
+        c.open('http://example.com/3')
+        gc.collect()
+        self.assertIsNone(first())
+        c.back()
+        self.assertEqual(c.title(), ['2'])
+        c.forward()
+        self.assertEqual(c.title(), ['3'])
+
+    def test_crawler_spilling_history(self):
+        c = Crawler(max_history=100, hot_history=1)
+        c.open(self.local + '/html')
+        c.open(self.local + '/links/10/0')
+        c.open(self.local + '/links/10/1')
+        self.assertEqual(len(c.history()), 3)
+        c.back()
+        self.assertEqual(c.get_url(), self.local + '/links/10/0')
+        self.assertEqual(len(c.links()), 9)
+
+    def test_spilling_history_ring_overflow(self):
+        history = SpillingHistory(maxlen=100, hot=1, size=2048)
+        for index in range(50):
+            response = build_response('http://example.com/{}'.format(index), content=b'x' * 500)
+            history.append(HistoryEntry(response))
+        self.assertLess(len(history), 50)
+        self.assertEqual(history[-1].url, 'http://example.com/49')
+        self.assertEqual(history[0].response.content, b'x' * 500)
+
+    def test_spilling_history_oversized_entry(self):
+        history = SpillingHistory(maxlen=100, hot=1, size=2048)
+        for index, content in enumerate([b'small', os.urandom(4096), b'small', b'last']):
+            response = build_response('http://example.com/{}'.format(index), content=content)
+            history.append(HistoryEntry(response))
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history[0].response.content, b'small')
+        self.assertEqual(len(history[1].response.content), 4096)
+        self.assertEqual(history[2].url, 'http://example.com/2')
+        with Crawler(hot_history=1) as c:
+            ring = c._flow._ring
+        self.assertTrue(ring.closed)
+
+    def test_crawler_lazy_parsing(self):
+        c = Crawler()
+        c.open(self.local + '/html')
+        self.assertFalse(c.current_parser().parsed)
+        self.assertTrue(c.title())
+        self.assertTrue(c.current_parser().parsed)
+
+    def test_parser_resolves_links_on_extraction(self):
+        response = build_response(
+            'http://example.com/a/b/page.html',
+            headers={'Content-Type': 'text/html'},
+            content=b'<html><head><base href="/root/"></head><body><a href="x">x</a>'
+                    b'<img src="i.png"><form action="go"></form></body></html>'
+        )
+        parser = HtmlParser(response)
+        parser.make_links_absolute()
+        self.assertEqual(list(parser.find_links()), ['http://example.com/root/x'])
+        self.assertEqual(parser.xpath('//img/@src'), ['http://example.com/root/i.png'])
+        # elements keep document urls, resolve_url makes them absolute
+        self.assertEqual(parser.xpath('//a')[0].get('href'), 'x')
+        self.assertEqual(
+            parser.resolve_url(parser.css('a')[0].get('href')), 'http://example.com/root/x'
+        )
+        page = Page(response.url, response, parser_factory=Crawler().make_parser)
+        self.assertEqual(page.resolve_url(page.xpath('//img')[0].get('src')),
+                         'http://example.com/root/i.png')
+        self.assertEqual(parser.find_forms()[0].action_url(), 'http://example.com/root/go')
+
+    def test_parser_lean_profile(self):
+        response = build_response(
+            'http://example.com/',
+            headers={'Content-Type': 'text/html'},
+            content=b'<html><head><style>p {}</style></head><body><!-- c --><p>text</p>'
+                    b'<script>var a;</script><noscript>no</noscript></body></html>'
+        )
+        parser = HtmlParser(response, profile='lean')
+        self.assertFalse(parser.xpath('//script|//style|//noscript|//comment()'))
+        self.assertEqual(parser.xpath('//p/text()'), ['text'])
+
+    def test_crawler_head_only(self):
+        c = Crawler()
+        c.head_only = True
+        response = c.open(self.local + '/head')
+        self.assertTrue(response.content.lower().endswith(b'</head>'))
+        self.assertTrue(c.title())
+        self.assertFalse(c.xpath('//body'))
+
+    def test_crawler_response_limits(self):
+        c = Crawler()
+        c.accepted_content_types = ('text/html',)
+        with self.assertRaises(ContentTypeError):
+            c.open(self.local + '/image/png')
+        c.accepted_content_types = None
+        c.max_body_bytes = 100
+        with self.assertRaises(ResponseSizeError):
+            c.open(self.local + '/html')
+
+    def test_read_content_limits(self):
+        response = build_response('http://example.com/')
+        response.raw = io.BytesIO(b'<html><head></head><body>' + b'x' * 1000)
+        self.assertEqual(read_content(response, max_bytes=6), b'<html>')
+        response = build_response('http://example.com/')
+        response.raw = io.BytesIO(b'x' * 1000)
+        with self.assertRaises(ResponseSizeError):
+            read_content(response, max_bytes=100, strict=True)
+
+    def test_crawler_total_timeout(self):
+        c = Crawler()
+        c.total_timeout = 1
+        with self.assertRaises(DeadlineError):
+            c.open(self.local + '/drip?duration=5&numbytes=5')
+
+    def test_download_files_cancelled(self):
+        c = Crawler()
+        token = CancelToken()
+        token.cancel()
+        downloaded_files = c.download_files(
+            self.test_dir,
+            files=[self.local + '/image/png'] * 3,
+            token=token
+        )
+        self.assertEqual(downloaded_files, [])
+        self.assertEqual(os.listdir(self.test_dir), ['upload.txt'])
+
+    def test_download_files_cancelled_during_backoff(self):
+        c = Crawler()
+        c.retry_policy = RetryPolicy(max_attempts=3, backoff_base=5, jitter=False)
+        token = CancelToken()
+        threading.Timer(0.3, token.cancel).start()
+        started = time.monotonic()
+        downloaded_files = c.download_files(
+            self.test_dir, files=[self.local + '/status/503/file.png'], token=token
+        )
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(downloaded_files, [])
+        self.assertIsNone(c.cancel_token)
+
+    def test_async_download_files_cancelled_during_backoff(self):
+
+        async def download():
+            async with AsyncCrawler() as c:
+                c.retry_policy = RetryPolicy(max_attempts=3, backoff_base=5, jitter=False)
+                token = CancelToken()
+                asyncio.get_running_loop().call_later(0.3, token.cancel)
+                return await c.download_files(
+                    self.test_dir, files=[self.local + '/status/503/file.png'], token=token
+                )
+
+        started = time.monotonic()
+        self.assertEqual(asyncio.run(download()), [])
+        self.assertLess(time.monotonic() - started, 2)
+
     def test_crawler_xpath(self):
         c = Crawler()
         c.open(self.urls['SIMPLE_HTML'])
@@ -311,6 +627,654 @@ class TestAll(unittest.TestCase):
             c.open('http://www.delver.cg/404', data={'test': 'test data'})
         self.assertEqual(c._retries, c.max_retries)
 
+    def test_crawler_retry_policy_status_codes(self):
+        c = Crawler()
+        c.retry_policy = RetryPolicy(max_attempts=3, backoff_base=0.1)
+        c.open(self.local + '/status/503')
+        self.assertEqual(c.response().status_code, 503)
+        self.assertEqual(c._retries, 3)
+
+    def test_crawler_middleware_short_circuit(self):
+
+        class Stub(Middleware):
+            def process_request(self, request, crawler):
+                return build_response(
+                    request.url,
+                    headers={'Content-Type': 'text/html'},
+                    content=b'<html><head><title>stub</title></head></html>'
+                )
+
+        class Recorder(Middleware):
+            def __init__(self):
+                self.responses = []
+
+            def process_response(self, request, response, crawler):
+                self.responses.append(response)
+                return response
+
+        recorder = Recorder()
+        c = Crawler()
+        c.middlewares.append(recorder)
+        c.middlewares.append(Stub())
+        c.open('http://www.delver.cg/stub')
+        self.assertEqual(c.title(), ['stub'])
+        self.assertEqual(recorder.responses, [c.response()])
+
+    def test_crawler_open_many(self):
+        c = Crawler()
+        c.open(self.local + '/html')
+        urls = [self.local + '/links/10/{}'.format(n) for n in range(5)]
+        urls.append('http://localhost:1/')
+        pages = list(c.open_many(urls, workers=3, ordered=True))
+        self.assertEqual([page.url for page in pages], urls)
+        self.assertEqual([len(page.links()) for page in pages[:-1]], [9] * 5)
+        self.assertIsInstance(pages[-1].error, ConnectionError)
+        self.assertEqual(c.get_url(), self.local + '/html')
+
+    def test_process_extractor(self):
+        response = build_response(
+            'http://example.com/dir/',
+            headers={'Content-Type': 'text/html'},
+            content=b'<html><head><title>Page</title></head><body>'
+                    b'<a href="next.html">Next</a><p class="x">first</p><p>second</p>'
+                    b'<table><tr><th>A</th></tr><tr><td>1</td></tr></table></body></html>'
+        )
+        spec = ExtractionSpec(
+            xpath={'paragraphs': '//p', 'count': 'count(//p)'},
+            css={'marked': 'p.x'},
+            links=True,
+            tables=True,
+            title=True
+        )
+        pages = [Page(response.url, response), Page('http://localhost:1/', error=ConnectionError())]
+        with ProcessExtractor(processes=2) as extractor:
+            results = list(extractor.extract_pages(pages, spec, ordered=True))
+        self.assertEqual(results[0].data, {
+            'paragraphs': ['first', 'second'],
+            'count': 2.0,
+            'marked': ['first'],
+            'links': ['http://example.com/dir/next.html'],
+            'tables': [{1: {'A': '1'}}],
+            'title': ['Page'],
+        })
+        self.assertIsInstance(results[1].error, ConnectionError)
+
+    def test_crawler_extract_many(self):
+        # workers aren't forked from the process running fetching threads
+        self.assertNotEqual(worker_context().get_start_method(), 'fork')
+        urls = [self.local + '/links/10/{}'.format(n) for n in range(6)]
+        results = list(Crawler().extract_many(
+            urls, ExtractionSpec(links=True), workers=3, processes=2, ordered=True
+        ))
+        self.assertEqual([result.url for result in results], urls)
+        self.assertEqual([len(result.data['links']) for result in results], [9] * 6)
+
+    def test_frontier_spills_in_order(self):
+        frontier = Frontier(memory_limit=3)
+        for number in range(10):
+            frontier.append(str(number), depth=number % 2)
+        popped = [frontier.popleft() for _ in range(5)]
+        for number in range(10, 12):
+            frontier.append(str(number), depth=1)
+        popped.extend(frontier.popleft() for _ in range(len(frontier)))
+        self.assertEqual([item.url for item in popped], [str(number) for number in range(12)])
+        self.assertEqual(popped[3].depth, 1)
+        with self.assertRaises(IndexError):
+            frontier.popleft()
+
+    def test_canonicalize_url(self):
+        self.assertEqual(
+            canonicalize_url('HTTPS://Example.com:443/path?utm_source=x&b=2&a=1#section'),
+            'https://example.com/path?a=1&b=2'
+        )
+        self.assertEqual(canonicalize_url('http://example.com:8080'), 'http://example.com:8080/')
+
+    def test_url_seen_bloom_persistence(self):
+        seen = URLSeen(mode='bloom', capacity=1000, error_rate=0.001)
+        urls = ['http://example.com/{}'.format(number) for number in range(1000)]
+        self.assertTrue(all(seen.add(url) for url in urls[:500]))
+        self.assertFalse(seen.add('http://EXAMPLE.com/0#top'))
+        path = os.path.join(self.test_dir, 'seen.bloom')
+        seen.save(path)
+        loaded = URLSeen.load(path, mode='bloom')
+        self.assertTrue(all(url in loaded for url in urls[:500]))
+        self.assertLess(sum(url in loaded for url in urls[500:]), 5)
+
+    def test_host_scheduler(self):
+        now = [0]
+        scheduler = HostScheduler(rate=2, burst=2, clock=lambda: now[0])
+        self.assertEqual(
+            [scheduler.reserve('http://a.com/{}'.format(n)) for n in range(4)],
+            [0, 0, 0.5, 1.0]
+        )
+        self.assertEqual(scheduler.reserve('http://b.com/'), 0)
+        now[0] = 10
+        self.assertEqual(scheduler.delay('http://a.com/'), 0)
+
+        queue = HostQueue(HostScheduler(delay=5, clock=lambda: now[0]))
+        for url in ['http://a.com/1', 'http://a.com/2', 'http://b.com/1']:
+            queue.push(url, url)
+        self.assertEqual([queue.pop()[0] for _ in range(2)], ['http://a.com/1', 'http://b.com/1'])
+        self.assertEqual(queue.pop(), (None, 5))
+        now[0] = 15
+        self.assertEqual(queue.pop(), ('http://a.com/2', 0))
+
+    def test_adaptive_limiter(self):
+        now = [0]
+        limiter = AdaptiveLimiter(initial=2, maximum=3, cooldown=1, clock=lambda: now[0])
+        url = 'http://example.com/'
+        self.assertTrue(limiter.try_acquire(url))
+        self.assertTrue(limiter.try_acquire(url))
+        self.assertFalse(limiter.try_acquire(url))
+        self.assertFalse(limiter.acquire(url, timeout=0.01))
+        limiter.finish(url, started=0, result=build_response(url))
+        limiter.finish(url, started=0, result=build_response(url))
+        self.assertEqual(limiter.limits()['example.com'], {'limit': 3, 'in_flight': 0, 'latency': 0})
+        for status_code in (503, 429):
+            limiter.try_acquire(url)
+            limiter.finish(url, result=build_response(url, status_code=status_code))
+        self.assertEqual(limiter.limits()['example.com']['limit'], 1)
+        now[0] = 2
+        limiter.try_acquire(url)
+        limiter.finish(url, error=DeadlineError())
+        self.assertEqual(limiter.limits()['example.com']['limit'], 1)
+
+    def test_crawler_crawl(self):
+        c = Crawler()
+        urls = list(c.crawl(
+            [self.local + '/links/10/0'],
+            max_depth=1,
+            allowed_domains=['127.0.0.1'],
+            callback=lambda page: page.url
+        ))
+        self.assertEqual(len(urls), 10)
+        self.assertEqual(
+            set(urls), {self.local + '/links/10/{}'.format(n) for n in range(10)}
+        )
+        self.assertEqual(len(list(c.crawl([self.local + '/links/10/0'], max_pages=3))), 3)
+
+    def test_crawler_pool_shares_session(self):
+        pool = CrawlerPool(size=2)
+        with pool.crawler() as first, pool.crawler() as second:
+            self.assertIsNot(first, second)
+            self.assertIs(first._session.cookies, second._session.cookies)
+            self.assertIs(
+                first._session.get_adapter('https://'), second._session.get_adapter('http://')
+            )
+            first._session.cookies.set('session', '1')
+            self.assertEqual(second._session.cookies.get('session'), '1')
+            with self.assertRaises(PoolError):
+                pool.checkout(timeout=0.01)
+        self.assertIn(pool.checkout(), (first, second))
+
+    def test_crawler_pool_threads(self):
+        pool = CrawlerPool(size=4)
+        with pool.crawler() as c:
+            c.open(self.local + '/cookies/set?session=1')
+
+        def cookies(url):
+            with pool.crawler() as crawler:
+                return crawler.open(url).json()['cookies']
+
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(cookies, [self.local + '/cookies'] * 8))
+        self.assertEqual(results, [{'session': '1'}] * 8)
+
+    def test_circuit_breaker(self):
+        now = [0]
+        attempts = []
+
+        def send(request):
+            attempts.append(request.url)
+            raise ConnectionError('host is down')
+
+        c = Crawler()
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=lambda: now[0])
+        c.middlewares.append(breaker)
+        request = Request('get', 'http://down.example/')
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                c.middlewares.handle(request, send, c)
+        with self.assertRaises(CircuitOpenError):
+            c.middlewares.handle(request, send, c)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(breaker.state('http://other.example/'), 'closed')
+
+        now[0] = 10
+        self.assertEqual(breaker.state('http://down.example/page'), 'half-open')
+        self.assertIsNone(breaker.process_request(request, c))
+        with self.assertRaises(CircuitOpenError):
+            breaker.process_request(request, c)
+        breaker.process_response(request, build_response(request.url), c)
+        self.assertEqual(breaker.state('http://down.example/'), 'closed')
+
+        breaker = CircuitBreaker(failure_threshold=3)
+        for exception in [ConnectionError(), ConnectionError(), CancelledError(),
+                          ContentTypeError(), ConnectionError()]:
+            breaker.process_exception(request, exception, c)
+        self.assertEqual(breaker.state('http://down.example/'), 'open')
+        breaker.cooldown = 0
+        self.assertIsNone(breaker.process_request(request, c))
+        breaker.process_exception(request, CancelledError(), c)
+        self.assertEqual(breaker.state('http://down.example/'), 'half-open')
+        self.assertIsNone(breaker.process_request(request, c))
+
+    def test_hedged_requests(self):
+        policy = HedgePolicy(delay='adaptive', percentile=50, max_ratio=0.5, min_samples=4)
+        for latency in [0.1, 0.2, 0.3, 0.4]:
+            policy.observe(latency)
+        self.assertEqual(policy.delay(), 0.2)
+        self.assertFalse(policy.applies('post'))
+
+        class Counter(Middleware):
+            def __init__(self):
+                self.hooks = []
+
+            def process_request(self, request, crawler):
+                self.hooks.append('request')
+
+            def process_response(self, request, response, crawler):
+                self.hooks.append('response')
+                return response
+
+            def process_exception(self, request, exception, crawler):
+                self.hooks.append('exception')
+
+        counter = Counter()
+        c = Crawler()
+        c.hedge_policy = HedgePolicy(delay=0.05, max_ratio=1, workers=2)
+        c.middlewares.append(counter)
+        calls = []
+        tokens = []
+
+        def send(method, url, kwargs, deadline, token=None):
+            calls.append(url)
+            tokens.append(token)
+            if len(calls) == 1:
+                self.assertTrue(token.wait(5))
+                return build_response(url, content=b'slow')
+            return build_response(url, content=b'fast')
+
+        c.send = send
+        started = time.monotonic()
+        response = c.request('get', 'http://example.com/', {})
+        self.assertEqual(response.content, b'fast')
+        self.assertEqual(c.hedge_policy.hedges, 1)
+        # losing attempt is cancelled, not left running until it completes
+        self.assertTrue(tokens[0].cancelled)
+        self.assertFalse(tokens[1].cancelled)
+        self.assertLess(time.monotonic() - started, 1)
+        # middlewares see one logical request, not every attempt
+        self.assertEqual(counter.hooks, ['request', 'response'])
+        c.request('post', 'http://example.com/', {})
+        self.assertEqual(len(calls), 3)
+        self.assertIsNone(tokens[2])
+        c.hedge_policy.close()
+
+    def test_http_cache(self):
+        sent = []
+
+        def send(method, url, kwargs, deadline):
+            sent.append(kwargs.get('headers', {}))
+            if kwargs.get('headers', {}).get('If-None-Match') == '"v1"':
+                return build_response(url, status_code=304, headers={'ETag': '"v1"'})
+            headers = {'ETag': '"v1"', 'Cache-Control': 'max-age=0'}
+            if url.endswith('fresh'):
+                headers = {'Cache-Control': 'max-age=60'}
+            return build_response(url, headers=headers, content=b'body of ' + url.encode())
+
+        path = os.path.join(self.test_dir, 'cache')
+        c = Crawler()
+        c.send = send
+        with HttpCache(path) as cache:
+            c.middlewares.append(cache)
+            for _ in range(3):
+                self.assertEqual(
+                    c.request('get', 'http://example.com/fresh', {}).content,
+                    b'body of http://example.com/fresh'
+                )
+            self.assertEqual(len(sent), 1)
+            for _ in range(2):
+                response = c.request('get', 'http://example.com/etag', {})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, b'body of http://example.com/etag')
+            self.assertEqual(sent[-1]['If-None-Match'], '"v1"')
+            self.assertEqual((cache.hits, cache.revalidated), (2, 1))
+        with HttpCache(os.path.join(path, 'lru'), max_size=3000) as cache:
+            for name in ['a', 'b', 'a', 'c']:
+                request = Request('get', 'http://example.com/' + name)
+                if cache.process_request(request, None) is None:
+                    cache.store(request, build_response(
+                        request.url, headers={'Cache-Control': 'max-age=60'},
+                        content=os.urandom(1200)
+                    ))
+            self.assertEqual(len(cache), 2)
+            self.assertIsNone(cache.process_request(Request('get', 'http://example.com/b'), None))
+            self.assertIsNotNone(
+                cache.process_request(Request('get', 'http://example.com/a'), None)
+            )
+
+    def test_http_cache_query_params(self):
+        sent = []
+
+        def send(method, url, kwargs, deadline):
+            sent.append(kwargs.get('params'))
+            return build_response(
+                url, headers={'Cache-Control': 'max-age=60'},
+                content='q={}'.format(kwargs['params']['q']).encode()
+            )
+
+        c = Crawler()
+        c.send = send
+        with HttpCache(os.path.join(self.test_dir, 'cache')) as cache:
+            c.middlewares.append(cache)
+            for value in ['a', 'b', 'a']:
+                response = c.request('get', 'http://example.com/', {'params': {'q': value}})
+                self.assertEqual(response.content, 'q={}'.format(value).encode())
+            self.assertEqual(sent, [{'q': 'a'}, {'q': 'b'}])
+            self.assertEqual((len(cache), cache.hits), (2, 1))
+
+    def test_http_cache_skips_cut_responses(self):
+        sent = []
+
+        def send(method, url, kwargs, deadline):
+            sent.append(url)
+            return build_response(
+                url, headers={'Cache-Control': 'max-age=60'}, content=b'<html><head></head>'
+            )
+
+        c = Crawler()
+        c.send = send
+        c.head_only = True
+        with HttpCache(os.path.join(self.test_dir, 'cache')) as cache:
+            c.middlewares.append(cache)
+            c.request('get', 'http://example.com/', {})
+            c.request('get', 'http://example.com/', {})
+            self.assertEqual((len(sent), len(cache)), (2, 0))
+            c.head_only = False
+            c.request('get', 'http://example.com/', {})
+            self.assertEqual(len(cache), 1)
+            response = build_response('http://example.com/cut', headers={
+                'Cache-Control': 'max-age=60'
+            })
+            response.raw = io.BytesIO(b'<html><head></head><body>' + b'x' * 1000)
+            read_content(response, max_bytes=100)
+            self.assertTrue(response.truncated)
+            self.assertFalse(cache.store(Request('get', response.url), response))
+
+    def test_crawler_record_replay(self):
+        path = os.path.join(self.test_dir, 'site.cassette')
+        counter = []
+
+        def send(method, url, kwargs, deadline):
+            counter.append(url)
+            redirect = build_response(url, status_code=302, headers={'Location': '/page'})
+            return build_response(
+                url + 'page',
+                headers={'Content-Type': 'text/html'},
+                content='<html><title>{} {}</title></html>'.format(
+                    method, len(counter)).encode(),
+                history=[redirect]
+            )
+
+        c = Crawler()
+        c.send = send
+        cassette = c.record(path)
+        c.open('http://example.com/')
+        c.open('http://example.com/')
+        c.open('http://example.com/', 'post', data={'name': 'value'})
+        cassette.close()
+
+        def offline(method, url, kwargs, deadline):
+            raise AssertionError('Network used during replay.')
+
+        c = Crawler()
+        c.send = offline
+        with c.replay(path) as cassette:
+            self.assertEqual(len(cassette), 3)
+            c.open('http://example.com/')
+            self.assertEqual(c.title(), ['get 1'])
+            self.assertEqual(c.request_history()[0].status_code, 302)
+            c.open('http://example.com/')
+            self.assertEqual(c.title(), ['get 2'])
+            c.open('http://example.com/', 'post', data={'name': 'value'})
+            self.assertEqual(c.title(), ['post 3'])
+            with self.assertRaises(CassetteError):
+                c.open('http://example.com/other')
+        os.remove(path + '.idx')
+        with Cassette(path, mode='replay') as cassette:
+            self.assertEqual(cassette.get('http://example.com/').url, 'http://example.com/page')
+
+    def test_crawler_replay_retried_response(self):
+        path = os.path.join(self.test_dir, 'retry.cassette')
+        statuses = [503, 200]
+
+        def send(method, url, kwargs, deadline):
+            return build_response(
+                url, status_code=statuses.pop(0), headers={'Content-Type': 'text/html'},
+                content=b'<html><title>ok</title></html>'
+            )
+
+        c = Crawler()
+        c.send = send
+        c.retry_policy = RetryPolicy(max_attempts=3, backoff_base=0)
+        with c.record(path):
+            self.assertEqual(c.open('http://example.com/').status_code, 200)
+
+        def offline(method, url, kwargs, deadline):
+            raise AssertionError('Network used during replay.')
+
+        c = Crawler()
+        c.send = offline
+        c.retry_policy = RetryPolicy(max_attempts=3, backoff_base=0)
+        with c.replay(path):
+            self.assertEqual(c.open('http://example.com/').status_code, 200)
+            self.assertEqual(c._retries, 1)
+
+    def test_crawler_warc(self):
+        body = b'x' * 100000
+
+        def send(method, url, kwargs, deadline):
+            response = build_response(url, headers={'Content-Length': str(len(body))})
+            response.raw = io.BytesIO(body)
+            response._content_consumed = False
+            return response
+
+        c = Crawler()
+        c.send = send
+        c.warc = WarcWriter(os.path.join(self.test_dir, 'warc'), max_size=1)
+        c.download(self.test_dir, 'http://example.com/file.bin')
+        first = c.warc.record(build_response('http://example.com/a', content=b'first'))
+        second = c.warc.record(build_response('http://example.com/b', content=b'second'))
+        first.write(b'first')
+        second.write(b'second')
+        first.commit()
+        second.commit()
+        c.warc.close()
+
+        self.assertEqual(len(c.warc.files), 3)
+        with gzip.open(c.warc.files[0]) as f:
+            data = f.read()
+        self.assertEqual(data.count(b'WARC-Type: response'), 1)
+        self.assertIn(b'\r\n\r\n' + body + b'\r\n\r\n', data)
+        with gzip.open(c.warc.files[2]) as f:
+            self.assertIn(b'second', f.read())
+        with open(c.warc.cdx_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        surt, _, url = lines[1].split()[:3]
+        self.assertEqual((surt, url), ('com,example)/file.bin', 'http://example.com/file.bin'))
+
+    def test_warc_streamed_record_doesnt_block_writes(self):
+        warc = WarcWriter(os.path.join(self.test_dir, 'warc'), spool_size=4, queue_size=4)
+        streamed = warc.record(
+            build_response('http://example.com/big', headers={'Content-Length': '10'})
+        )
+        streamed.write(b'01234')
+        for name in ['one', 'two']:
+            writer = threading.Thread(
+                target=warc.write_response,
+                args=(build_response('http://example.com/' + name, content=name.encode()),)
+            )
+            writer.start()
+            writer.join(5)
+            self.assertFalse(writer.is_alive())
+        self.assertEqual(warc.records, 0)
+        # second queued body doesn't fit queue_size and is moved to disk
+        self.assertEqual(warc._queued_memory, 3)
+        streamed.write(b'56789')
+        self.assertTrue(streamed.commit())
+        self.assertEqual(warc.records, 7)
+        warc.close()
+        with gzip.open(warc.files[0]) as f:
+            data = f.read()
+        self.assertLess(data.index(b'0123456789'), data.index(b'one'))
+        # digest of streamed record follows it in metadata record, spooled ones have it
+        # in their header
+        digest = 'sha1:' + base64.b32encode(hashlib.sha1(b'0123456789').digest()).decode()
+        self.assertIn('payload-digest: {}'.format(digest).encode(), data)
+        self.assertEqual(data.count(b'WARC-Payload-Digest: '), 2)
+        self.assertEqual(data.count(b'WARC-Refers-To: '), 1)
+
+    def test_sinks(self):
+        records = [{'title': 'game {}'.format(n), 'price': n} for n in range(2500)]
+        pages = [records[n:n + 100] for n in range(0, len(records), 100)]
+        db_path = os.path.join(self.test_dir, 'records.sqlite')
+        with SqliteSink(db_path, 'games', batch_size=1000) as sink:
+            self.assertEqual(sink.consume(iter(pages)), 2500)
+            sink.flush()
+            self.assertEqual(sink.written, 2500)
+        connection = sqlite3.connect(db_path)
+        self.assertEqual(
+            connection.execute('SELECT COUNT(*), MAX(price) FROM games').fetchone(), (2500, 2499)
+        )
+        connection.close()
+
+        jsonl_path = os.path.join(self.test_dir, 'records.jsonl')
+        sink = JsonLinesSink(jsonl_path, batch_size=1000, flush_interval=0.1)
+        sink.write(records[0])
+        time.sleep(0.5)
+        with open(jsonl_path) as f:
+            self.assertEqual(f.read(), '{"title": "game 0", "price": 0}\n')
+        sink.close()
+
+        csv_path = os.path.join(self.test_dir, 'records.csv')
+        with CsvSink(csv_path, fieldnames=['title'], background=False, batch_size=2) as sink:
+            sink.write_many(records[:3])
+            self.assertEqual(sink.written, 2)
+        with open(csv_path) as f:
+            self.assertEqual(f.read().splitlines(), ['title', 'game 0', 'game 1', 'game 2'])
+
+    def test_crawler_checkpoint_resume(self):
+        path = os.path.join(self.test_dir, 'crawl.checkpoint')
+        fetched = []
+
+        def send(method, url, kwargs, deadline):
+            fetched.append(url)
+            number = int(url.rsplit('/', 1)[1])
+            links = ''.join(
+                '<a href="/{}">link</a>'.format(number * 2 + n) for n in (1, 2)
+            )
+            return build_response(
+                url, headers={'Content-Type': 'text/html'},
+                content='<html><body>{}</body></html>'.format(links).encode()
+            )
+
+        c = Crawler()
+        c.send = send
+        crawled = []
+        pages = c.crawl(
+            ['http://example.com/0'], max_depth=3, concurrency=1, checkpoint=path,
+            callback=lambda page: page.url
+        )
+        for url in pages:
+            crawled.append(url)
+            if len(crawled) == 5:
+                break
+        pages.close()
+
+        with open(path, 'ab') as f:
+            f.write(b'["q","http://example.com/torn')
+        c = Crawler()
+        c.send = send
+        crawled.extend(c.resume(path, callback=lambda page: page.url))
+        # page yielded when crawl was interrupted wasn't marked done, so it's crawled again
+        self.assertEqual(crawled.count('http://example.com/4'), 2)
+        self.assertEqual(set(crawled), {'http://example.com/{}'.format(n) for n in range(15)})
+        self.assertEqual(len(fetched), 16)
+
+        with Checkpoint(path, compact_every=1) as checkpoint:
+            self.assertEqual(checkpoint.kind, 'crawl')
+            self.assertEqual(checkpoint.state.done, 15)
+            checkpoint.compact()
+        with open(path) as f:
+            self.assertEqual(len(f.read().splitlines()), 17)
+        with self.assertRaises(CrawlerError):
+            Crawler().resume(os.path.join(self.test_dir, 'missing.checkpoint'))
+
+    def test_checkpoint_compaction_count(self):
+        path = os.path.join(self.test_dir, 'crawl.checkpoint')
+        urls = ['http://example.com/{}'.format(n) for n in range(300)]
+
+        def settle(checkpoint):
+            compaction = checkpoint._compaction
+            if compaction is not None:
+                compaction.join()
+
+        with Checkpoint(path, compact_every=100) as checkpoint:
+            checkpoint.begin('crawl', {})
+            for url in urls:
+                checkpoint.queued(url, 1)
+                settle(checkpoint)
+            for url in urls:
+                checkpoint.done(url)
+                settle(checkpoint)
+            # log is rewritten once it doubles, not after every record past compact_every
+            self.assertLessEqual(checkpoint.compactions, 4)
+        with Checkpoint(path) as checkpoint:
+            self.assertEqual(checkpoint.state.done, 300)
+            self.assertEqual(list(checkpoint.state.pending()), [])
+
+    def test_async_crawler(self):
+
+        async def crawl():
+            async with AsyncCrawler() as c:
+                await c.open(self.local + '/forms/post')
+                form = c.forms()[0]
+                form.fields = {'custname': 'Async'}
+                await c.submit(form)
+                responses = await asyncio.gather(*[
+                    c.fetch(self.local + '/html') for _ in range(10)
+                ])
+                return c.response().json()['form'], responses
+
+        form_values, responses = asyncio.run(crawl())
+        self.assertEqual(form_values['custname'], 'Async')
+        self.assertEqual([response.status_code for response in responses], [200] * 10)
+
+    def test_async_crawler_shares_only_base(self):
+        self.assertTrue(issubclass(AsyncCrawler, BaseCrawler))
+        self.assertFalse(issubclass(AsyncCrawler, Crawler))
+        for name in ('crawl', 'extract_many', 'resume', 'send', 'hedge_policy', '__enter__'):
+            self.assertFalse(hasattr(AsyncCrawler, name), name)
+        with self.assertRaises(TypeError):
+            CrawlerPool(crawler_class=AsyncCrawler)
+
+        async def browse():
+            async with AsyncCrawler() as c:
+                await c.open(self.local + '/html')
+                c.head_only = True
+                await c.open(self.local + '/head')
+                c.head_only = False
+                await c.open(self.local + '/links/10/0')
+                c.back()
+                return c.title(), c.xpath('//body'), c.history()
+
+        title, body, history = asyncio.run(browse())
+        self.assertEqual(title, ['Head'])
+        self.assertFalse(body)
+        self.assertEqual(len(history), 3)
+
     def test_crawler_random_timeout(self):
         urls = [
             'https://httpbin.org/html',
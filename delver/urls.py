@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+import re
+import struct
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = (
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'utm_id',
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_hsenc',
+    '_hsmi',
+)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+PERCENT_ESCAPE = re.compile(r'%[0-9a-fA-F]{2}')
+
+
+def canonicalize_url(url, sort_query=True, remove_params=TRACKING_PARAMS, keep_fragment=False):
+    """Returns canonical form of url, so different spellings of the same address compare
+    equal: scheme and host are lowercased, default ports, fragment and tracking params are
+    removed, query params are sorted and percent escapes uppercased.
+
+    Usage::
+
+        >>> canonicalize_url('HTTP://Example.COM:80/a%2fb?b=2&utm_source=x&a=1#top')
+        'http://example.com/a%2Fb?a=1&b=2'
+        >>> canonicalize_url('https://example.com')
+        'https://example.com/'
+
+    :param url: url str
+    :param sort_query: sort query params by name
+    :param remove_params: names of removed query params
+    :param keep_fragment: keep fragment part of url
+    :return: str
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if ':' in host:
+        host = '[{}]'.format(host)
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = '{}:{}'.format(host, parts.port)
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo = '{}:{}'.format(userinfo, parts.password)
+        host = '{}@{}'.format(userinfo, host)
+    path = PERCENT_ESCAPE.sub(lambda match: match.group().upper(), parts.path) or '/'
+    query = parts.query
+    if query:
+        params = [
+            (name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+            if name not in remove_params
+        ]
+        if sort_query:
+            params.sort()
+        query = urlencode(params)
+    fragment = parts.fragment if keep_fragment else ''
+    return urlunsplit((scheme, host, path, query, fragment))
+
+
+class BloomFilter:
+    """Memory bounded set of strings. Membership test can give false positives with
+    `error_rate` probability (when `capacity` items were added), but never false negatives.
+
+    Usage::
+
+        >>> bloom = BloomFilter(capacity=1000, error_rate=0.001)
+        >>> bloom.add('http://example.com/')
+        True
+        >>> 'http://example.com/' in bloom, 'http://example.com/other' in bloom
+        (True, False)
+    """
+
+    HEADER = struct.Struct('>4sQQQ')
+    MAGIC = b'DVBF'
+
+    def __init__(self, capacity=1000000, error_rate=0.001, bits=None, hashes=None):
+        """BloomFilter initialization
+
+        :param capacity: expected number of items
+        :param error_rate: false positive rate at full capacity
+        :param bits: (optional) size of bit array, computed from capacity by default
+        :param hashes: (optional) number of hash functions, computed by default
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate should be between 0 and 1.')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = bits or max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = struct.unpack('>QQ', digest)
+        return [(first + number * second) % self.bits for number in range(self.hashes)]
+
+    def add(self, item):
+        """Adds item.
+
+        :param item: str
+        :return: True if item wasn't in the filter before
+        """
+        added = False
+        array = self._array
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not array[byte] & (1 << bit):
+                array[byte] |= 1 << bit
+                added = True
+        self.count += added
+        return added
+
+    def __contains__(self, item):
+        array = self._array
+        return all(
+            array[position >> 3] & (1 << (position & 7)) for position in self._positions(item)
+        )
+
+    def __len__(self):
+        return self.count
+
+    def save(self, f):
+        """Writes filter to binary file object."""
+        f.write(self.HEADER.pack(self.MAGIC, self.bits, self.hashes, self.count))
+        f.write(struct.pack('>d', self.error_rate))
+        f.write(self._array)
+
+    @classmethod
+    def load(cls, f):
+        """Reads filter written by ``save`` from binary file object."""
+        magic, bits, hashes, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+        if magic != cls.MAGIC:
+            raise ValueError('Not a bloom filter file.')
+        error_rate, = struct.unpack('>d', f.read(8))
+        bloom = cls(
+            capacity=max(1, round(-bits * math.log(2) ** 2 / math.log(error_rate))),
+            error_rate=error_rate,
+            bits=bits,
+            hashes=hashes
+        )
+        bloom.count = count
+        f.readinto(bloom._array)
+        return bloom
+
+
+class URLSeen:
+    """Set of already seen urls. Urls are canonicalized before they are stored or checked.
+
+    'set' mode keeps exact set of urls, good for small crawls. 'bloom' mode keeps
+    `BloomFilter` of fixed size, for crawls of many millions of urls, at the cost of
+    skipping `error_rate` fraction of new urls as false positives.
+
+    Usage::
+
+        >>> seen = URLSeen()
+        >>> seen.add('http://example.com/?b=1&a=2#top')
+        True
+        >>> seen.add('http://EXAMPLE.com/?a=2&b=1')
+        False
+        >>> 'http://example.com:80/?a=2&b=1' in seen
+        True
+    """
+
+    def __init__(self, mode='set', capacity=1000000, error_rate=0.001, canonicalize=None):
+        """URLSeen initialization
+
+        :param mode: 'set' or 'bloom'
+        :param capacity: expected number of urls in 'bloom' mode
+        :param error_rate: false positive rate in 'bloom' mode
+        :param canonicalize: (optional) callable returning canonical url,
+            `canonicalize_url` by default
+        """
+        if mode == 'set':
+            self._urls = set()
+        elif mode == 'bloom':
+            self._urls = BloomFilter(capacity, error_rate)
+        else:
+            raise ValueError('Unknown mode: {}'.format(mode))
+        self.mode = mode
+        self._canonicalize = canonicalize or canonicalize_url
+
+    def add(self, url):
+        """Marks url as seen.
+
+        :param url: url str
+        :return: True if url wasn't seen before
+        """
+        url = self._canonicalize(url)
+        if self.mode == 'bloom':
+            return self._urls.add(url)
+        if url in self._urls:
+            return False
+        self._urls.add(url)
+        return True
+
+    def __contains__(self, url):
+        return self._canonicalize(url) in self._urls
+
+    def __len__(self):
+        return len(self._urls)
+
+    def save(self, path):
+        """Saves seen urls to file.
+
+        :param path: file path
+        """
+        with open(path, 'wb') as f:
+            if self.mode == 'bloom':
+                self._urls.save(f)
+            else:
+                for url in self._urls:
+                    f.write(url.encode('utf-8') + b'\n')
+
+    @classmethod
+    def load(cls, path, mode='set', canonicalize=None):
+        """Loads seen urls saved with ``save``.
+
+        :param path: file path
+        :param mode: 'set' or 'bloom', mode of saved urls
+        :param canonicalize: (optional) callable returning canonical url
+        :return: `URLSeen` object
+        """
+        seen = cls(mode=mode, canonicalize=canonicalize)
+        with open(path, 'rb') as f:
+            if mode == 'bloom':
+                seen._urls = BloomFilter.load(f)
+            else:
+                seen._urls = set(line.decode('utf-8').rstrip('\n') for line in f)
+        return seen
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
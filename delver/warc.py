@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.client import responses as REASONS
+from urllib.parse import urlsplit
+
+WARC_VERSION = 'WARC/1.1'
+CDX_HEADER = ' CDX N b a m s k r M S V g\n'
+HTTP_VERSIONS = {9: 'HTTP/0.9', 10: 'HTTP/1.0', 11: 'HTTP/1.1', 20: 'HTTP/2'}
+# payload is stored decoded, as `requests` delivers it, so these headers are rewritten
+REWRITTEN_HEADERS = frozenset(['content-encoding', 'transfer-encoding', 'content-length'])
+
+
+def surt(url):
+    """Returns SURT form of url used as CDX lookup key.
+
+    >>> surt('https://www.Example.com:8080/Path/?q=1')
+    'com,example:8080)/path/?q=1'
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    key = ','.join(reversed(host.split('.')))
+    if parts.port and parts.port not in (80, 443):
+        key = '{}:{}'.format(key, parts.port)
+    path = parts.path or '/'
+    if parts.query:
+        path = '{}?{}'.format(path, parts.query)
+    return '{}){}'.format(key, path.lower())
+
+
+def sha1_digest(digest):
+    return 'sha1:' + base64.b32encode(digest.digest()).decode('ascii')
+
+
+def header_block(lines):
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+
+
+def body_length(response):
+    """Returns number of payload bytes response will deliver if it's known before reading
+    the body, None otherwise."""
+    if response._content_consumed and isinstance(response._content, bytes):
+        return len(response._content)
+    encoding = response.headers.get('Content-Encoding', 'identity').lower()
+    length = response.headers.get('Content-Length', '')
+    if encoding == 'identity' and length.isdigit():
+        return int(length)
+    return None
+
+
+def http_response_block(response, length):
+    """Returns status line and headers of response with Content-Length of stored payload."""
+    version = HTTP_VERSIONS.get(getattr(response.raw, 'version', 11), 'HTTP/1.1')
+    reason = response.reason or REASONS.get(response.status_code, '')
+    lines = ['{} {} {}'.format(version, response.status_code, reason)]
+    lines.extend(
+        '{}: {}'.format(name, value) for name, value in response.headers.items()
+        if name.lower() not in REWRITTEN_HEADERS
+    )
+    lines.append('Content-Length: {}'.format(length))
+    return header_block(lines)
+
+
+def http_request_block(request):
+    """Returns request line, headers and body of prepared request."""
+    parts = urlsplit(request.url)
+    target = parts.path or '/'
+    if parts.query:
+        target = '{}?{}'.format(target, parts.query)
+    lines = ['{} {} HTTP/1.1'.format(request.method, target)]
+    if 'Host' not in request.headers:
+        lines.append('Host: {}'.format(parts.netloc))
+    lines.extend('{}: {}'.format(name, value) for name, value in request.headers.items())
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return header_block(lines) + (body if isinstance(body, bytes) else b'')
+
+
+class ResponseRecord:
+    """WARC response record filled chunk by chunk while response body is read.
+
+    When payload length is known upfront, is bigger than `spool_size` and no other record
+    is being written, chunks go straight to the WARC file, which the record owns until
+    ``commit``. Payload digest of such record is known only after its header was written,
+    so it's stored in metadata record following it. Other records are spooled to temporary
+    file (in memory up to `spool_size` bytes) and copied to WARC file with payload digest
+    in their header on ``commit``, or right after the record owning the file is finished.
+    """
+
+    def __init__(self, writer, response):
+        self.response = response
+        self._writer = writer
+        self._digest = hashlib.sha1()
+        self._length = 0
+        self._member = None
+        self._spool = None
+        self._expected = body_length(response)
+        if (
+            self._expected is None or self._expected <= writer.spool_size
+            or not writer._claim(self, response, self._expected)
+        ):
+            self._spool = tempfile.SpooledTemporaryFile(
+                max_size=writer.spool_size, dir=writer.directory
+            )
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self._length += len(chunk)
+        if self._member is not None:
+            self._member.write(chunk)
+        else:
+            self._spool.write(chunk)
+
+    def commit(self):
+        """Finishes the record. Direct record whose payload doesn't match announced length
+        is dropped.
+
+        :return: bool, True if record was written or queued for writing
+        """
+        if self._member is not None:
+            if self._length != self._expected:
+                self.discard()
+                return False
+            member, self._member = self._member, None
+            self._writer._release(self.response, member, sha1_digest(self._digest))
+            return True
+        if self._spool is None:
+            return False
+        spool, self._spool = self._spool, None
+        self._writer._append(self.response, spool, self._length, sha1_digest(self._digest))
+        return True
+
+    def discard(self):
+        """Drops the record, partly written data is removed from WARC file."""
+        if self._member is not None:
+            member, self._member = self._member, None
+            self._writer._release(self.response, member)
+        elif self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+class WarcMember:
+    """Gzip member of a single WARC record being written."""
+
+    def __init__(self, file, compression_level, target_uri, record_id):
+        self.offset = file.tell()
+        self.target_uri = target_uri
+        self.record_id = record_id
+        self._gzip = gzip.GzipFile(fileobj=file, mode='wb', compresslevel=compression_level)
+
+    def write(self, data):
+        self._gzip.write(data)
+
+    def close(self):
+        self._gzip.write(b'\r\n\r\n')
+        self._gzip.close()
+
+    def detach(self):
+        """Drops the member without writing anything more to the file."""
+        self._gzip.fileobj = None
+
+
+class WarcWriter:
+    """Writes crawled traffic to gzip-per-record WARC files: request and response record of
+    every response and its redirects. Bodies are written while they are read, so they are
+    never held in memory as whole. File is rotated after it grows beyond `max_size` bytes,
+    each response gets line in CDX index (`prefix`.cdx) with its file name and offset.
+
+    Response payload is stored decoded, as `requests` delivers it, with Content-Length
+    of stored bytes instead of original Content-Encoding and Transfer-Encoding headers.
+
+    Record streamed directly owns the file while its body is downloaded. Records finished
+    meanwhile by other threads don't wait for it, they are queued and appended as soon as
+    it's done. Bodies of queued records are held in memory up to `queue_size` bytes in
+    total, the rest are moved to disk.
+
+    Usage::
+
+        >>> import tempfile
+        >>> from delver.helpers import build_response
+        >>> with WarcWriter(tempfile.mkdtemp(), prefix='example') as warc:
+        ...     warc.write_response(build_response('http://example.com/', content=b'hello'))
+        ...     warc.records
+        2
+        >>> open(warc.cdx_path).read().splitlines()[1].split()[0]
+        'com,example)/'
+    """
+
+    def __init__(self, directory, prefix='delver', max_size=1024 * 1024 * 1024, cdx=True,
+                 compression_level=6, spool_size=1024 * 1024, queue_size=16 * 1024 * 1024):
+        """WarcWriter initialization
+
+        :param directory: directory of WARC files, created if it doesn't exist
+        :param prefix: prefix of WARC and CDX file names
+        :param max_size: number of bytes after which next WARC file is started
+        :param cdx: write CDX index
+        :param compression_level: gzip compression level
+        :param spool_size: max number of body bytes of record held in memory before
+            spooling it to disk, bigger bodies of known length are streamed directly
+        :param queue_size: max number of body bytes of records queued behind directly
+            streamed record held in memory
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_size = max_size
+        self.compression_level = compression_level
+        self.spool_size = spool_size
+        self.queue_size = queue_size
+        self.records = 0
+        self.files = []
+        self._serial = 0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._owner = None
+        self._queued = []
+        self._queued_memory = 0
+        self._file = None
+        self._cdx = None
+        if cdx:
+            self.cdx_path = os.path.join(directory, prefix + '.cdx')
+            exists = os.path.exists(self.cdx_path)
+            self._cdx = open(self.cdx_path, 'a', encoding='utf-8')
+            if not exists:
+                self._cdx.write(CDX_HEADER)
+
+    @property
+    def path(self):
+        """Path of WARC file currently written."""
+        return self._file.name if self._file is not None else None
+
+    def record(self, response):
+        """Starts response record which is filled with ``write`` while body of streamed
+        response is read and finished with ``commit``.
+
+        :param response: class::`Response <Response>` object
+        :return: `ResponseRecord` object
+        """
+        return ResponseRecord(self, response)
+
+    def write_response(self, response):
+        """Writes response with already read body, its redirects included.
+
+        :param response: class::`Response <Response>` object
+        """
+        for hop in list(response.history) + [response]:
+            record = self.record(hop)
+            try:
+                record.write(hop.content or b'')
+            except Exception:
+                record.discard()
+                raise
+            record.commit()
+
+    def _open_file(self):
+        self._serial += 1
+        name = '{}-{}-{:05d}.warc.gz'.format(
+            self.prefix, datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S'), self._serial
+        )
+        self._file = open(os.path.join(self.directory, name), 'wb')
+        self.files.append(self._file.name)
+        member = self._member('warcinfo', None, b'software: delver\r\nformat: WARC File '
+                              b'Format 1.1\r\n', 'application/warc-fields', name=name)
+        member.close()
+
+    def _member(self, warc_type, target_uri, block, content_type, length=None,
+                digest=None, concurrent_to=None, refers_to=None, name=None):
+        record_id = '<urn:uuid:{}>'.format(uuid.uuid4())
+        lines = [
+            WARC_VERSION,
+            'WARC-Type: {}'.format(warc_type),
+            'WARC-Record-ID: {}'.format(record_id),
+            'WARC-Date: {}'.format(datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')),
+        ]
+        if target_uri is not None:
+            lines.append('WARC-Target-URI: {}'.format(target_uri))
+        if name is not None:
+            lines.append('WARC-Filename: {}'.format(name))
+        if concurrent_to is not None:
+            lines.append('WARC-Concurrent-To: {}'.format(concurrent_to))
+        if refers_to is not None:
+            lines.append('WARC-Refers-To: {}'.format(refers_to))
+        if digest is not None:
+            lines.append('WARC-Payload-Digest: {}'.format(digest))
+        lines.append('Content-Type: {}'.format(content_type))
+        lines.append('Content-Length: {}'.format(len(block) + (length or 0)))
+        member = WarcMember(self._file, self.compression_level, target_uri, record_id)
+        member.write(header_block(lines))
+        member.write(block)
+        return member
+
+    def _begin(self, response, length, digest=None):
+        if self._file is None:
+            self._open_file()
+        member = self._member(
+            'response', response.url, http_response_block(response, length),
+            'application/http;msgtype=response', length, digest
+        )
+        return member
+
+    def _finish(self, response, member, digest, direct=False):
+        member.close()
+        end = self._file.tell()
+        self.records += 1
+        if direct:
+            self._member(
+                'metadata', response.url, 'payload-digest: {}\r\n'.format(digest).encode(),
+                'application/warc-fields', refers_to=member.record_id
+            ).close()
+            self.records += 1
+        if response.request is not None:
+            self._member(
+                'request', response.url, http_request_block(response.request),
+                'application/http;msgtype=request', concurrent_to=member.record_id
+            ).close()
+            self.records += 1
+        if self._cdx is not None:
+            self._cdx.write('{} {} {} {} {} {} {} - {} {} {}\n'.format(
+                surt(response.url),
+                datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S'),
+                response.url,
+                response.headers.get('Content-Type', '-').split(';')[0].strip() or '-',
+                response.status_code,
+                digest.split(':', 1)[1],
+                response.headers.get('Location', '-').replace(' ', '%20'),
+                end - member.offset,
+                member.offset,
+                os.path.basename(self._file.name)
+            ))
+        if self._file.tell() >= self.max_size:
+            self._file.close()
+            self._file = None
+
+    def _abort(self, member):
+        member.detach()
+        self._file.seek(member.offset)
+        self._file.truncate()
+
+    def _claim(self, record, response, length):
+        """Gives the file to record streaming its body directly, if nobody else uses it.
+
+        :return: bool, True if record owns the file
+        """
+        with self._lock:
+            if self._owner is not None or self._queued:
+                return False
+            record._member = self._begin(response, length)
+            self._owner = record
+            return True
+
+    def _release(self, response, member, digest=None):
+        """Finishes (or with no digest aborts) direct record and writes records queued
+        while it owned the file."""
+        with self._lock:
+            try:
+                if digest is None:
+                    self._abort(member)
+                else:
+                    self._finish(response, member, digest, direct=True)
+            finally:
+                self._owner = None
+                self._write_queued()
+                self._released.notify_all()
+
+    def _append(self, response, spool, length, digest):
+        with self._lock:
+            if self._owner is not None and length <= self.spool_size:
+                if self._queued_memory + length > self.queue_size:
+                    spool.rollover()
+                else:
+                    self._queued_memory += length
+            self._queued.append((response, spool, length, digest))
+            if self._owner is None:
+                self._write_queued()
+
+    def _write_queued(self):
+        self._queued_memory = 0
+        while self._queued:
+            response, spool, length, digest = self._queued.pop(0)
+            try:
+                spool.seek(0)
+                member = self._begin(response, length, digest)
+                shutil.copyfileobj(spool, member)
+                self._finish(response, member, digest)
+            finally:
+                spool.close()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            if self._cdx is not None:
+                self._cdx.flush()
+
+    def close(self):
+        """Waits for record streamed directly and closes the files."""
+        with self._lock:
+            while self._owner is not None:
+                self._released.wait()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._cdx is not None:
+                self._cdx.close()
+                self._cdx = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return '<WarcWriter(directory={}, prefix={}, max_size={})>'.format(
+            self.directory, self.prefix, self.max_size
+        )
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -6,6 +6,7 @@ import psycopg2
 
 from pprint import pprint
 from delver import Crawler
+from delver.sinks import SqliteSink
 
 
 def scraping_movies_table():
@@ -176,12 +177,21 @@ class SteamPromotionsScraperDB(WithConnection):
                 '''
             )
         for page in self.scrape_by_page():
-            for row in page:
-                self._cursor.execute(
-                    '''
-                        INSERT INTO promotions(title, discount, price)
-                        VALUES(%s, %s, %s)
-                    ''',
-                    (row.get('title'), row.get('discount'), row.get('price'))
-                )
-                pprint(row)
+            self._cursor.executemany(
+                '''
+                    INSERT INTO promotions(title, discount, price)
+                    VALUES(%s, %s, %s)
+                ''',
+                [(row.get('title'), row.get('discount'), row.get('price')) for row in page]
+            )
+            pprint(page)
+
+
+def save_promotions(path='promotions.sqlite'):
+    """ Saves promotions to SQLite database in batches, written by background thread
+    while next pages are scraped.
+
+    :param path: database file path
+    """
+    with SqliteSink(path, 'promotions', columns=['title', 'discount', 'price']) as sink:
+        sink.consume(SteamPromotionsScraper())
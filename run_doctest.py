@@ -5,20 +5,56 @@ import doctest
 import shutil
 
 from delver import (
+    async_crawler,
+    breaker,
+    cache,
+    cassette,
+    checkpoint,
     crawler,
+    deadline,
+    extract,
     forms,
+    frontier,
+    hedge,
     helpers,
+    history,
+    limiter,
+    middleware,
     parser,
-    proxies
+    pool,
+    proxies,
+    retry,
+    scheduler,
+    sinks,
+    urls,
+    warc
 )
 
 if __name__ == "__main__":
     os.makedirs('test', exist_ok=True)
     with open('test/test_file.txt', 'wb') as f:
         f.write(b"If the road is easy, you're likely going the wrong way..")
+    doctest.testmod(async_crawler)
+    doctest.testmod(breaker)
+    doctest.testmod(cache)
+    doctest.testmod(cassette)
+    doctest.testmod(checkpoint)
     doctest.testmod(crawler)
+    doctest.testmod(deadline)
+    doctest.testmod(extract)
     doctest.testmod(forms)
+    doctest.testmod(frontier)
+    doctest.testmod(hedge)
     doctest.testmod(helpers)
+    doctest.testmod(history)
+    doctest.testmod(limiter)
+    doctest.testmod(middleware)
     doctest.testmod(parser)
+    doctest.testmod(pool)
     doctest.testmod(proxies)
+    doctest.testmod(retry)
+    doctest.testmod(scheduler)
+    doctest.testmod(sinks)
+    doctest.testmod(urls)
+    doctest.testmod(warc)
     shutil.rmtree('test', ignore_errors=True)
@@ -25,6 +25,10 @@ requirements = [
     'cssselect'
 ]
 
+extras_requirements = {
+    'async': ['aiohttp'],
+}
+
 setup_requirements = [
     # TODO(nuncjo): put setup requirements (distutils extensions, etc.) here
 ]
@@ -44,6 +48,7 @@ setup(
     packages=find_packages(include=['delver']),
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     zip_safe=False,
     keywords='delver, web automation, spider, scraper, mechanize, scrapy, robobrowser',